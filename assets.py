@@ -0,0 +1,110 @@
+import struct
+from logger import log
+
+try:
+    import bitmaptools
+except ImportError:
+    bitmaptools = None
+
+# Layout written by tools/build_assets.py (little-endian):
+#   header   "AST1", bullet width (B), bullet height (B), moon width (B),
+#            moon height (B), bullet count (B)
+#   charmap  256 x signed byte, terminalio.FONT tile index per character code
+#   moon     moon width x height bytes, one palette index per pixel
+#   bullets  bullet count x (route_id 4s, r B, g B, b B, width x height bytes)
+# Pixels are stored one byte each, row by row, so they blit straight into a
+# displayio.Bitmap.
+MAGIC = b"AST1"
+HEADER_FORMAT = "<4sBBBBB"
+BULLET_HEADER_FORMAT = "<4sBBB"
+CHARMAP_SIZE = 256
+
+
+def _strip(raw):
+    end = raw.find(b"\x00")
+    return str(raw if end < 0 else raw[:end], "ascii")
+
+
+def blit(bitmap, pixels, width, height):
+    """Copy one-byte-per-pixel data into a bitmap in a single call."""
+    if bitmaptools is not None:
+        bitmaptools.arrayblit(bitmap, pixels, 0, 0, width, height)
+        return
+    for y in range(height):
+        row = y * width
+        for x in range(width):
+            bitmap[x, y] = pixels[row + x]
+
+
+class AssetPack:
+    """Prebuilt route bullets, the moon icon and the charmap, read from flash.
+
+    Only the route table is kept in RAM; each asset is read with readinto
+    when it's needed and copied into its bitmap in one go.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+            magic, self.bullet_width, self.bullet_height, self.moon_width, self.moon_height, count = struct.unpack(
+                HEADER_FORMAT, header
+            )
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an asset pack")
+
+            self.charmap_offset = len(header)
+            self.moon_offset = self.charmap_offset + CHARMAP_SIZE
+            offset = self.moon_offset + self.moon_width * self.moon_height
+
+            # route_id -> (color, pixel offset)
+            self.bullets = {}
+            bullet_header = struct.calcsize(BULLET_HEADER_FORMAT)
+            bullet_pixels = self.bullet_width * self.bullet_height
+            raw = bytearray(bullet_header)
+            for _ in range(count):
+                f.seek(offset)
+                f.readinto(raw)
+                route_id, r, g, b = struct.unpack(BULLET_HEADER_FORMAT, raw)
+                self.bullets[_strip(route_id)] = ((r << 16) | (g << 8) | b, offset + bullet_header)
+                offset += bullet_header + bullet_pixels
+
+    def _read(self, offset, buf):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            f.readinto(buf)
+
+    def load_charmap(self, charmap):
+        """Fill a 256-entry signed byte array with the baked tile indices."""
+        self._read(self.charmap_offset, charmap)
+
+    def draw_moon(self, bitmap):
+        pixels = bytearray(self.moon_width * self.moon_height)
+        self._read(self.moon_offset, pixels)
+        blit(bitmap, pixels, self.moon_width, self.moon_height)
+
+    def has_bullet(self, route_id):
+        return route_id in self.bullets
+
+    def draw_bullet(self, route_id, bitmap, pixels=None):
+        """Draw a route's bullet into bitmap; returns its RGB color.
+
+        pixels is an optional reusable buffer of width x height bytes.
+        """
+        color, offset = self.bullets[route_id]
+        if pixels is None:
+            pixels = bytearray(self.bullet_width * self.bullet_height)
+        self._read(offset, pixels)
+        blit(bitmap, pixels, self.bullet_width, self.bullet_height)
+        return color
+
+
+def load_assets(path):
+    """Open the asset pack if it's on flash; returns None if it isn't."""
+    if not path:
+        return None
+    try:
+        return AssetPack(path)
+    except (OSError, ValueError) as e:
+        log.warning("No asset pack, drawing assets instead: %s", e)
+        return None
@@ -0,0 +1,122 @@
+import time
+from config import (
+    CLOCK_STEP_THRESHOLD,
+    CLOCK_MAX_SOURCE_AGE,
+    CLOCK_SAMPLES,
+)
+from logger import log
+
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def days_from_civil(year, month, day):
+    """Days since 1970-01-01 for a Gregorian date."""
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_http_date(value):
+    """UTC epoch seconds from an HTTP Date header, or None if it won't parse.
+
+    Only the RFC 1123 form servers send today is understood:
+    "Sun, 06 Nov 1994 08:49:37 GMT".
+    """
+    try:
+        _, day, month, year, clock, _ = value.split()
+        hours, minutes, seconds = clock.split(":")
+        days = days_from_civil(int(year), MONTHS.index(month) + 1, int(day))
+        return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+
+class Clock:
+    """Keeps the RTC right using the time that comes with every fetch.
+
+    HTTP Date headers say what time it is now; they're taken as
+    authoritative. Feed header timestamps and push publish times only say
+    the time is at least that, so they can pull a clock that's behind
+    forward but never count as a sync. Small errors are corrected a second
+    at a time so the minutes on screen don't jump; large ones are stepped.
+    NTP is only needed when no authoritative time has arrived for
+    CLOCK_MAX_SOURCE_AGE seconds.
+    """
+
+    def __init__(self, tz_offset):
+        self.tz_offset = tz_offset  # Seconds the RTC runs ahead of UTC
+        self.offsets = []  # Recent (source - RTC) samples, seconds
+        self.last_source = None  # monotonic time of the last authoritative sample
+        self.first_sync = None
+        self.corrected = 0  # Seconds slewed since the first sync
+        self.corrections = 0
+
+    def utc_now(self):
+        return time.time() - self.tz_offset
+
+    def observe(self, utc_time, source):
+        """Take an authoritative reading of the current UTC time."""
+        offset = utc_time - self.utc_now()
+        self.offsets.append(offset)
+        if len(self.offsets) > CLOCK_SAMPLES:
+            self.offsets.pop(0)
+        self.last_source = time.monotonic()
+
+        if self.first_sync is None or abs(offset) >= CLOCK_STEP_THRESHOLD:
+            # Unset or far off: jump straight there
+            self._adjust(offset, source)
+            self.offsets = []
+            if self.first_sync is None:
+                self.first_sync = self.last_source
+            return
+
+        # Median of recent samples, so one slow response doesn't move the clock
+        median = sorted(self.offsets)[len(self.offsets) // 2]
+        if median >= 2 or median <= -2:
+            step = 1 if median > 0 else -1
+            self.corrected += step
+            self._adjust(step, source)
+
+    def observe_http_date(self, value, age=0):
+        """Take the Date header of a response whose headers arrived age seconds ago."""
+        utc_time = parse_http_date(value) if value else None
+        if utc_time is not None:
+            # The header is truncated to the second; assume we're mid-second
+            self.observe(utc_time + 0.5 + age, "http")
+
+    def observe_feed_timestamp(self, timestamp):
+        """A feed can't have been written in the future, so now >= timestamp."""
+        if timestamp and timestamp > self.utc_now() + 1:
+            self._adjust(timestamp - self.utc_now(), "feed")
+
+    def mark_ntp(self):
+        """Record that NTP just set the RTC."""
+        self.offsets = []
+        self.last_source = time.monotonic()
+        if self.first_sync is None:
+            self.first_sync = self.last_source
+
+    def needs_ntp(self):
+        """Whether it's been too long since any authoritative time arrived."""
+        return self.last_source is None or time.monotonic() - self.last_source > CLOCK_MAX_SOURCE_AGE
+
+    def drift_ppm(self):
+        """Average gradual correction per second since the first sync."""
+        if self.first_sync is None:
+            return 0
+        elapsed = time.monotonic() - self.first_sync
+        return self.corrected / elapsed * 1000000 if elapsed > 0 else 0
+
+    def _adjust(self, seconds, source):
+        import rtc
+
+        seconds = int(round(seconds))
+        if not seconds:
+            return
+        rtc.RTC().datetime = time.localtime(int(time.time()) + seconds)
+        self.offsets = [offset - seconds for offset in self.offsets]
+        self.corrections += 1
+        log.info("Clock adjusted %+ds from %s (drift %d ppm)", seconds, source, self.drift_ppm())
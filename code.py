@@ -1,137 +1,486 @@
+import time
+
+# Everything below is timed from here: module imports, the boot frame, the
+# network and the first arrivals
+BOOT_STARTED_NS = time.monotonic_ns()
+
 from config import (
     MTA_FEED_URL,
-    STOP_ID_NORTHBOUND,
-    STOP_ID_SOUTHBOUND,
+    FEED_MODE,
     COLOR_RED,
+    COLOR_WHITE,
     SCROLL_SPEED,
     DATA_REFRESH_INTERVAL,
     SCROLL_TIMES,
+    STATION_PAGE_INTERVAL,
+    STATION_NAME_SECONDS,
+    HEAP_REPORT_INTERVAL,
+    HEAP_PROBE_LARGEST_BLOCK,
+    PUSH_MODE_ENABLED,
+    SCHEDULE_FILE,
+    QUIET_POLL_INTERVAL,
+    QUIET_WIFI_OFF,
 )
 from display_manager import Display
-from network_manager import get_connection_manager
-import time
-from train_service import get_feed_data, get_train_times, format_train_display
+from logger import log
+from profiler import profiler
+from memory_governor import governor
+from loop_watchdog import monitor
+from telemetry import telemetry
+from heap_monitor import HeapMonitor
+from schedule_fallback import load_schedule
+from snapshot import Snapshot, KIND_LIVE, KIND_SCHEDULED, KIND_NO_DATA
+from stations import load_stations, station_stop_ids, used_feeds
+from train_service import (
+    get_feed_data,
+    get_feeds_data,
+    get_scheduled_times,
+    feed_is_stale,
+    format_train_display,
+    predictions,
+    EST_OFFSET,
+)
+
+_boot_marks = []
+
+
+def mark_boot(event, at_ns=None):
+    """Record how long after code.py started a boot milestone was reached."""
+    at_ns = time.monotonic_ns() if at_ns is None else at_ns
+    _boot_marks.append((event, (at_ns - BOOT_STARTED_NS) // 1000000))
+
 
+def report_boot():
+    """Print the boot milestones once the first arrivals are up."""
+    marks = " ".join(f"{event}={ms}ms" for event, ms in _boot_marks)
+    print(f"Boot: {marks} (uptime at code.py start {BOOT_STARTED_NS // 1000000}ms)")
+
+
+def initialize_system(display=None):
+    """Initialize system components and establish network connection.
+
+    Pass an already running display to keep what it's showing while the
+    network comes up. The clock is set from the first feed response, so
+    NTP only runs later if that doesn't provide the time.
+    """
+    # The network stack isn't needed until the display is up
+    from network_manager import get_connection_manager
 
-def initialize_system():
-    """Initialize system components and establish network connection."""
     try:
         # Initialize network and time
         connection_manager = get_connection_manager()
-        connection_manager.sync_time(tz_offset=-5)  # Eastern Standard Time
 
         # Initialize display
-        display = Display(scroll_speed=SCROLL_SPEED)
+        if display is None:
+            display = Display(scroll_speed=SCROLL_SPEED)
 
         return connection_manager, display
     except Exception as e:
-        print(f"Initialization error: {e}")
+        log.error("Initialization error: %s", e)
         raise
 
 
 def display_error(display, error_msg):
     """Display error message on both lines of the display."""
-    print("Error:", error_msg)
+    log.error("Error: %s", error_msg)
     display.set_text_with_colors("Error", [COLOR_RED], 0)
     display.set_text_with_colors(str(error_msg), [COLOR_RED], 1)
+    display.drawn = None
     time.sleep(5)
 
-def fetch_train_data(connection_manager):
-    """Fetch and process train data."""
+def station_lines(feed_dicts, station, schedule=None):
+    """Arrivals for each of a station's stops as (label, [mins, ...], kind).
+
+    Stops whose feed couldn't be fetched or is stale get scheduled times
+    when the schedule covers them, otherwise no data.
+    """
+    feed_dict = feed_dicts.get(station["feed"])
+    realtime = feed_dict is not None and not feed_is_stale(feed_dict)
+    lines = []
+    for stop_id, label in station["stops"]:
+        if not realtime and schedule and schedule.has_stop(stop_id):
+            arrivals = get_scheduled_times(schedule, stop_id, governor.arrivals_per_stop)
+            lines.append((label, [mins for _, mins in arrivals], KIND_SCHEDULED))
+        elif feed_dict is None:
+            lines.append((label, [], KIND_NO_DATA))
+        else:
+            arrivals = predictions.arrivals(stop_id, governor.arrivals_per_stop)
+            lines.append((label, [mins for _, mins in arrivals], KIND_LIVE))
+    return lines
+
+def format_page(station, lines):
+    """Turn a station's lines into (station, text1, colors1, text2, colors2, lines)."""
+    texts = []
+    with profiler.span("format"):
+        for label, mins, kind in lines:
+            if kind == KIND_NO_DATA:
+                texts.append((f"{label} No data", [COLOR_WHITE]))
+            elif mins is None:
+                # Restored from a snapshot the clock can't age
+                texts.append((f"{label} ...", [COLOR_WHITE]))
+            else:
+                arrivals = [(None, m) for m in mins]
+                texts.append(format_train_display(arrivals, label, scheduled=kind == KIND_SCHEDULED))
+        while len(texts) < 2:
+            texts.append(("", [COLOR_WHITE]))
+    return (station, texts[0][0], texts[0][1], texts[1][0], texts[1][1], lines)
+
+def station_current(feed_dict, station, page):
+    """True if nothing on a station's live page has changed since it was built."""
+    if feed_dict is None or feed_is_stale(feed_dict):
+        return False
+    for _, _, kind in page[5]:
+        if kind != KIND_LIVE:
+            return False
+    for stop_id, _ in station["stops"]:
+        if not predictions.is_current(stop_id, governor.arrivals_per_stop):
+            return False
+    return True
+
+def build_station_pages(feed_dicts, stations, schedule=None, previous=None):
+    """Format every station from already-parsed feeds, one page per station.
+
+    Each feed's predictions for the station are diffed against the last
+    refresh first. A live station whose predictions didn't change, and
+    whose minutes haven't ticked over, keeps its previous page without
+    recounting or formatting it (and isn't redrawn); so does one whose
+    recounted lines come out the same.
+    """
+    monitor.stage("format")
+    pages = []
+    for i, station in enumerate(stations):
+        feed_dict = feed_dicts.get(station["feed"])
+        if feed_dict is not None:
+            with profiler.span("filter"):
+                predictions.update(feed_dict, [stop_id for stop_id, _ in station["stops"]])
+        page = previous[i] if previous and i < len(previous) and previous[i][0] is station else None
+        if page is not None and station_current(feed_dict, station, page):
+            pages.append(page)
+            continue
+        lines = station_lines(feed_dicts, station, schedule)
+        if page is not None and page[5] == lines:
+            pages.append(page)
+        else:
+            pages.append(format_page(station, lines))
+    predictions.end_refresh()
+    return pages
+
+def snapshot_lines(pages):
+    """Every line on every page, in the order the snapshot stores them."""
+    return [line for page in pages for line in page[5]]
+
+def restored_pages(snapshot, stations):
+    """Pages from the last snapshot, aged with the RTC, or None."""
+    labels = [label for station in stations for _, label in station["stops"]]
+    lines = snapshot.load(labels)
+    if not lines:
+        return None
+    pages = []
+    for station in stations:
+        count = len(station["stops"])
+        pages.append(format_page(station, lines[:count]))
+        lines = lines[count:]
+    return pages
+
+def fetch_station_pages(connection_manager, feeds, stations, schedule=None, previous=None):
+    """Fetch every feed the stations need and format the pages.
+
+    Feeds are fetched concurrently and each is parsed once, however many
+    stations share it. If no feed could be fetched, returns scheduled
+    times when there's a schedule, otherwise None.
+    """
     try:
-        # Get and parse feed data
-        feed_dict = get_feed_data(connection_manager, MTA_FEED_URL)
-        
-        # Get train times
-        north_arrivals = get_train_times(feed_dict, STOP_ID_NORTHBOUND)
-        south_arrivals = get_train_times(feed_dict, STOP_ID_SOUTHBOUND)
-        
-        # Format train display
-        north_text, north_colors = format_train_display(north_arrivals, "City")
-        south_text, south_colors = format_train_display(south_arrivals, "Bkln")
-        
-        return north_text, north_colors, south_text, south_colors
+        if FEED_MODE == "aggregator":
+            # The aggregator answers for every stop in one request
+            feed_dict = get_feed_data(connection_manager, MTA_FEED_URL, station_stop_ids(stations))
+            feed_dicts = {name: feed_dict for name in feeds}
+        else:
+            feed_dicts = get_feeds_data(connection_manager, used_feeds(feeds, stations), station_stop_ids(stations))
+
+        if not feed_dicts:
+            raise Exception("Failed to fetch feed")
+        return build_station_pages(feed_dicts, stations, schedule, previous)
+    except Exception as e:
+        log.error("Error fetching train data: %s", e)
+        if schedule:
+            return build_station_pages({}, stations, schedule, previous)
+        return None
+
+
+def connect_push(connection_manager, stations):
+    """Subscribe to pushed arrivals; returns None to fall back to polling."""
+    if not PUSH_MODE_ENABLED:
+        return None
+    try:
+        from push_client import PushClient
+        return PushClient(connection_manager, station_stop_ids(stations))
     except Exception as e:
-        print(f"Error fetching train data: {e}")
-        return None, None, None, None
+        log.warning("Push mode unavailable, polling instead: %s", e)
+        return None
+
+
+def pushed_station_pages(push_client, feeds, stations, schedule=None, previous=None):
+    """Format the pages from the arrivals pushed so far."""
+    feed_dict = push_client.feed_dict()
+    return build_station_pages({name: feed_dict for name in feeds}, stations, schedule, previous)
+
+
+def show_page(display, page, stage="page"):
+    """Draw one station page without the quiet-hours checks."""
+    station, text1, colors1, text2, colors2, _ = page
+    display.set_route(station["route"])
+    display._static_display(text1, colors1, text2, colors2, stage)
+
+
+def show_station_name(display, page):
+    """Draw the station's name over its first line while paging to it."""
+    station, _, _, text2, colors2, _ = page
+    display.set_route(station["route"])
+    display._static_display(station["name"], [COLOR_WHITE], text2, colors2, "page")
+
+
+def record_heap(heap_monitor, connection_manager):
+    """Sample the heap after a refresh and print stats every few refreshes."""
+    if not HEAP_REPORT_INTERVAL:
+        return
+    heap_monitor.sample()
+    if heap_monitor.cycles % HEAP_REPORT_INTERVAL == 0:
+        heap_monitor.report(connection_manager.rx_buffer)
+        governor.report()
+        monitor.report()
+        predictions.report()
 
 
 def main():
     """Main program loop for MTA train display."""
     try:
-        connection_manager, display = initialize_system()
+        mark_boot("imports")
+        # The display comes up first, showing the logo as a boot frame
+        display = Display(scroll_speed=SCROLL_SPEED)
+        mark_boot("first_pixel", display.first_frame_ns)
+        mark_boot("display")
+        monitor.start()
+
+        # Draw the last arrivals we saw before the network is up
+        feeds, stations = load_stations()
+        snapshot = Snapshot()
+        pages = restored_pages(snapshot, stations)
+        if pages and not (snapshot.clock_ok and display.is_quiet_hours()):
+            show_page(display, pages[0])
+            mark_boot("snapshot")
+        schedule = load_schedule(SCHEDULE_FILE)
+
+        monitor.stage("network")
+        connection_manager, display = initialize_system(display)
+        mark_boot("network")
 
         # Ignore any false button presses at boot
         display.last_button_state = not display.button_up.value
-        print(f"Initial button state: {display.last_button_state}")
+        log.debug("Initial button state: %s", display.last_button_state)
 
-        # Check appropriate mode based on time when first starting
-        if display.is_quiet_hours():
+        # Check appropriate mode based on time when first starting. Before
+        # the first fetch the clock may not be set yet.
+        if connection_manager.clock_is_set() and display.is_quiet_hours():
             display.show_night_mode()
         else:
             display.show_normal_mode()
     except Exception as e:
-        print(f"Fatal error during initialization: {e}")
+        log.error("Fatal error during initialization: %s", e)
+        log.dump()
         return
 
+    heap_monitor = HeapMonitor(probe_largest_block=HEAP_PROBE_LARGEST_BLOCK)
+    push_client = connect_push(connection_manager, stations)
+
     # Initial data fetch
-    north_text, north_colors, south_text, south_colors = fetch_train_data(connection_manager)
-    
+    if push_client:
+        # Retained messages arrive right after subscribing
+        monitor.stage("push")
+        push_client.loop(timeout=1)
+        pages = pushed_station_pages(push_client, feeds, stations, schedule)
+    else:
+        pages = fetch_station_pages(connection_manager, feeds, stations, schedule)
+        record_heap(heap_monitor, connection_manager)
+    if pages:
+        snapshot.save(snapshot_lines(pages))
+    page_index = 0
+
     # Check appropriate mode based on time when first starting
     if display.is_quiet_hours():
         display.show_night_mode()
     else:
         display.show_normal_mode()
         # Show initial data if in normal mode and data available
-        if north_text and south_text:
-            display._static_display(north_text, north_colors, south_text, south_colors)
+        if pages:
+            show_page(display, pages[0], "render")
+    if pages:
+        mark_boot("first_arrival")
+    report_boot()
+
+    # Only when the first fetch didn't bring the time with it
+    if connection_manager.clock.needs_ntp():
+        monitor.stage("ntp")
+        connection_manager.sync_time(tz_offset=-5)  # Eastern Standard Time
 
     last_refresh_time = time.monotonic()
+    last_page_time = last_refresh_time
+    name_shown = False
+    sleeping = False
+    awake_until = 0
+    monitor.begin_loop()
 
     while True:
         try:
+            monitor.stage("idle")
             # Check button continuously
             button_result = display.check_button()
-            
+
             current_time = time.monotonic()
             need_refresh = False
-            
+
             # If night mode was turned OFF, need fresh data
             if button_result == 2:
                 need_refresh = True
-            
+
             # Or if it's time for regular refresh
             if current_time - last_refresh_time >= DATA_REFRESH_INTERVAL:
                 need_refresh = True
                 last_refresh_time = current_time
-            
+
+            # Or if a pushed update arrived
+            if push_client and push_client.pending:
+                need_refresh = True
+
+            # Quiet hours start on time rather than at the next refresh. A
+            # button press during them shows arrivals until that refresh.
+            if button_result == 2:
+                awake_until = current_time + DATA_REFRESH_INTERVAL
+            if not display.night_mode and current_time >= awake_until and display.is_quiet_hours():
+                display.show_night_mode()
+
+            # Nothing to fetch or draw until quiet hours end or the button is pressed
+            if display.night_mode and display.is_quiet_hours():
+                if not sleeping:
+                    sleeping = True
+                    log.info("Idle for %ds of quiet hours", display.quiet_schedule.seconds_left())
+                    if QUIET_WIFI_OFF:
+                        if push_client:
+                            push_client.close()
+                            push_client = None
+                        connection_manager.suspend()
+                if push_client:
+                    monitor.stage("push")
+                    push_client.loop(timeout=QUIET_POLL_INTERVAL)
+                else:
+                    time.sleep(QUIET_POLL_INTERVAL)
+                continue
+            if sleeping:
+                sleeping = False
+                need_refresh = True
+                last_refresh_time = current_time
+                if QUIET_WIFI_OFF:
+                    connection_manager.resume()
+                    push_client = connect_push(connection_manager, stations)
+
             # Fetch new data if needed
             if need_refresh:
-                north_text, north_colors, south_text, south_colors = fetch_train_data(connection_manager)
-                
+                if push_client:
+                    # Pushed arrivals are already here; just recount the minutes
+                    pages = pushed_station_pages(push_client, feeds, stations, schedule, pages)
+                else:
+                    pages = fetch_station_pages(connection_manager, feeds, stations, schedule, pages)
+                    record_heap(heap_monitor, connection_manager)
+                if not pages:
+                    raise Exception("No train data")
+                snapshot.save(snapshot_lines(pages))
+                monitor.stage("draw")
+                page_index %= len(pages)
+                station, text1, colors1, text2, colors2, _ = pages[page_index]
+
                 # Skip button check if this refresh was triggered by button press
                 if button_result == 2:
-                    display._static_display(north_text, north_colors, south_text, south_colors)
+                    show_page(display, pages[page_index], "render")
                 else:
+                    display.set_route(station["route"])
                     display.update_display(
-                        north_text,
-                        north_colors,
-                        south_text,
-                        south_colors,
+                        text1,
+                        colors1,
+                        text2,
+                        colors2,
                         scroll_times=SCROLL_TIMES,
                     )
-            
-            # Small delay to prevent CPU hogging
-            time.sleep(0.1)
+                if push_client:
+                    push_client.mark_drawn(time.time() - EST_OFFSET)
+                profiler.tick()
+                governor.end_cycle()
+                telemetry.refreshed()
+                telemetry.poll(connection_manager)
+                if connection_manager.clock.needs_ntp():
+                    monitor.stage("ntp")
+                    connection_manager.sync_time(tz_offset=-5)
+
+            # Page through stations while the board is showing arrivals
+            monitor.stage("page")
+            if (
+                pages
+                and len(pages) > 1
+                and not display.night_mode
+                and current_time - last_page_time >= STATION_PAGE_INTERVAL
+            ):
+                page_index = (page_index + 1) % len(pages)
+                if STATION_NAME_SECONDS and pages[page_index][0]["name"]:
+                    show_station_name(display, pages[page_index])
+                    name_shown = True
+                else:
+                    show_page(display, pages[page_index])
+                last_page_time = current_time
+
+            # Swap the name back for arrivals once it's been read
+            if (
+                name_shown
+                and pages
+                and not display.night_mode
+                and current_time - last_page_time >= STATION_NAME_SECONDS
+            ):
+                show_page(display, pages[page_index])
+                name_shown = False
+
+            # Small delay to prevent CPU hogging; in push mode we wait on the socket instead
+            if push_client:
+                monitor.stage("push")
+                push_client.loop(timeout=0.1)
+            else:
+                monitor.stage("idle")
+                time.sleep(0.1)
 
         except Exception as e:
+            monitor.stage("reinit")
+            telemetry.error()
             display_error(display, e)
+            # The error replaced whatever page was up, name or not
+            name_shown = False
+            if push_client:
+                push_client.close()
+                push_client = None
+            # The new manager opens its own sockets; the ESP32 only has a few
+            connection_manager.close()
             try:
                 connection_manager, display = initialize_system()
+                push_client = connect_push(connection_manager, stations)
             except Exception as reinit_error:
-                print(f"Failed to reinitialize: {reinit_error}")
+                log.error("Failed to reinitialize: %s", reinit_error)
                 time.sleep(30)
+        finally:
+            monitor.end_iteration()
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except BaseException as e:
+        # Crashed or stopped with Ctrl-C: show what led up to it
+        log.dump()
+        if isinstance(e, KeyboardInterrupt):
+            # Don't let the watchdog reset the board out from under the REPL
+            monitor.stop()
+        raise
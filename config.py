@@ -7,6 +7,12 @@ import os
 # Example: https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l
 MTA_FEED_URL = ""
 
+# Where MTA_FEED_URL points
+# "mta" fetches the GTFS-realtime feed directly
+# "aggregator" fetches pre-filtered arrivals from tools/aggregator.py; set
+# MTA_FEED_URL to the aggregator's base URL, e.g. http://192.168.1.10:8080
+FEED_MODE = "mta"
+
 # The stop ID for the northbound train
 # Example: "L16N"
 STOP_ID_NORTHBOUND = ""
@@ -15,9 +21,76 @@ STOP_ID_NORTHBOUND = ""
 # Example: "L16S"
 STOP_ID_SOUTHBOUND = ""
 
+# Multiple stations
+# Leave STATIONS empty to show just MTA_FEED_URL and the two stop IDs above.
+# Otherwise name each feed once in FEEDS and list the stations to page
+# through; every feed used is fetched concurrently on each refresh.
+# "name" and "route" can be left out when the stop index is installed.
+# Example:
+# FEEDS = {
+#     "L": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l",
+#     "G": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-g",
+# }
+# STATIONS = [
+#     {"name": "Lorimer St", "feed": "L", "route": "L", "stops": [("L10N", "City"), ("L10S", "Bkln")]},
+#     {"name": "Metropolitan Av", "feed": "G", "route": "G", "stops": [("G29N", "Qns"), ("G29S", "Bkln")]},
+# ]
+FEEDS = {}
+STATIONS = []
+
+# Seconds each station stays on screen when there's more than one
+STATION_PAGE_INTERVAL = 10
+
+# Seconds a station's name is shown when paging to it (0 to disable)
+STATION_NAME_SECONDS = 2
+
+# Stop index compiled from GTFS static data by tools/compile_stops.py.
+# When present, station names and routes not given above are looked up in it.
+STOP_INDEX_FILE = "/stops.idx"
+
 # Data refresh settings (seconds)
 DATA_REFRESH_INTERVAL = 30
 
+# Scheduled departures compiled from GTFS static data by
+# tools/compile_schedule.py, shown (marked with ~) when realtime data is
+# missing or its feed timestamp is older than REALTIME_STALE_SECONDS
+SCHEDULE_FILE = "/schedule.bin"
+REALTIME_STALE_SECONDS = 300
+
+# The last arrivals are kept in flash (microcontroller.nvm) and drawn at
+# boot while the network comes up. Written at most every SNAPSHOT_INTERVAL
+# seconds to spare the flash (0 to disable); ignored once older than
+# SNAPSHOT_MAX_AGE.
+SNAPSHOT_INTERVAL = 900
+SNAPSHOT_MAX_AGE = 1800
+
+# Clock settings
+
+# The clock is kept right from the Date header on each feed response; NTP
+# only runs when none has arrived for
+# CLOCK_MAX_SOURCE_AGE seconds. Errors of CLOCK_STEP_THRESHOLD seconds or
+# more are corrected at once, smaller ones a second at a time using the
+# median of the last CLOCK_SAMPLES readings.
+CLOCK_STEP_THRESHOLD = 30
+CLOCK_MAX_SOURCE_AGE = 3600
+CLOCK_SAMPLES = 5
+
+# Push mode settings
+
+# Receive arrival updates over MQTT from tools/mqtt_publisher.py instead of
+# polling MTA_FEED_URL. Falls back to polling if the broker can't be reached.
+PUSH_MODE_ENABLED = False
+
+# MQTT broker host
+# Example: "192.168.1.10"
+MQTT_BROKER = ""
+MQTT_PORT = 1883
+MQTT_USE_TLS = False
+MQTT_KEEP_ALIVE = 60  # seconds
+
+# Topics are <prefix>/<stop_id>
+MQTT_TOPIC_PREFIX = "subway"
+
 # Quiet hours settings
 
 # Quiet hours start time
@@ -36,6 +109,23 @@ QUIET_END_HOUR = 3
 # Example: 30 (30 minutes)
 QUIET_END_MIN = 30
 
+# Quiet hours for particular weekdays (0 = Monday), as (start hour, start
+# min, end hour, end min) for the window starting that day, or None for no
+# quiet hours. Days left out use the settings above.
+# Example: {4: (23, 0, 8, 0), 5: (23, 0, 8, 0)}
+QUIET_HOURS = {}
+
+# The same for dates, keyed "MM-DD" (every year) or "YYYY-MM-DD"; these win
+# over QUIET_HOURS. A window that ends when it starts lasts the whole day.
+# Example: {"12-25": (0, 0, 0, 0), "2026-12-31": None}
+QUIET_HOLIDAYS = {}
+
+# During quiet hours the board stops fetching and only checks the button,
+# every QUIET_POLL_INTERVAL seconds. With QUIET_WIFI_OFF the radio is also
+# turned off until they end.
+QUIET_POLL_INTERVAL = 0.25
+QUIET_WIFI_OFF = False
+
 # Colors (in RGB565 format)
 
 # Label color
@@ -57,19 +147,81 @@ SCROLLING_ENABLED = False
 SCROLL_SPEED = 0.02
 SCROLL_TIMES = 5
 
+# Route bullets, the night-mode moon and the charmap prebuilt by
+# tools/build_assets.py. Without it only the L bullet is drawn.
+ASSETS_FILE = "/assets.bin"
+
+# Matrix bit depth for arrivals (day) and for the night-mode moon. Each bit
+# of depth is another plane the panel scan has to shift out, which takes
+# CPU time away from fetching and parsing; fewer bits mean fewer shades
+# (2**depth levels per color channel). Below 3 bits COLOR_BLUE and most
+# route bullets change color, and the moon, drawn at the dimmest level the
+# depth has, gets brighter. When the two differ the matrix is rebuilt each
+# time the mode changes.
+MATRIX_BIT_DEPTH_DAY = 3
+MATRIX_BIT_DEPTH_NIGHT = 3
+
+# When the depths differ, time a busy loop with the panel scan paused and
+# running, once per depth, to log how much of the CPU the scan takes
+# (blanks the panel for about 2 * MATRIX_MEASURE_MS, e.g. 50; 0 to not
+# measure). If the lower depth turns out to save less than
+# MATRIX_MIN_SAVING percent of the CPU, the matrix stays at the day depth.
+MATRIX_MEASURE_MS = 0
+MATRIX_MIN_SAVING = 2
+
+# Telemetry
+# Every TELEMETRY_INTERVAL seconds the board summarizes its fetch, parse and
+# render times, heap headroom and errors. After a refresh, once
+# TELEMETRY_BATCH summaries are waiting, they're sent to the Adafruit IO
+# group TELEMETRY_GROUP (its feeds are created on first use), at most
+# TELEMETRY_BATCH per send. Sends are at least a minute apart, to stay
+# within Adafruit IO's free 30 data points a minute (each summary is 9),
+# and spaced so they take at most TELEMETRY_MAX_SHARE of the time. Each
+# post gives up after TELEMETRY_TIMEOUT seconds. Needs
+# ADAFRUIT_AIO_USERNAME and ADAFRUIT_AIO_KEY in settings.toml.
+# TELEMETRY_URL sends to another server with the same API instead, such as
+# tools/telemetry_sink.py. Example: "http://192.168.1.10:8090"
+TELEMETRY_ENABLED = False
+TELEMETRY_GROUP = "subway-display"
+TELEMETRY_INTERVAL = 300
+TELEMETRY_BATCH = 3
+TELEMETRY_MAX_SHARE = 0.02
+TELEMETRY_URL = ""
+TELEMETRY_TIMEOUT = 5
+
 # Error handling and retry settings
 MAX_RETRIES = 3
 RETRY_DELAY = 5
-WATCHDOG_TIMEOUT = 300  # 5 minutes
-MEMORY_THRESHOLD = 50000  # Minimum free memory in bytes before GC
-
-# System settings
-DEBUG_MODE = False  # Enable/disable debug logging
-
-
-def debug_print(*args, **kwargs):
-    if DEBUG_MODE:
-        print(*args, **kwargs)
+HTTP_TIMEOUT = 10  # Socket timeout for feed requests (seconds)
+FEED_GZIP = True  # Ask for gzip feeds when the firmware can inflate them as a stream
+FEED_BUFFER_SIZE = 65536  # Initial receive buffer for feeds; grows if a feed is larger
+WATCHDOG_TIMEOUT = 300  # Seconds without progress before the board resets (0 to disable)
+LOOP_STALL_MS = 15000  # Log main loop passes slower than this, with their slowest stage
+# Free heap (bytes) to keep. Below it the heap is collected before the next
+# fetch or parse; if that doesn't free enough, feeds are parsed for our stops
+# only and scrolling stops (and below half of it, two arrivals per stop).
+# Full service resumes after MEMORY_RECOVER_CYCLES refreshes with twice the
+# threshold free.
+MEMORY_THRESHOLD = 50000
+MEMORY_RECOVER_CYCLES = 10
+HEAP_REPORT_INTERVAL = 20  # Print heap stats every N refreshes (0 to disable)
+HEAP_PROBE_LARGEST_BLOCK = False  # Also find the largest free block (slower)
+
+# Per-stage timing of each refresh (fetch, parse, filter, format, render)
+# and of the draws made when paging between stations (page), kept over the last PROFILE_WINDOW runs of each stage with the free heap
+# before and after. Printed every PROFILE_REPORT_INTERVAL refreshes.
+PROFILE_ENABLED = False
+PROFILE_WINDOW = 32
+PROFILE_REPORT_INTERVAL = 20
+
+# Logging
+# Records at LOG_LEVEL and above ("debug", "info", "warning" or "error") are
+# kept in a ring of the last LOG_RING_SIZE records, printed after a crash or
+# with logger.log.dump() from the REPL. Only those at LOG_SERIAL_LEVEL and
+# above are also printed as they happen.
+LOG_LEVEL = "info"
+LOG_SERIAL_LEVEL = "info"
+LOG_RING_SIZE = 64
 
 
 def get_wifi_credentials():
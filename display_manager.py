@@ -6,6 +6,35 @@ import rgbmatrix
 import terminalio
 import array
 import time
+from assets import load_assets
+from quiet_hours import load_quiet_schedule
+from logger import log
+from profiler import profiler
+from memory_governor import governor
+
+try:
+    from supervisor import ticks_ms
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+# supervisor.ticks_ms() wraps around at this
+TICKS_PERIOD = 1 << 29
+
+# The moon's color at depths that can show it dimly
+NIGHT_MOON_COLOR = 0x222222
+
+
+def _count_loops(ms):
+    """Iterations of an empty loop in ms milliseconds: how much CPU Python is getting."""
+    start = ticks_ms()
+    count = 0
+    while (ticks_ms() - start) % TICKS_PERIOD < ms:
+        count += 1
+    return count
+
+# Characters checked against terminalio.FONT before trusting a baked charmap
+CHARMAP_CHECK = " 0Am~"
 
 
 class Display:
@@ -15,7 +44,14 @@ class Display:
     MATRIX_WIDTH = 128
     MATRIX_HEIGHT = 32
 
-    from config import QUIET_START_HOUR, QUIET_START_MIN, QUIET_END_HOUR, QUIET_END_MIN, SCROLL_SPEED
+    from config import (
+        SCROLL_SPEED,
+        ASSETS_FILE,
+        MATRIX_BIT_DEPTH_DAY,
+        MATRIX_BIT_DEPTH_NIGHT,
+        MATRIX_MEASURE_MS,
+        MATRIX_MIN_SAVING,
+    )
 
     def __init__(self, scroll_speed=SCROLL_SPEED, scrolling_enabled=False):
         displayio.release_displays()
@@ -24,31 +60,46 @@ class Display:
         self.scrolling_enabled = scrolling_enabled
         self.display_enabled = True
         self.night_mode = False
+        self.route = None
+        self.drawn = None  # (text1, colors1, text2, colors2) on the panel now
+        self.redraws_skipped = 0
+        self.assets = load_assets(self.ASSETS_FILE)
 
         # Initialize the matrix display
-        self._init_display()
+        self.scan_share = {}  # Bit depth -> percent of the CPU the panel scan took
+        # The depth to use in every mode once switching is off (or pointless)
+        self.fixed_depth = None
+        if self.MATRIX_BIT_DEPTH_DAY == self.MATRIX_BIT_DEPTH_NIGHT:
+            self.fixed_depth = self.MATRIX_BIT_DEPTH_DAY
+        self._init_display(self.MATRIX_BIT_DEPTH_DAY)
         
-        # Setup display elements
+        # Put the logo up as a boot frame before building everything else
         self._setup_display_groups()
+        self.display.root_group = self.main_group
+        self.display.refresh(minimum_frames_per_second=0)
+        self.first_frame_ns = time.monotonic_ns()
+        if self.fixed_depth is None:
+            self._measure_scan()
+
+        # Setup display elements
         self._setup_character_map()
         self._setup_line_resources()
-        self._setup_night_mode()
+        self.night_group = None  # Built the first time night mode is shown
 
         # Add manual night mode toggle flag
         self.manual_night_mode = False
+        self.quiet_schedule = load_quiet_schedule()
         
         # Setup button
         self._setup_button()
 
-        # Set initial root group
-        self.display.root_group = self.main_group
-
-    def _init_display(self):
+    def _init_display(self, bit_depth):
         """Initialize the RGB matrix display."""
-        matrix = rgbmatrix.RGBMatrix(
+        self.bit_depth = bit_depth
+        self.matrix = rgbmatrix.RGBMatrix(
             width=self.MATRIX_WIDTH,
             height=self.MATRIX_HEIGHT,
-            bit_depth=3,
+            bit_depth=bit_depth,
             rgb_pins=[
                 board.MTX_R1,
                 board.MTX_G1,
@@ -68,9 +119,74 @@ class Display:
             output_enable_pin=board.MTX_OE,
         )
 
-        self.display = framebufferio.FramebufferDisplay(matrix, auto_refresh=False)
+        self.display = framebufferio.FramebufferDisplay(self.matrix, auto_refresh=False)
         self.line_length = (self.MATRIX_WIDTH // self.CHAR_WIDTH) + 2
 
+    def _set_bit_depth(self, bit_depth):
+        """Rebuild the matrix at another bit depth, keeping what it shows.
+
+        RGBMatrix only takes its depth when it's created, so the display is
+        released and set up again; the caller refreshes it.
+        """
+        if self.fixed_depth is not None:
+            bit_depth = self.fixed_depth
+        if bit_depth == self.bit_depth:
+            return
+        previous_depth = self.bit_depth
+        root_group = self.display.root_group
+        displayio.release_displays()
+        try:
+            self._init_display(bit_depth)
+        except (MemoryError, ValueError, RuntimeError) as e:
+            # Most likely no room for the new framebuffer; stay where we were for good
+            log.warning("Matrix not rebuilt at %d-bit, staying at %d-bit: %s", bit_depth, previous_depth, e)
+            self.fixed_depth = previous_depth
+            # The new matrix may have been made before its display failed, and
+            # it holds the pins until it's let go
+            displayio.release_displays()
+            self.matrix.deinit()
+            try:
+                self._init_display(previous_depth)
+            except (MemoryError, ValueError, RuntimeError) as e:
+                # Drawing fails from here on and the main loop starts over
+                log.error("Matrix not rebuilt at %d-bit either: %s", previous_depth, e)
+                return
+        self.display.root_group = root_group
+        self._measure_scan()
+
+    def _measure_scan(self):
+        """Log how much of the CPU the panel scan takes at the current depth, once per depth.
+
+        With both depths measured, switching stops if it doesn't pay off.
+        """
+        if not self.MATRIX_MEASURE_MS or self.bit_depth in self.scan_share:
+            return
+        self.matrix.paused = True
+        idle = _count_loops(self.MATRIX_MEASURE_MS)
+        self.matrix.paused = False
+        busy = _count_loops(self.MATRIX_MEASURE_MS)
+        share = (idle - busy) * 100 // idle if idle else 0
+        self.scan_share[self.bit_depth] = max(share, 0)
+        others = ", ".join(
+            f"{depth}-bit {share}%" for depth, share in self.scan_share.items() if depth != self.bit_depth
+        )
+        log.info(
+            "Matrix at %d-bit: panel scan takes %d%% of the CPU%s",
+            self.bit_depth,
+            self.scan_share[self.bit_depth],
+            f" ({others})" if others else "",
+        )
+
+        day = self.scan_share.get(self.MATRIX_BIT_DEPTH_DAY)
+        night = self.scan_share.get(self.MATRIX_BIT_DEPTH_NIGHT)
+        if day is not None and night is not None and abs(day - night) < self.MATRIX_MIN_SAVING:
+            log.info(
+                "Changing bit depth saves under %d%% of the CPU; staying at %d-bit",
+                self.MATRIX_MIN_SAVING,
+                self.MATRIX_BIT_DEPTH_DAY,
+            )
+            self.fixed_depth = self.MATRIX_BIT_DEPTH_DAY
+
     def _setup_display_groups(self):
         """Setup display groups for main content and logos."""
         self.main_group = displayio.Group()
@@ -82,9 +198,8 @@ class Display:
         self.logo_palette = displayio.Palette(2)
         self.logo_palette[0] = 0x000000  # Off (black)
         self.logo_palette[1] = 0xFFFFFF  # On (white)
-
-        # Draw the L-circle logo
-        self._draw_logo_bitmap(self.logo_bitmap)
+        if self.assets:
+            self._bullet_pixels = bytearray(self.assets.bullet_width * self.assets.bullet_height)
 
         # Create groups for logos
         self.logo1 = displayio.Group()
@@ -112,11 +227,23 @@ class Display:
         self.line1.x = 14  # Move text right to make room for logo
         self.line2.x = 14
 
+        # Draw the L-circle logo
+        self.set_route("L")
+
     def _setup_character_map(self):
         """Setup character mapping for text display."""
-        # Create a mapping from ASCII to font tile indices
+        if self.assets:
+            self.charmap = array.array("b", bytes(256))
+            self.assets.load_charmap(self.charmap)
+            # The baked map assumes the font's usual layout; make sure
+            if all(self.charmap[ord(ch)] == terminalio.FONT.get_glyph(ord(ch)).tile_index for ch in CHARMAP_CHECK):
+                return
+            log.warning("Baked charmap doesn't match the font, rebuilding it")
+
+        # Create a mapping from ASCII to font tile indices. We only ever draw
+        # printable ASCII, so skip looking up the rest of the font.
         self.charmap = array.array("b", [terminalio.FONT.get_glyph(32).tile_index]) * 256
-        for ch in range(256):
+        for ch in range(33, 127):
             glyph = terminalio.FONT.get_glyph(ch)
             if glyph is not None:
                 self.charmap[ch] = glyph.tile_index
@@ -158,10 +285,13 @@ class Display:
         self.night_bitmap = displayio.Bitmap(8, 8, 2)
         self.night_palette = displayio.Palette(2)
         self.night_palette[0] = 0x000000  # Off (black)
-        self.night_palette[1] = 0x222222  # Very dim white
+        self.night_palette[1] = NIGHT_MOON_COLOR  # Very dim white
 
         # Draw the moon shape
-        self._draw_moon_bitmap(self.night_bitmap)
+        if self.assets:
+            self.assets.draw_moon(self.night_bitmap)
+        else:
+            self._draw_moon_bitmap(self.night_bitmap)
 
         # Create tile grid for night icon
         self.night_grid = displayio.TileGrid(
@@ -235,6 +365,38 @@ class Display:
                 if (x-4.5)**2 + (y-3.5)**2 <= 8:
                     bitmap[x, y] = 0
 
+    def set_route(self, route):
+        """Show the route bullet for the current station.
+
+        Bullets come from the asset pack; without it only the L can be
+        drawn and other routes hide the logos.
+        """
+        if route == self.route:
+            return
+        self.route = route
+        self.drawn = None
+
+        hidden = False
+        if self.assets and self.assets.has_bullet(route):
+            color = self.assets.draw_bullet(route, self.logo_bitmap, self._bullet_pixels)
+            self.logo_palette[1] = self._panel_color(color)
+        elif route == "L":
+            self._draw_logo_bitmap(self.logo_bitmap)
+            self.logo_palette[1] = 0xFFFFFF
+        else:
+            hidden = True
+        self.logo1.hidden = hidden
+        self.logo2.hidden = hidden
+
+    @staticmethod
+    def _panel_color(rgb):
+        """Convert RGB to what this matrix shows correctly.
+
+        The panel has green and blue swapped, which the COLOR_ values in
+        config.py already account for.
+        """
+        return (rgb & 0xFF0000) | ((rgb & 0xFF) << 8) | ((rgb >> 8) & 0xFF)
+
     def check_button(self):
         """Check if button was pressed and toggle night mode."""
         # Read current button state (False = pressed, True = not pressed)
@@ -248,7 +410,6 @@ class Display:
         
         # Handle button press
         if button_newly_pressed:
-            print("BUTTON PRESSED!")
             # Toggle manual night mode
             self.manual_night_mode = not self.manual_night_mode
             
@@ -256,11 +417,11 @@ class Display:
             time.sleep(self.debounce_time)
             
             if self.manual_night_mode:
-                print("Manual night mode ON")
+                log.info("Manual night mode on")
                 self.show_night_mode()
                 return 1  # Button turned night mode ON
             else:
-                print("Manual night mode OFF")
+                log.info("Manual night mode off")
                 self.show_normal_mode()
                 return 2  # Button turned night mode OFF
         
@@ -287,33 +448,17 @@ class Display:
 
     def is_quiet_hours(self):
         """Check if current time is within quiet hours."""
-        current_time = time.localtime()
-        current_hour = current_time.tm_hour
-        current_minute = current_time.tm_min
-
-        print(f"Current time: {current_hour}:{current_minute}")
-        print(f"Quiet hours: {self.QUIET_START_HOUR}:{self.QUIET_START_MIN} to {self.QUIET_END_HOUR}:{self.QUIET_END_MIN}")
-        
-        # If we're after start hour
-        if current_hour > self.QUIET_START_HOUR or (
-            current_hour == self.QUIET_START_HOUR and 
-            current_minute >= self.QUIET_START_MIN
-        ):
-            return True
-            
-        # If we're before end hour/minute
-        if current_hour < self.QUIET_END_HOUR or (
-            current_hour == self.QUIET_END_HOUR and 
-            current_minute < self.QUIET_END_MIN
-        ):
-            return True
-        
-        # Otherwise, not in quiet hours
-        return False
+        return self.quiet_schedule.is_quiet()
     
     def show_night_mode(self):
         """Switch display to night mode."""
         if not self.night_mode:
+            if self.night_group is None:
+                self._setup_night_mode()
+            self._set_bit_depth(self.MATRIX_BIT_DEPTH_NIGHT)
+            # The dimmest level this depth can show, so the moon doesn't vanish
+            level = 1 << (8 - self.bit_depth)
+            self.night_palette[1] = NIGHT_MOON_COLOR if level < 0x22 else level * 0x010101
             self.display.brightness = 0.1  # Very dim
             self.main_group.hidden = True
             self.display.root_group = self.night_group
@@ -324,6 +469,7 @@ class Display:
     def show_normal_mode(self):
         """Switch display to normal mode."""
         if self.night_mode or self.manual_night_mode:  # Check both flags
+            self._set_bit_depth(self.MATRIX_BIT_DEPTH_DAY)
             self.display.brightness = 1
             self.main_group.hidden = False
             self.display.root_group = self.main_group
@@ -350,20 +496,32 @@ class Display:
         self.show_normal_mode()
             
         # Continue with normal display update
-        if self.scrolling_enabled:
+        if self.scrolling_enabled and governor.allow_scrolling:
             self._scroll_text(text1, colors1, text2, colors2, scroll_times)
         else:
             self._static_display(text1, colors1, text2, colors2)
 
 
-    def _static_display(self, text1, colors1, text2, colors2):
-        """Display text without scrolling."""
-        self.set_text_with_colors(text1, colors1, 0)
-        self.set_text_with_colors(text2, colors2, 1)
-        self.display.refresh(minimum_frames_per_second=0)
+    def _static_display(self, text1, colors1, text2, colors2, stage="render"):
+        """Display text without scrolling, unless it's already showing.
+
+        The draw is timed as stage: "render" after a refresh, "page" when
+        paging between stations.
+        """
+        shown = (text1, colors1, text2, colors2)
+        if shown == self.drawn:
+            self.redraws_skipped += 1
+            log.debug("Nothing changed on screen, not redrawn (%d skipped)", self.redraws_skipped)
+            return
+        with profiler.span(stage):
+            self.set_text_with_colors(text1, colors1, 0)
+            self.set_text_with_colors(text2, colors2, 1)
+            self.display.refresh(minimum_frames_per_second=0)
+        self.drawn = shown
 
     def _scroll_text(self, text1, colors1, text2, colors2, scroll_times=5):
         """Scroll text across the display."""
+        self.drawn = None
         padding = " " * self.line_length
         full_text1 = padding + text1 + padding
         full_text2 = padding + text2 + padding
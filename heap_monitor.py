@@ -0,0 +1,63 @@
+import gc
+
+
+def largest_free_block(limit=None, granularity=256):
+    """Find the largest bytearray the heap can currently hand out.
+
+    Binary-searches with trial allocations, so it costs a few allocations
+    and a collection; only call it when HEAP_PROBE_LARGEST_BLOCK is set.
+    """
+    gc.collect()
+    low = 0
+    high = limit if limit is not None else gc.mem_free()
+    while high - low > granularity:
+        mid = (low + high) // 2
+        try:
+            block = bytearray(mid)
+            del block
+            low = mid
+        except MemoryError:
+            high = mid
+    gc.collect()
+    return low
+
+
+class HeapMonitor:
+    """Tracks heap usage across refresh cycles."""
+
+    def __init__(self, probe_largest_block=False):
+        self.probe_largest_block = probe_largest_block
+        self.cycles = 0
+        self.free = 0
+        self.min_free = None
+        self.high_water = 0  # Most bytes allocated at any sample
+        self.largest_block = None
+        self.min_largest_block = None
+
+    def sample(self):
+        """Record the heap state after a refresh."""
+        self.cycles += 1
+        self.free = gc.mem_free()
+        allocated = gc.mem_alloc()
+
+        if self.min_free is None or self.free < self.min_free:
+            self.min_free = self.free
+        if allocated > self.high_water:
+            self.high_water = allocated
+
+        if self.probe_largest_block:
+            self.largest_block = largest_free_block(self.free)
+            if self.min_largest_block is None or self.largest_block < self.min_largest_block:
+                self.min_largest_block = self.largest_block
+
+    def report(self, rx_buffer=None):
+        """Print a one-line summary of the heap over all sampled cycles."""
+        line = (
+            f"Heap after {self.cycles} refreshes: free={self.free} min_free={self.min_free} "
+            f"high_water={self.high_water}"
+        )
+        if self.largest_block is not None:
+            line += f" largest_block={self.largest_block} min_largest_block={self.min_largest_block}"
+        if rx_buffer is not None:
+            line += f" rx_buffer={len(rx_buffer.buf)} grows={rx_buffer.grows}"
+        print(line)
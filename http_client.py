@@ -0,0 +1,668 @@
+"""
+Minimal keep-alive HTTP/1.1 client for the feed fetches.
+
+adafruit_requests hides the socket lifecycle, so a refresh that goes wrong
+throws away the TLS session and we can't tell where the time went. This
+client keeps one socket open per (scheme, host, port) across refreshes and
+records how long each phase of a request took:
+
+  dns       getaddrinfo
+  connect   TCP connect (includes the TLS handshake when the ssl module
+            can't run it as a separate step)
+  tls       TLS handshake
+  transfer  request sent -> last body byte read
+
+Gzip bodies are decompressed as they stream off the socket, so the
+compressed body is never held in memory next to the decompressed one.
+Bodies can be read into a long-lived ReceiveBuffer instead of a fresh
+bytes object per refresh, which keeps the heap from fragmenting.
+
+It only relies on the socketpool/ssl API that CircuitPython and CPython
+share, so the same code runs on the board and against a local test server
+(see tools/fetch_bench.py).
+"""
+
+import gc
+import time
+
+from logger import log
+
+try:
+    import deflate  # MicroPython-style streaming decompressor
+except ImportError:
+    deflate = None
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+try:
+    from io import IOBase
+except ImportError:
+    IOBase = object
+
+# Socket read chunk size for headers and small bodies
+RECV_CHUNK = 1024
+
+# Compressed bytes read per step when inflating a gzip body
+GZIP_CHUNK = 2048
+
+# Receive buffers grow in steps of this many bytes
+BUFFER_STEP = 4096
+
+# Bytes read past a full ReceiveBuffer to tell the end of the body from more data
+PROBE_SIZE = 256
+
+# Returned by conditional fetches when the server answers 304
+NOT_MODIFIED = object()
+
+# True when this firmware can inflate gzip bodies incrementally. CircuitPython's
+# zlib only has a one-shot decompress(), which would need both copies in RAM.
+GZIP_SUPPORTED = deflate is not None or hasattr(zlib, "decompressobj")
+
+
+def parse_url(url):
+    """Split an http(s) URL into (scheme, host, port, path)."""
+    scheme, _, rest = url.partition("://")
+    if not rest:
+        raise ValueError(f"Unsupported URL: {url}")
+    scheme = scheme.lower()
+    if scheme not in ("http", "https"):
+        raise ValueError(f"Unsupported scheme: {scheme}")
+
+    slash = rest.find("/")
+    if slash < 0:
+        hostport, path = rest, "/"
+    else:
+        hostport, path = rest[:slash], rest[slash:]
+
+    if ":" in hostport:
+        host, port = hostport.rsplit(":", 1)
+        port = int(port)
+    else:
+        host = hostport
+        port = 443 if scheme == "https" else 80
+
+    return scheme, host, port, path
+
+
+def _elapsed_ms(start_ns):
+    return (time.monotonic_ns() - start_ns) // 1000000
+
+
+class Response:
+    """A response whose body is streamed from the connection's socket."""
+
+    def __init__(self, connection, status_code, headers):
+        self._connection = connection
+        self.status_code = status_code
+        self.headers = headers
+        self.received_ns = time.monotonic_ns()  # When the headers were read
+        self._done = False
+        self.wire_bytes = 0
+        self.content_encoding = headers.get("content-encoding", "").lower()
+
+        self._chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        self._chunk_left = 0
+        length = headers.get("content-length")
+        self._remaining = int(length) if length is not None else None
+        self.keep_alive = headers.get("connection", "").lower() != "close" and (
+            self._chunked or self._remaining is not None
+        )
+
+        if status_code in (204, 304) or (self._remaining == 0 and not self._chunked):
+            self._done = True
+
+    def readinto(self, buf):
+        """Read raw body bytes into buf, returning the count (0 at end of body)."""
+        n = self._read_wire(buf)
+        self.wire_bytes += n
+        return n
+
+    def _read_wire(self, buf):
+        if self._done or not len(buf):
+            return 0
+
+        if self._chunked:
+            if self._chunk_left == 0:
+                size_line = self._connection._readline()
+                self._chunk_left = int(size_line.split(b";")[0], 16)
+                if self._chunk_left == 0:
+                    # Skip trailers up to the terminating blank line
+                    while self._connection._readline():
+                        pass
+                    self._done = True
+                    return 0
+            n = self._connection._readinto(buf, min(len(buf), self._chunk_left))
+            if n == 0:
+                raise OSError("connection closed mid-body")
+            self._chunk_left -= n
+            if self._chunk_left == 0:
+                self._connection._readline()  # CRLF after chunk data
+            return n
+
+        if self._remaining is None:
+            # No framing: the body runs until the server closes the socket
+            try:
+                n = self._connection._readinto(buf, len(buf))
+            except OSError:
+                n = 0
+            if n == 0:
+                self._done = True
+            return n
+
+        n = self._connection._readinto(buf, min(len(buf), self._remaining))
+        if n == 0:
+            # Only an unframed body may end on close; this one is truncated
+            raise OSError("connection closed mid-body")
+        self._remaining -= n
+        if self._remaining == 0:
+            self._done = True
+        return n
+
+    def body_reader(self):
+        """Return an object whose readinto() yields the decoded body."""
+        if self.content_encoding == "gzip":
+            return GzipDecoder(self)
+        if self.content_encoding not in ("", "identity"):
+            raise OSError(f"Unsupported Content-Encoding: {self.content_encoding}")
+        return self
+
+    def read(self):
+        """Read the rest of the (decoded) body and return it as bytes."""
+        reader = self.body_reader()
+        body = bytearray()
+        chunk = bytearray(RECV_CHUNK)
+        view = memoryview(chunk)
+        while True:
+            n = reader.readinto(view)
+            if not n:
+                break
+            body.extend(view[:n])
+        self.close()
+        return bytes(body)
+
+    def read_into(self, receive_buffer):
+        """Read the rest of the (decoded) body into a ReceiveBuffer.
+
+        Returns a memoryview of the body that stays valid until the buffer
+        is reused.
+        """
+        expected = None
+        if self.content_encoding in ("", "identity"):
+            expected = self._remaining
+        try:
+            return receive_buffer.fill(self.body_reader(), expected)
+        finally:
+            self.close()
+
+    def close(self):
+        """Finish with the response, keeping the socket only if it's reusable."""
+        if not self._done and self.keep_alive:
+            # Drain what's left so the next request starts on a clean stream
+            scratch = memoryview(bytearray(RECV_CHUNK))
+            try:
+                while self.readinto(scratch):
+                    pass
+            except OSError:
+                self.keep_alive = False
+        if not self._done or not self.keep_alive:
+            self._connection.close()
+        self._connection._finish_transfer()
+
+
+class ReceiveBuffer:
+    """A long-lived bytearray that response bodies are read into.
+
+    It is allocated once and only replaced when a body doesn't fit, so a
+    board refreshing every 30 s stops allocating a feed-sized bytes object
+    each time.
+    """
+
+    def __init__(self, size):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.length = 0
+        self.grows = 0
+        # Read into when the buffer is full, to find out whether more is coming
+        self._probe = memoryview(bytearray(PROBE_SIZE))
+
+    def reserve(self, size):
+        """Make sure at least size bytes fit, keeping the current contents."""
+        if size <= len(self.buf):
+            return
+        size = (size + BUFFER_STEP - 1) // BUFFER_STEP * BUFFER_STEP
+        old_buf = self.buf
+        old_size = len(old_buf)
+        keep = self.length
+        self.view = None
+        if not keep:
+            # Nothing to copy, so let the old block go before asking for a new one
+            self.buf = old_buf = None
+        gc.collect()
+
+        try:
+            new_buf = bytearray(size)
+        except MemoryError:
+            if old_buf is None:
+                old_buf = bytearray(old_size)
+            self.buf = old_buf
+            self.view = memoryview(old_buf)
+            raise
+
+        if keep:
+            new_buf[:keep] = memoryview(old_buf)[:keep]
+        self.buf = new_buf
+        self.view = memoryview(new_buf)
+        self.grows += 1
+
+    def fill(self, reader, expected=None):
+        """Read from reader until it's exhausted; returns a view of the data.
+
+        expected is the body size when the server told us (Content-Length),
+        so the buffer grows at most once and before any data is copied.
+        A full buffer only grows once a probe read shows there's more.
+        """
+        self.length = 0
+        if expected:
+            self.reserve(expected)
+        while True:
+            if self.length == len(self.buf):
+                if expected is not None and self.length >= expected:
+                    break
+                n = reader.readinto(self._probe)
+                if not n:
+                    break
+                self.reserve(self.length + n + len(self.buf) // 2)
+                self.buf[self.length : self.length + n] = self._probe[:n]
+                self.length += n
+                continue
+            n = reader.readinto(self.view[self.length :])
+            if not n:
+                break
+            self.length += n
+        return self.view[: self.length]
+
+
+class _WireStream(IOBase):
+    """Stream wrapper so deflate.DeflateIO can pull raw body bytes."""
+
+    def __init__(self, response):
+        self._response = response
+
+    def readinto(self, buf):
+        return self._response.readinto(buf)
+
+
+class GzipDecoder:
+    """Inflates a gzip response body chunk by chunk."""
+
+    def __init__(self, response):
+        if not GZIP_SUPPORTED:
+            raise OSError("gzip body received but no streaming decompressor available")
+        self._response = response
+        self._pending = b""
+        self._tail = b""
+        self._eof = False
+        if deflate is not None:
+            self._stream = deflate.DeflateIO(_WireStream(response), deflate.GZIP)
+            self._inflater = None
+        else:
+            self._stream = None
+            self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self._in = memoryview(bytearray(GZIP_CHUNK))
+
+    def readinto(self, buf):
+        """Write decompressed bytes into buf, returning the count (0 at end)."""
+        if self._stream is not None:
+            return self._stream.readinto(buf)
+
+        while True:
+            if self._pending:
+                n = min(len(buf), len(self._pending))
+                buf[:n] = self._pending[:n]
+                self._pending = self._pending[n:]
+                return n
+            if self._eof:
+                return 0
+
+            if self._tail:
+                data = self._tail
+            else:
+                n = self._response.readinto(self._in)
+                if not n:
+                    self._eof = True
+                    self._pending = self._inflater.flush()
+                    continue
+                data = self._in[:n]
+
+            # Cap the output at len(buf); leftover input waits in unconsumed_tail
+            self._pending = self._inflater.decompress(data, len(buf))
+            self._tail = self._inflater.unconsumed_tail
+
+
+class Connection:
+    """A persistent connection to one host, reopened only when it breaks."""
+
+    def __init__(self, pool, ssl_context, host, port, use_tls, timeout=10):
+        self._pool = pool
+        self._ssl_context = ssl_context
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+        self.sock = None
+        self._buf = bytearray(RECV_CHUNK)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+        # Counters for verifying that sockets really are reused
+        self.handshakes = 0
+        self.requests = 0
+        self.reused = 0
+
+        # Phase timings (ms) of the most recent request
+        self.timing = {"dns": 0, "connect": 0, "tls": 0, "transfer": 0}
+        self._transfer_start = 0
+
+    def _open(self):
+        """Resolve, connect and (optionally) run the TLS handshake."""
+        start = time.monotonic_ns()
+        addr = self._pool.getaddrinfo(self.host, self.port)[0][-1]
+        self.timing["dns"] = _elapsed_ms(start)
+
+        sock = self._pool.socket(self._pool.AF_INET, self._pool.SOCK_STREAM)
+        split_handshake = False
+        if self.use_tls:
+            try:
+                sock = self._ssl_context.wrap_socket(
+                    sock, server_hostname=self.host, do_handshake_on_connect=False
+                )
+                split_handshake = hasattr(sock, "do_handshake")
+            except TypeError:
+                # CircuitPython's ssl handshakes inside connect()
+                sock = self._ssl_context.wrap_socket(sock, server_hostname=self.host)
+        sock.settimeout(self.timeout)
+
+        start = time.monotonic_ns()
+        try:
+            sock.connect(addr)
+            self.timing["connect"] = _elapsed_ms(start)
+
+            self.timing["tls"] = 0
+            if split_handshake:
+                start = time.monotonic_ns()
+                sock.do_handshake()
+                self.timing["tls"] = _elapsed_ms(start)
+        except Exception:
+            sock.close()
+            raise
+
+        if self.use_tls:
+            self.handshakes += 1
+        self.sock = sock
+        self._start = self._end = 0
+
+    def close(self):
+        """Close the socket; the next request will reconnect."""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        self._start = self._end = 0
+
+    def _fill(self):
+        n = self.sock.recv_into(self._buf, len(self._buf))
+        if not n:
+            raise OSError("Connection closed by server")
+        self._start = 0
+        self._end = n
+
+    def _readline(self):
+        """Read one CRLF-terminated line, returned without the line ending."""
+        line = bytearray()
+        while True:
+            if self._start >= self._end:
+                self._fill()
+            b = self._buf[self._start]
+            self._start += 1
+            if b == 10:
+                return bytes(line)
+            if b != 13:
+                line.append(b)
+
+    def _readinto(self, buf, nbytes):
+        """Read up to nbytes into buf, serving buffered bytes first."""
+        if self._start < self._end:
+            n = min(nbytes, self._end - self._start)
+            buf[:n] = self._view[self._start : self._start + n]
+            self._start += n
+            return n
+        return self.sock.recv_into(buf, nbytes)
+
+    def _finish_transfer(self):
+        if self._transfer_start:
+            self.timing["transfer"] = _elapsed_ms(self._transfer_start)
+            self._transfer_start = 0
+
+    def send_request(self, method, path, headers=None, body=None):
+        """Send a request, opening the socket first if needed."""
+        if self.sock is None:
+            self._open()
+        else:
+            self.reused += 1
+            self.timing["dns"] = self.timing["connect"] = self.timing["tls"] = 0
+
+        self._transfer_start = time.monotonic_ns()
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", "Connection: keep-alive"]
+        if headers:
+            for name, value in headers.items():
+                lines.append(f"{name}: {value}")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+        self._sendall(request)
+        if body is not None:
+            self._sendall(body)
+        self.requests += 1
+
+    def _sendall(self, data):
+        view = memoryview(data)
+        while len(view):
+            sent = self.sock.send(view)
+            view = view[sent:]
+
+    def get_response(self):
+        """Read the status line and headers of the pending request."""
+        status_line = self._readline()
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise OSError(f"Bad status line: {status_line}")
+        status_code = int(parts[1])
+
+        headers = {}
+        while True:
+            line = self._readline()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            headers[str(name, "utf-8").strip().lower()] = str(value, "utf-8").strip()
+
+        return Response(self, status_code, headers)
+
+    def request(self, method, path, headers=None, body=None):
+        """Send a request and return its Response.
+
+        A reused socket may have been closed by the server while idle; in that
+        case we reconnect once before giving up.
+        """
+        reused = self.sock is not None
+        try:
+            self.send_request(method, path, headers, body)
+            return self.get_response()
+        except OSError:
+            self.close()
+            if not reused:
+                raise
+        self.send_request(method, path, headers, body)
+        return self.get_response()
+
+
+class FeedClient:
+    """Pool of persistent connections keyed by (scheme, host, port, slot).
+
+    The slot lets several feeds on the same host each keep their own socket,
+    so their requests can be in flight at the same time (see fetch_many).
+    """
+
+    def __init__(self, pool, ssl_context, timeout=10):
+        self._pool = pool
+        self._ssl_context = ssl_context
+        self.timeout = timeout
+        self._connections = {}
+        self.last_connection = None
+        self.last_response = None
+        # Last ETag seen per URL, for conditional fetches
+        self._etags = {}
+
+    def connection_for(self, url, slot=0):
+        """Return (connection, path) for url, creating the connection once."""
+        scheme, host, port, path = parse_url(url)
+        key = (scheme, host, port, slot)
+        conn = self._connections.get(key)
+        if conn is None:
+            conn = Connection(
+                self._pool, self._ssl_context, host, port, scheme == "https", self.timeout
+            )
+            self._connections[key] = conn
+        return conn, path
+
+    def get(self, url, headers=None, slot=0):
+        """Issue a GET over the persistent connection for url's host."""
+        conn, path = self.connection_for(url, slot)
+        self.last_connection = conn
+        return conn.request("GET", path, headers)
+
+    def fetch_many(self, urls, receive_buffers, headers=None):
+        """Fetch several URLs with all of their requests in flight at once.
+
+        URL i uses connection slot i and receive_buffers[i]. Every request is
+        sent before any response is read, so the servers work on them in
+        parallel and the wait is about the slowest feed plus the transfers,
+        not the sum of every round trip. Returns a list of memoryviews with
+        None where a feed failed; callers retry those with fetch_with_retry.
+        """
+        sent = []
+        for slot, url in enumerate(urls):
+            conn, path = self.connection_for(url, slot)
+            try:
+                conn.send_request("GET", path, headers)
+            except OSError:
+                # A kept-alive socket may have gone stale while idle; reconnect once
+                conn.close()
+                try:
+                    conn.send_request("GET", path, headers)
+                except OSError as e:
+                    log.warning("Request failed for %s: %s", url, e)
+                    conn.close()
+                    conn = None
+            sent.append(conn)
+
+        results = []
+        try:
+            for conn, receive_buffer in zip(sent, receive_buffers):
+                data = None
+                if conn is not None:
+                    try:
+                        response = conn.get_response()
+                        self.last_response = response
+                        if response.status_code == 200:
+                            data = response.read_into(receive_buffer)
+                        else:
+                            log.warning("HTTP error: %d", response.status_code)
+                            response.close()
+                    except (OSError, RuntimeError, ValueError) as e:
+                        log.warning("Network error reading %s: %s", conn.host, e)
+                        conn.close()
+                results.append(data)
+        except Exception:
+            # This response and every one not yet read are still on their
+            # sockets; drop them so the next fetch doesn't read them instead
+            for conn in sent[len(results):]:
+                if conn is not None:
+                    conn.close()
+            raise
+        return results
+
+    def fetch_with_retry(
+        self, url, receive_buffer, headers=None, conditional=False, max_retries=3, retry_delay=5, slot=0
+    ):
+        """Fetch url into receive_buffer, retrying server and network errors.
+
+        Returns a memoryview of the body, NOT_MODIFIED for a 304 on a
+        conditional fetch, or None for other HTTP errors. Only the socket
+        that failed is dropped between attempts.
+        """
+        if conditional and url in self._etags:
+            headers = dict(headers or {})
+            headers["If-None-Match"] = self._etags[url]
+
+        for attempt in range(max_retries):
+            try:
+                response = self.get(url, headers, slot)
+                self.last_response = response
+                if response.status_code == 200:
+                    data = response.read_into(receive_buffer)
+                    if conditional and "etag" in response.headers:
+                        self._etags[url] = response.headers["etag"]
+                    return data
+
+                response.close()
+
+                if response.status_code == 304 and conditional:
+                    return NOT_MODIFIED
+
+                # Retry on server errors
+                if response.status_code in (500, 502, 503, 504):
+                    log.warning("Server error %d, retrying...", response.status_code)
+                    time.sleep(retry_delay)
+                    continue
+
+                log.warning("HTTP error: %d", response.status_code)
+                return None
+
+            except (OSError, RuntimeError) as e:
+                log.warning("Network error on attempt %d: %s", attempt + 1, e)
+                self.reset(url, slot)
+                if attempt < max_retries - 1:
+                    time.sleep(retry_delay)
+                else:
+                    log.error("Max retries reached")
+                    raise
+
+        return None
+
+    def reset(self, url, slot=0):
+        """Drop the socket for url's host after a network error."""
+        conn, _ = self.connection_for(url, slot)
+        conn.close()
+
+    def close(self):
+        """Close every open socket."""
+        for conn in self._connections.values():
+            conn.close()
+
+    def stats(self):
+        """Totals across all connections."""
+        totals = {"handshakes": 0, "requests": 0, "reused": 0}
+        for conn in self._connections.values():
+            totals["handshakes"] += conn.handshakes
+            totals["requests"] += conn.requests
+            totals["reused"] += conn.reused
+        return totals
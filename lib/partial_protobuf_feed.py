@@ -21,6 +21,15 @@ Within each entity (field_num=2 repeated):
   subfield #4 => vehicle or extension data
 
 We parse enough to find trip updates and stop_time_updates that contain, e.g., "L16N"/"L16S."
+
+The parser accepts any buffer: bytes, bytearray or a memoryview into the
+connection's receive buffer. Sub-messages are sliced, which for a memoryview
+means no copying, and strings are decoded with str(buf, "utf-8") because
+memoryview has no .decode().
+
+Pass stop_ids to keep only the stop_time_updates for those stops (and the
+entities that still have any). Other updates are skipped after reading just
+their stop_id, which keeps the parsed feed a fraction of its full size.
 """
 
 import time
@@ -117,7 +126,7 @@ def parse_mta_header(subdata):
         if field_num == 1 and wire_type == LENGTH_DELIMITED:
             # e.g. "1.0"
             raw_bytes, idx = parse_length_delimited(subdata, idx)
-            header["gtfs_realtime_version"] = raw_bytes.decode("utf-8")
+            header["gtfs_realtime_version"] = str(raw_bytes, "utf-8")
 
         elif field_num == 3 and wire_type == VARINT:
             # e.g. 1734835126
@@ -138,7 +147,7 @@ def parse_mta_header(subdata):
 # ------------------------------------------------------------
 # PARSE ENTITY (top-level field_num=2 repeated)
 # ------------------------------------------------------------
-def parse_mta_entity(subdata):
+def parse_mta_entity(subdata, stop_ids=None):
     """
     Each entity has structure like:
       1: "1"   (ID string)
@@ -163,12 +172,12 @@ def parse_mta_entity(subdata):
         if field_num == 1 and wire_type == LENGTH_DELIMITED:
             # e.g. "1", "2", "5" ...
             raw_bytes, idx = parse_length_delimited(subdata, idx)
-            entity["id"] = raw_bytes.decode("utf-8")
+            entity["id"] = str(raw_bytes, "utf-8")
 
         elif field_num == 3 and wire_type == LENGTH_DELIMITED:
             # The sub-message with trip/stop_time_updates
             trip_bytes, idx = parse_length_delimited(subdata, idx)
-            entity["trip_update"] = parse_mta_trip_block(trip_bytes)
+            entity["trip_update"] = parse_mta_trip_block(trip_bytes, stop_ids)
 
         elif field_num == 4 and wire_type == LENGTH_DELIMITED:
             # Possibly a vehicle or extension block
@@ -181,7 +190,7 @@ def parse_mta_entity(subdata):
     return entity
 
 
-def parse_mta_trip_block(subdata):
+def parse_mta_trip_block(subdata, stop_ids=None):
     """
     The trip block, from your snippet, might look like:
        1 { 1: "128400_L..S", 5: "L", etc. } (Trip descriptor)
@@ -208,7 +217,12 @@ def parse_mta_trip_block(subdata):
             # repeated stop_time_update
             stu_bytes, idx_sub = parse_length_delimited(subdata, idx)
             idx = idx_sub
-            stu_obj = parse_mta_stop_time_update(stu_bytes)
+            stop_id = None
+            if stop_ids is not None:
+                stop_id = parse_stop_id(stu_bytes)
+                if stop_id not in stop_ids:
+                    continue
+            stu_obj = parse_mta_stop_time_update(stu_bytes, stop_id)
             trip_update["stop_time_update"].append(stu_obj)
 
         else:
@@ -235,18 +249,18 @@ def parse_mta_trip_descriptor(subdata):
 
         if field_num == 1 and wire_type == LENGTH_DELIMITED:
             raw_bytes, idx = parse_length_delimited(subdata, idx)
-            desc["trip_id"] = raw_bytes.decode("utf-8")
+            desc["trip_id"] = str(raw_bytes, "utf-8")
 
         elif field_num == 5 and wire_type == LENGTH_DELIMITED:
             raw_bytes, idx = parse_length_delimited(subdata, idx)
-            desc["route_id"] = raw_bytes.decode("utf-8")
+            desc["route_id"] = str(raw_bytes, "utf-8")
         else:
             idx = skip_field(subdata, wire_type, idx)
 
     return desc
 
 
-def parse_mta_stop_time_update(subdata):
+def parse_mta_stop_time_update(subdata, stop_id=None):
     """
     Example from snippet:
       1: 12
@@ -257,11 +271,12 @@ def parse_mta_stop_time_update(subdata):
       1001 { ... }
     We parse 'stop_sequence' from field #1, 'stop_id' from field #4,
     arrival from field #2, departure from field #3.
+    Pass stop_id when it's already been read so it isn't decoded twice.
     """
     idx = 0
     end = len(subdata)
     stu = {
-        "stop_id": None,
+        "stop_id": stop_id,
         "stop_sequence": None,
         "arrival_time": None,
         "departure_time": None,
@@ -278,7 +293,8 @@ def parse_mta_stop_time_update(subdata):
         elif field_num == 4 and wire_type == LENGTH_DELIMITED:
             # "L16S", "L14S", ...
             raw_bytes, idx = parse_length_delimited(subdata, idx)
-            stu["stop_id"] = raw_bytes.decode("utf-8")
+            if stop_id is None:
+                stu["stop_id"] = str(raw_bytes, "utf-8")
 
         elif field_num == 2 and wire_type == LENGTH_DELIMITED:
             # arrival sub-message
@@ -296,6 +312,21 @@ def parse_mta_stop_time_update(subdata):
     return stu
 
 
+def parse_stop_id(subdata):
+    """
+    Just the stop_id (field #4) of a stop_time_update, or None.
+    """
+    idx = 0
+    end = len(subdata)
+    while idx < end:
+        field_num, wire_type, idx = parse_key(subdata, idx)
+        if field_num == 4 and wire_type == LENGTH_DELIMITED:
+            raw_bytes, idx = parse_length_delimited(subdata, idx)
+            return str(raw_bytes, "utf-8")
+        idx = skip_field(subdata, wire_type, idx)
+    return None
+
+
 def parse_mta_timestamp(subdata):
     """
     The arrival/departure is a sub-message like:
@@ -322,7 +353,7 @@ def parse_mta_timestamp(subdata):
 # ------------------------------------------------------------
 # TOP-LEVEL: parse_feed_message
 # ------------------------------------------------------------
-def parse_feed_message(data):
+def parse_feed_message(data, stop_ids=None):
     """
     Parse the top-level feed message for the MTA L-train data:
 
@@ -374,7 +405,11 @@ def parse_feed_message(data):
         elif field_num == 2 and wire_type == LENGTH_DELIMITED:
             # Repeated entity
             sub_bytes, idx = parse_length_delimited(data, idx)
-            entity_obj = parse_mta_entity(sub_bytes)
+            entity_obj = parse_mta_entity(sub_bytes, stop_ids)
+            if stop_ids is not None:
+                trip_update = entity_obj["trip_update"]
+                if not trip_update or not trip_update["stop_time_update"]:
+                    continue
             feedmsg["entity"].append(entity_obj)
 
         else:
@@ -0,0 +1,100 @@
+import time
+from array import array
+from config import LOG_LEVEL, LOG_SERIAL_LEVEL, LOG_RING_SIZE
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_TAGS = {DEBUG: "D", INFO: "I", WARNING: "W", ERROR: "E"}
+
+# Fixed when the module loads, so a hot path can skip building arguments
+# for a level that's off:
+#     if DEBUG_ENABLED:
+#         log.debug("Parsed %d entities", len(entities))
+DEBUG_ENABLED = LEVELS[LOG_LEVEL] <= DEBUG
+INFO_ENABLED = LEVELS[LOG_LEVEL] <= INFO
+
+
+def _discard(msg, *args):
+    pass
+
+
+class Logger:
+    """Leveled log kept in a ring of the most recent records.
+
+    Messages use %-style placeholders and are only formatted when a record
+    is printed, either as it happens (at serial_level and above) or when the
+    ring is dumped. The ring's slots are allocated up front; a record just
+    stores its time, level, format string and argument tuple, so keep
+    arguments to numbers and short strings.
+
+    Methods for levels below level are replaced with a no-op when the logger
+    is created.
+    """
+
+    def __init__(self, level=INFO, serial_level=INFO, size=64):
+        self.level = level
+        self.serial_level = serial_level
+        self.size = size
+        self.times = array("L", [0] * size)  # ms since boot
+        self.levels = bytearray(size)
+        self.messages = [None] * size
+        self.args = [None] * size
+        self.next = 0
+        self.written = 0  # Records since boot, including overwritten ones
+
+        if level > DEBUG:
+            self.debug = _discard
+        if level > INFO:
+            self.info = _discard
+        if level > WARNING:
+            self.warning = _discard
+
+    def record(self, level, msg, args):
+        slot = self.next
+        self.times[slot] = (time.monotonic_ns() // 1000000) & 0xFFFFFFFF
+        self.levels[slot] = level
+        self.messages[slot] = msg
+        self.args[slot] = args
+        self.next = (slot + 1) % self.size
+        self.written += 1
+        if level >= self.serial_level:
+            print(self.format(slot))
+
+    def debug(self, msg, *args):
+        self.record(DEBUG, msg, args)
+
+    def info(self, msg, *args):
+        self.record(INFO, msg, args)
+
+    def warning(self, msg, *args):
+        self.record(WARNING, msg, args)
+
+    def error(self, msg, *args):
+        self.record(ERROR, msg, args)
+
+    def format(self, slot):
+        msg = self.messages[slot]
+        args = self.args[slot]
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError):
+                msg = f"{msg} {args}"
+        ms = self.times[slot]
+        return f"[{ms // 1000:6d}.{ms % 1000:03d} {LEVEL_TAGS[self.levels[slot]]}] {msg}"
+
+    def dump(self):
+        """Print the ring, oldest record first."""
+        count = min(self.written, self.size)
+        print(f"--- last {count} of {self.written} log records ---")
+        start = (self.next - count) % self.size
+        for i in range(count):
+            print(self.format((start + i) % self.size))
+        print("--- end of log ---")
+
+
+log = Logger(LEVELS[LOG_LEVEL], LEVELS[LOG_SERIAL_LEVEL], LOG_RING_SIZE)
@@ -0,0 +1,185 @@
+import struct
+import time
+from config import WATCHDOG_TIMEOUT, LOOP_STALL_MS
+from logger import log
+
+try:
+    import microcontroller
+    from watchdog import WatchDogMode
+except ImportError:
+    microcontroller = None
+    WatchDogMode = None
+
+try:
+    import alarm
+    _sleep_memory = alarm.sleep_memory
+except (ImportError, AttributeError):
+    _sleep_memory = None
+
+# Where the board was when it last marked a stage. The index is kept in
+# alarm.sleep_memory, which survives a watchdog reset, and only copied to
+# flash after a reset actually happens.
+STAGES = ("boot", "network", "fetch", "parse", "format", "draw", "page", "push", "idle", "ntp", "reinit", "telemetry")
+
+# Post-mortem record at the end of microcontroller.nvm; the snapshot keeps
+# clear of it (little-endian):
+#   "WDT1", last stage (B), watchdog resets seen (H), recorded at (I, local
+#   epoch seconds from the RTC at the next boot, so 0-ish if it wasn't kept)
+POSTMORTEM_MAGIC = b"WDT1"
+POSTMORTEM_FORMAT = "<4sBHI"
+POSTMORTEM_SIZE = 16
+
+# Byte of sleep_memory holding the current stage index
+_STAGE_SLOT = 0
+
+
+class HostWatchdog:
+    """Stand-in for microcontroller.watchdog off the board.
+
+    Has the same timeout/mode/feed()/deinit() surface and reports a feed
+    that came later than the timeout, which on the board would have reset.
+    """
+
+    def __init__(self):
+        self.timeout = 0
+        self.mode = None
+        self.last_feed = None
+        self.missed = 0
+
+    def feed(self):
+        now = time.monotonic()
+        if self.mode is not None and self.last_feed is not None and now - self.last_feed > self.timeout:
+            self.missed += 1
+            log.error("Watchdog would have reset: %ds since last feed", int(now - self.last_feed))
+        self.last_feed = now
+
+    def deinit(self):
+        self.mode = None
+
+
+class LoopMonitor:
+    """Feeds the hardware watchdog and times each pass of the main loop.
+
+    stage() is called as the loop moves from one step to the next: it feeds
+    the watchdog, notes the stage in sleep memory and times the stage that
+    just ended. end_iteration() logs a pass that took longer than the stall
+    budget, naming its slowest stage.
+    """
+
+    def __init__(self, timeout=WATCHDOG_TIMEOUT, stall_ms=LOOP_STALL_MS):
+        self.timeout = timeout
+        self.stall_ms = stall_ms
+        self.watchdog = getattr(microcontroller, "watchdog", None) or HostWatchdog()
+        self.running = False
+        self.stage_index = 0
+        self.stage_started = time.monotonic_ns()
+        self.iteration_started = self.stage_started
+        self.slowest_stage = 0
+        self.slowest_ns = 0
+
+        # Latency over all iterations, in ms
+        self.iterations = 0
+        self.max_latency = 0
+        self.total_latency = 0
+        self.stalls = 0
+        self.last_stall = None  # (latency ms, stage name)
+        self.postmortem = None
+
+    def start(self):
+        """Arm the watchdog; check whether it reset us last time."""
+        self.postmortem = self._check_last_reset()
+        if not self.timeout:
+            return
+        try:
+            self.watchdog.timeout = self.timeout
+            self.watchdog.mode = WatchDogMode.RESET if WatchDogMode else "reset"
+            self.watchdog.feed()
+            self.running = True
+            log.info("Watchdog armed: %ds", self.timeout)
+        except (ValueError, NotImplementedError, RuntimeError) as e:
+            log.warning("Watchdog unavailable: %s", e)
+
+    def stop(self):
+        """Disarm, e.g. before dropping to the REPL."""
+        if self.running:
+            self.watchdog.deinit()
+            self.running = False
+
+    def begin_loop(self):
+        """Start timing iterations from here rather than from boot."""
+        self.stage("idle")
+        self.iteration_started = self.stage_started
+        self.slowest_ns = 0
+
+    def stage(self, name):
+        now = time.monotonic_ns()
+        elapsed = now - self.stage_started
+        if elapsed > self.slowest_ns:
+            self.slowest_ns = elapsed
+            self.slowest_stage = self.stage_index
+        self.stage_started = now
+        self.stage_index = STAGES.index(name)
+        if _sleep_memory is not None:
+            _sleep_memory[_STAGE_SLOT] = self.stage_index
+        if self.running:
+            self.watchdog.feed()
+
+    def end_iteration(self):
+        """Close one pass of the main loop and start timing the next."""
+        self.stage(STAGES[self.stage_index])
+        now = self.stage_started
+        latency = (now - self.iteration_started) // 1000000
+        self.iterations += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+        if self.stall_ms and latency > self.stall_ms:
+            self.stalls += 1
+            self.last_stall = (latency, STAGES[self.slowest_stage])
+            log.warning(
+                "Loop stalled %dms, %dms of it in %s",
+                latency,
+                self.slowest_ns // 1000000,
+                STAGES[self.slowest_stage],
+            )
+        self.iteration_started = now
+        self.slowest_ns = 0
+
+    def report(self):
+        avg = self.total_latency // self.iterations if self.iterations else 0
+        line = f"Loop: iterations={self.iterations} avg={avg}ms max={self.max_latency}ms stalls={self.stalls}"
+        if self.last_stall:
+            line += f" last_stall={self.last_stall[0]}ms in {self.last_stall[1]}"
+        print(line)
+
+    def _check_last_reset(self):
+        """After a watchdog reset, copy the stage we were in to flash and log it.
+
+        Returns (stage name, resets seen, recorded at) from flash, or None.
+        """
+        if microcontroller is None:
+            return None
+        nvm = microcontroller.nvm
+        if nvm is None or len(nvm) < POSTMORTEM_SIZE:
+            return None
+        offset = len(nvm) - POSTMORTEM_SIZE
+        size = struct.calcsize(POSTMORTEM_FORMAT)
+        magic, stage, resets, recorded_at = struct.unpack(POSTMORTEM_FORMAT, nvm[offset : offset + size])
+        if magic != POSTMORTEM_MAGIC:
+            stage, resets, recorded_at = 0, 0, 0
+
+        reason = microcontroller.cpu.reset_reason
+        if reason == microcontroller.ResetReason.WATCHDOG and _sleep_memory is not None:
+            stage = _sleep_memory[_STAGE_SLOT]
+            if stage >= len(STAGES):
+                stage = 0
+            resets += 1
+            recorded_at = int(time.time())
+            nvm[offset : offset + size] = struct.pack(POSTMORTEM_FORMAT, POSTMORTEM_MAGIC, stage, resets, recorded_at)
+            log.error("Reset by the watchdog while in %s (%d watchdog resets so far)", STAGES[stage], resets)
+        elif not resets:
+            return None
+        return STAGES[stage], resets, recorded_at
+
+
+monitor = LoopMonitor()
@@ -0,0 +1,116 @@
+import gc
+import time
+from config import MEMORY_THRESHOLD, MEMORY_RECOVER_CYCLES
+from logger import log
+
+NORMAL = 0
+LOW = 1
+CRITICAL = 2
+STATE_NAMES = ("normal", "low", "critical")
+
+# Transitions kept for report()
+TRANSITION_LOG_SIZE = 16
+
+
+class MemoryGovernor:
+    """Keeps the free heap above MEMORY_THRESHOLD by collecting early and shedding work.
+
+    check() is called at stage boundaries, before the stages that allocate
+    the most. It collects when the free heap has dropped below the threshold
+    and, if that doesn't recover enough, steps down at once:
+
+      normal    everything on
+      low       feeds parsed for our stops only, no scrolling
+      critical  also two arrivals per stop instead of three
+
+    Stepping back up happens one state at a time, after MEMORY_RECOVER_CYCLES
+    refreshes in a row with at least twice the threshold free.
+    """
+
+    def __init__(self, threshold=50000, recover_cycles=10):
+        self.threshold = threshold
+        self.recover_cycles = recover_cycles
+        self.state = NORMAL
+        self.collections = 0
+        self.cycle_min_free = None  # Lowest free heap seen this refresh, after collecting
+        self.headroom_cycles = 0
+        self.min_free = [None, None, None]  # Per state
+        self.time_in_state = [0, 0, 0]  # Seconds, per state
+        self.state_since = time.monotonic()
+        self.transitions = [None] * TRANSITION_LOG_SIZE  # (monotonic, from, to, free, stage)
+        self.transition_count = 0
+        self.reported = 0  # Transitions already printed by report()
+
+    @property
+    def filter_stops(self):
+        """Parse only the stops we show."""
+        return self.state >= LOW
+
+    @property
+    def allow_scrolling(self):
+        return self.state == NORMAL
+
+    @property
+    def arrivals_per_stop(self):
+        return 3 if self.state < CRITICAL else 2
+
+    def check(self, stage):
+        """Sample the heap before a stage, collecting and stepping down if it's low."""
+        free = gc.mem_free()
+        if free < self.threshold:
+            gc.collect()
+            self.collections += 1
+            free = gc.mem_free()
+            if free < self.threshold // 2:
+                self._move(CRITICAL, free, stage)
+            elif free < self.threshold and self.state < LOW:
+                self._move(LOW, free, stage)
+
+        if self.cycle_min_free is None or free < self.cycle_min_free:
+            self.cycle_min_free = free
+        state_min = self.min_free[self.state]
+        if state_min is None or free < state_min:
+            self.min_free[self.state] = free
+        return free
+
+    def end_cycle(self):
+        """Call once per refresh; steps back up after enough refreshes with headroom."""
+        if self.cycle_min_free is not None and self.cycle_min_free >= 2 * self.threshold:
+            self.headroom_cycles += 1
+        else:
+            self.headroom_cycles = 0
+        if self.state > NORMAL and self.headroom_cycles >= self.recover_cycles:
+            self._move(self.state - 1, self.cycle_min_free, "recovered")
+        self.cycle_min_free = None
+
+    def _move(self, state, free, stage):
+        if state == self.state:
+            return
+        now = time.monotonic()
+        self.time_in_state[self.state] += now - self.state_since
+        self.state_since = now
+        self.transitions[self.transition_count % TRANSITION_LOG_SIZE] = (now, self.state, state, free, stage)
+        self.transition_count += 1
+        log.warning("Memory %s -> %s at %s (%d bytes free)", STATE_NAMES[self.state], STATE_NAMES[state], stage, free)
+        self.state = state
+        self.headroom_cycles = 0
+
+    def report(self):
+        """Print time and lowest free heap per state, and transitions since the last report."""
+        time_in_state = list(self.time_in_state)
+        time_in_state[self.state] += time.monotonic() - self.state_since
+        parts = []
+        for state, name in enumerate(STATE_NAMES):
+            parts.append(f"{name}={int(time_in_state[state])}s/min_free={self.min_free[state]}")
+        print(
+            f"Memory {STATE_NAMES[self.state]}: {' '.join(parts)} "
+            f"collections={self.collections} transitions={self.transition_count}"
+        )
+        first = max(self.reported, self.transition_count - TRANSITION_LOG_SIZE)
+        for i in range(first, self.transition_count):
+            at, old, new, free, stage = self.transitions[i % TRANSITION_LOG_SIZE]
+            print(f"  {int(at)}s {STATE_NAMES[old]} -> {STATE_NAMES[new]} at {stage} ({free} free)")
+        self.reported = self.transition_count
+
+
+governor = MemoryGovernor(MEMORY_THRESHOLD, MEMORY_RECOVER_CYCLES)
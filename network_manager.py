@@ -2,11 +2,15 @@ import time
 import ssl
 import wifi
 import socketpool
-import adafruit_requests
-import rtc
-import adafruit_ntp
 import os
-from config import MAX_RETRIES, RETRY_DELAY
+from config import MAX_RETRIES, RETRY_DELAY, HTTP_TIMEOUT, FEED_GZIP, FEED_BUFFER_SIZE
+from logger import log, DEBUG_ENABLED
+from profiler import profiler
+from memory_governor import governor
+from loop_watchdog import monitor
+from http_client import FeedClient, ReceiveBuffer, GZIP_SUPPORTED, NOT_MODIFIED
+from clock import Clock
+from train_service import EST_OFFSET
 
 class ConnectionManager:
     """Manages network connections with retry logic."""
@@ -15,53 +19,149 @@ class ConnectionManager:
     RETRY_DELAY = 5
 
     def __init__(self):
-        # Connect to WiFi first
-        self._connect_wifi()
+        # The firmware joins the network from settings.toml on its own while
+        # the display starts up, so only connect if that hasn't happened
+        if not wifi.radio.connected:
+            self._connect_wifi()
         
         # Setup network resources
         self.pool = socketpool.SocketPool(wifi.radio)
         self.ssl_context = ssl.create_default_context()
-        self.session = adafruit_requests.Session(self.pool, self.ssl_context)
+        # Sockets stay open between refreshes so we only pay for TLS once
+        self.feed_client = FeedClient(self.pool, self.ssl_context, timeout=HTTP_TIMEOUT)
+        # Feeds are read into long-lived buffers (one per concurrent feed) to
+        # avoid heap fragmentation
+        self.rx_buffers = [ReceiveBuffer(FEED_BUFFER_SIZE)]
+        self.rx_buffer = self.rx_buffers[0]
         self._ntp = None
+        # Disciplined from the time on every response; NTP is the fallback
+        self.clock = Clock(tz_offset=EST_OFFSET)
 
-    def fetch_with_retry(self, url):
-        """Fetch data from URL with retry logic."""
-        for attempt in range(MAX_RETRIES):
-            try:
-                response = self.session.get(url)
-                if response.status_code == 200:
-                    data = response.content
-                    response.close()
-                    return data
-                    
-                response.close()
-                
-                # Retry on server errors
-                if response.status_code in [500, 502, 503, 504]:
-                    print(f"Server error {response.status_code}, retrying...")
-                    time.sleep(RETRY_DELAY)
+        # Only ask for gzip when we can inflate it without holding both copies
+        self.request_headers = {}
+        if FEED_GZIP and GZIP_SUPPORTED:
+            self.request_headers["Accept-Encoding"] = "gzip"
+
+    def fetch_with_retry(self, url, conditional=False):
+        """Fetch data from URL with retry logic.
+
+        Returns a memoryview into the shared receive buffer, which is only
+        valid until the next fetch. With conditional=True the last ETag for
+        the URL is sent and NOT_MODIFIED is returned on a 304.
+        """
+        governor.check("fetch")
+        monitor.stage("fetch")
+        with profiler.span("fetch"):
+            data = self.feed_client.fetch_with_retry(
+                url,
+                self.rx_buffer,
+                self.request_headers,
+                conditional=conditional,
+                max_retries=MAX_RETRIES,
+                retry_delay=RETRY_DELAY,
+            )
+        if data is NOT_MODIFIED:
+            log.debug("Feed not modified")
+        elif data is not None and DEBUG_ENABLED:
+            self._log_fetch_stats(self.feed_client.last_response, len(data))
+        if data is not None:
+            self._observe_response_time()
+        return data
+
+    def fetch_many_with_retry(self, urls):
+        """Fetch several feeds concurrently.
+
+        Returns a list with a memoryview (or None on failure) per URL. Each
+        URL has its own receive buffer, valid until the next fetch. Feeds
+        whose concurrent fetch failed are retried one at a time.
+        """
+        while len(self.rx_buffers) < len(urls):
+            self.rx_buffers.append(ReceiveBuffer(FEED_BUFFER_SIZE))
+
+        governor.check("fetch")
+        monitor.stage("fetch")
+        start = time.monotonic_ns()
+        with profiler.span("fetch"):
+            results = self.feed_client.fetch_many(urls, self.rx_buffers, self.request_headers)
+            for slot, url in enumerate(urls):
+                if results[slot] is not None:
                     continue
-                    
-                print(f"HTTP error: {response.status_code}")
-                return None
-                
-            except (OSError, RuntimeError) as e:
-                print(f"Network error on attempt {attempt + 1}: {e}")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(RETRY_DELAY)
-                    # Create fresh session on retry
-                    self.session = adafruit_requests.Session(self.pool, self.ssl_context)
-                else:
-                    print("Max retries reached")
-                    raise
-                    
-        return None
+                try:
+                    results[slot] = self.feed_client.fetch_with_retry(
+                        url,
+                        self.rx_buffers[slot],
+                        self.request_headers,
+                        max_retries=MAX_RETRIES,
+                        retry_delay=RETRY_DELAY,
+                        slot=slot,
+                    )
+                except (OSError, RuntimeError) as e:
+                    log.warning("Giving up on %s: %s", url, e)
+
+        log.debug("Fetched %d feeds in %dms", len(urls), (time.monotonic_ns() - start) // 1000000)
+        if any(result is not None for result in results):
+            self._observe_response_time()
+        return results
+
+    def _observe_response_time(self):
+        """Feed the last response's Date header to the clock."""
+        response = self.feed_client.last_response
+        age = (time.monotonic_ns() - response.received_ns) / 1000000000
+        self.clock.observe_http_date(response.headers.get("date"), age)
+
+    def _log_fetch_stats(self, response, body_bytes):
+        """Log the phase breakdown of the last request when debugging."""
+        conn = self.feed_client.last_connection
+        stats = self.feed_client.stats()
+        timing = conn.timing
+        log.debug(
+            "Fetch: dns=%dms connect=%dms tls=%dms transfer=%dms wire=%dB body=%dB encoding=%s "
+            "buffer=%dB grows=%d (handshakes=%d requests=%d reused=%d)",
+            timing["dns"],
+            timing["connect"],
+            timing["tls"],
+            timing["transfer"],
+            response.wire_bytes,
+            body_bytes,
+            response.content_encoding or "identity",
+            len(self.rx_buffer.buf),
+            self.rx_buffer.grows,
+            stats["handshakes"],
+            stats["requests"],
+            stats["reused"],
+        )
+
+    def close(self):
+        """Close the kept-alive feed sockets, e.g. before this manager is replaced."""
+        self.feed_client.close()
+
+    def suspend(self):
+        """Drop the feed connections and turn the radio off."""
+        self.feed_client.close()
+        wifi.radio.enabled = False
+        log.info("WiFi off")
+
+    def resume(self):
+        """Turn the radio back on and rejoin the network."""
+        wifi.radio.enabled = True
+        if not wifi.radio.connected:
+            self._connect_wifi()
+
+    def clock_is_set(self):
+        """Whether the RTC holds a real date, e.g. kept across a soft reload."""
+        return time.localtime().tm_year >= 2024
 
     def sync_time(self, tz_offset=0):
-        """Synchronize system time using NTP."""
+        """Synchronize system time using NTP.
+
+        Only needed when self.clock hasn't had time from a response lately.
+        """
+        import rtc
+        import adafruit_ntp
+
         # Check WiFi connection
         if not wifi.radio.connected:
-            print("WiFi not connected, attempting to reconnect...")
+            log.warning("WiFi not connected, attempting to reconnect...")
             if not self._connect_wifi():
                 return False
 
@@ -72,18 +172,21 @@ class ConnectionManager:
                     
                 rtc.RTC().datetime = self._ntp.datetime
                 current_time = time.localtime()
-                print(f"Time synchronized: {current_time.tm_hour:02d}:{current_time.tm_min:02d}:{current_time.tm_sec:02d}")
+                log.info(
+                    "Time synchronized: %02d:%02d:%02d", current_time.tm_hour, current_time.tm_min, current_time.tm_sec
+                )
+                self.clock.mark_ntp()
                 return True
                 
             except Exception as e:
-                print(f"Time sync attempt {attempt + 1} failed: {e}")
+                log.warning("Time sync attempt %d failed: %s", attempt + 1, e)
                 if attempt < MAX_RETRIES - 1:
-                    print(f"Retrying in {RETRY_DELAY} seconds...")
+                    log.info("Retrying in %d seconds...", RETRY_DELAY)
                     time.sleep(RETRY_DELAY)
                     # Reset NTP client on retry
                     self._ntp = None
         
-        print("Failed to sync time after all retries")
+        log.error("Failed to sync time after all retries")
         return False
     
     def _connect_wifi(self):
@@ -92,14 +195,14 @@ class ConnectionManager:
     
         try:
             ssid, password = get_wifi_credentials()
-            print(f"Connecting to {ssid}...")
+            log.info("Connecting to %s...", ssid)
 
             wifi.radio.connect(ssid, password)
-            print("Connected! IP:", wifi.radio.ipv4_address)
+            log.info("Connected! IP: %s", wifi.radio.ipv4_address)
             
             return True
         except Exception as e:
-            print(f"WiFi connection failed: {e}")
+            log.error("WiFi connection failed: %s", e)
             return False
         
     def _get_wifi_credentials(self):
@@ -118,5 +221,5 @@ def get_connection_manager():
     try:
         return ConnectionManager()
     except Exception as e:
-        print(f"Failed to initialize connection manager: {e}")
+        log.error("Failed to initialize connection manager: %s", e)
         raise
@@ -0,0 +1,125 @@
+import gc
+import time
+from array import array
+from config import PROFILE_ENABLED, PROFILE_WINDOW, PROFILE_REPORT_INTERVAL, TELEMETRY_ENABLED
+
+# Stages of a refresh, in the order they run, then draws made when paging
+# between stations, kept apart so they don't blur the refresh's render
+STAGES = ("fetch", "parse", "filter", "format", "render", "page")
+
+
+class Stage:
+    """Time and heap use of the last window runs of one stage.
+
+    Used as a context manager around the stage. Durations (microseconds)
+    and bytes taken off the free heap go into fixed arrays, so timing a
+    run allocates nothing.
+    """
+
+    def __init__(self, name, window):
+        self.name = name
+        self.window = window
+        self.durations = array("L", [0] * window)
+        self.allocated = array("l", [0] * window)
+        self.count = 0
+        self.free_before = 0
+        self.free_after = 0
+        self._start = 0
+
+    def __enter__(self):
+        self.free_before = gc.mem_free()
+        self._start = time.monotonic_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = (time.monotonic_ns() - self._start) // 1000
+        self.free_after = gc.mem_free()
+        slot = self.count % self.window
+        self.durations[slot] = elapsed
+        # Negative when a collection ran during the stage
+        self.allocated[slot] = self.free_before - self.free_after
+        self.count += 1
+        return False
+
+    def since(self, count):
+        """(runs, total us, max us) of the runs after the first count, as far as the window reaches."""
+        n = min(self.count - count, self.window)
+        total = peak = 0
+        for i in range(self.count - n, self.count):
+            duration = self.durations[i % self.window]
+            total += duration
+            if duration > peak:
+                peak = duration
+        return n, total, peak
+
+    def summary(self):
+        """One line of min/avg/max/p95 over the window, or None if it never ran."""
+        n = min(self.count, self.window)
+        if not n:
+            return None
+        durations = sorted(self.durations[:n])
+        p95 = durations[min(n - 1, (n * 95 + 99) // 100 - 1)]
+        avg = sum(durations) // n
+        allocated = sum(self.allocated[:n]) // n
+        return (
+            f"{self.name:<7} n={self.count} min={durations[0]} avg={avg} max={durations[-1]} p95={p95}us "
+            f"heap {self.free_before}->{self.free_after} (avg {allocated:+d}B)"
+        )
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """Per-stage timing across refreshes, printed every report_interval refreshes.
+
+        with profiler.span("parse"):
+            feed_dict = parse_feed_message(data)
+
+    When disabled every span is the same do-nothing context manager.
+    """
+
+    def __init__(self, enabled=False, window=32, report_interval=20):
+        self.enabled = enabled
+        self.report_interval = report_interval
+        self.cycles = 0
+        self.stages = {}
+        if enabled:
+            for name in STAGES:
+                self.stages[name] = Stage(name, window)
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self.stages[name]
+
+    def tick(self):
+        """Count a refresh and print the report when one is due."""
+        if not self.enabled:
+            return
+        self.cycles += 1
+        if self.report_interval and self.cycles % self.report_interval == 0:
+            self.report()
+
+    def report(self):
+        print(f"Stage timing after {self.cycles} refreshes (heap free before->after last run):")
+        for name in STAGES:
+            line = self.stages[name].summary()
+            if line:
+                print(f"  {line}")
+
+
+# Telemetry reads the stage timings too, but only PROFILE_ENABLED prints them
+profiler = Profiler(
+    PROFILE_ENABLED or TELEMETRY_ENABLED,
+    PROFILE_WINDOW,
+    PROFILE_REPORT_INTERVAL if PROFILE_ENABLED else 0,
+)
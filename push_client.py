@@ -0,0 +1,111 @@
+import json
+import time
+from config import (
+    MQTT_BROKER,
+    MQTT_PORT,
+    MQTT_USE_TLS,
+    MQTT_TOPIC_PREFIX,
+    MQTT_KEEP_ALIVE,
+)
+from logger import log
+from train_service import arrivals_to_feed_dict
+
+# Topic (under MQTT_TOPIC_PREFIX) the publisher's heartbeat arrives on
+HEARTBEAT_TOPIC = "heartbeat"
+
+
+class PushClient:
+    """Receives per-stop arrival updates over MQTT instead of polling.
+
+    tools/mqtt_publisher.py publishes a retained message to
+    <MQTT_TOPIC_PREFIX>/<stop_id> whenever that stop's predictions change:
+
+      {"ts": <feed timestamp>, "sent": <publish time, UTC epoch>,
+       "arrivals": [[trip_id, time, route_id], ...]}
+
+    and after every poll {"ts": ..., "sent": ...} to
+    <MQTT_TOPIC_PREFIX>/heartbeat. The heartbeat keeps the feed timestamp
+    moving while our stops' predictions stay the same, so they only go
+    stale when the publisher stops reading the feed.
+    """
+
+    def __init__(self, connection_manager, stop_ids):
+        import adafruit_minimqtt.adafruit_minimqtt as MQTT
+
+        self.stop_ids = stop_ids
+        self.stops = {}
+        self.feed_timestamp = 0
+        self.pending = False
+        self.messages = 0
+
+        # Set when a message arrives, cleared once it has been drawn
+        self.received_ns = 0
+        self.sent_at = 0
+        self.clock = connection_manager.clock
+        self.last_receive_to_pixel_ms = None
+        self.last_push_to_pixel_s = None
+
+        self.mqtt = MQTT.MQTT(
+            broker=MQTT_BROKER,
+            port=MQTT_PORT,
+            is_ssl=MQTT_USE_TLS,
+            keep_alive=MQTT_KEEP_ALIVE,
+            socket_pool=connection_manager.pool,
+            ssl_context=connection_manager.ssl_context,
+            socket_timeout=0.05,
+        )
+        self.mqtt.on_message = self._on_message
+        self.mqtt.connect()
+        for stop_id in stop_ids:
+            self.mqtt.subscribe(f"{MQTT_TOPIC_PREFIX}/{stop_id}")
+        self.mqtt.subscribe(f"{MQTT_TOPIC_PREFIX}/{HEARTBEAT_TOPIC}")
+        log.info("Push mode: subscribed to %d stops on %s", len(stop_ids), MQTT_BROKER)
+
+    def _on_message(self, client, topic, message):
+        stop_id = topic.rsplit("/", 1)[-1]
+        if stop_id == HEARTBEAT_TOPIC:
+            payload = json.loads(message)
+            self.feed_timestamp = max(self.feed_timestamp, payload.get("ts", 0))
+            self.clock.observe_feed_timestamp(payload.get("sent", 0))
+            return
+        if stop_id not in self.stop_ids:
+            return
+        payload = json.loads(message)
+        self.stops[stop_id] = payload["arrivals"]
+        self.feed_timestamp = max(self.feed_timestamp, payload.get("ts", 0))
+        self.sent_at = payload.get("sent", 0)
+        self.received_ns = time.monotonic_ns()
+        # Retained messages can be old, so the publish time is only a lower bound
+        self.clock.observe_feed_timestamp(self.sent_at)
+        self.pending = True
+        self.messages += 1
+
+    def loop(self, timeout=0.1):
+        """Wait up to timeout seconds for updates; replaces the idle sleep."""
+        self.mqtt.loop(timeout=timeout)
+
+    def feed_dict(self):
+        """Latest arrivals in the shape parse_feed_message returns."""
+        self.pending = False
+        return arrivals_to_feed_dict(self.feed_timestamp, self.stops)
+
+    def mark_drawn(self, utc_now):
+        """Record how long the last update took to reach the pixels."""
+        if not self.received_ns:
+            return
+        self.last_receive_to_pixel_ms = (time.monotonic_ns() - self.received_ns) // 1000000
+        if self.sent_at:
+            # Whole seconds only: the RTC has no finer resolution
+            self.last_push_to_pixel_s = utc_now - self.sent_at
+        self.received_ns = 0
+        log.debug(
+            "Push latency: receive->pixel=%dms publish->pixel~%ds",
+            self.last_receive_to_pixel_ms,
+            self.last_push_to_pixel_s,
+        )
+
+    def close(self):
+        try:
+            self.mqtt.disconnect()
+        except Exception:
+            pass
@@ -0,0 +1,124 @@
+import time
+from config import (
+    QUIET_START_HOUR,
+    QUIET_START_MIN,
+    QUIET_END_HOUR,
+    QUIET_END_MIN,
+    QUIET_HOURS,
+    QUIET_HOLIDAYS,
+)
+from logger import log
+
+DAY = 86400
+
+# Days ahead searched for the next transition; a week covers every
+# weekday, plus one for a window running past midnight
+LOOKAHEAD_DAYS = 8
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def _settle(span, now):
+    """(quiet, next change) if span contains or follows now, else None."""
+    start, end = span
+    if start <= now < end:
+        return True, end
+    if start > now:
+        return False, start
+    return None
+
+
+def _clock(seconds):
+    t = time.localtime(seconds)
+    return f"{WEEKDAYS[t.tm_wday]} {t.tm_hour:02d}:{t.tm_min:02d}"
+
+
+class QuietSchedule:
+    """Quiet-hours windows, reduced to the next on/off instant.
+
+    A window is (start hour, start min, end hour, end min) starting on a
+    given day; if it ends at or before its start it runs past midnight.
+    Weekdays (0 = Monday) and dates ("MM-DD" every year, or "YYYY-MM-DD")
+    can each have their own window, or None for no quiet hours.
+
+    Times are local epoch seconds, as time.time() returns on the board.
+    Between transitions is_quiet() is a single comparison; the windows are
+    only walked again once the next transition has passed or the clock has
+    been set back.
+    """
+
+    def __init__(self, default, weekdays=None, holidays=None):
+        self.default = default
+        self.weekdays = weekdays or {}
+        self.holidays = holidays or {}
+        self.quiet = False
+        self.valid_from = None
+        self.next_change = None
+
+    def window(self, day):
+        """(start, end) of the window starting on day (days since epoch), or None."""
+        date = time.localtime(day * DAY)
+        month_day = f"{date.tm_mon:02d}-{date.tm_mday:02d}"
+        full_date = f"{date.tm_year}-{month_day}"
+        if full_date in self.holidays:
+            window = self.holidays[full_date]
+        elif month_day in self.holidays:
+            window = self.holidays[month_day]
+        else:
+            window = self.weekdays.get(date.tm_wday, self.default)
+        if window is None:
+            return None
+
+        start_hour, start_min, end_hour, end_min = window
+        start = day * DAY + start_hour * 3600 + start_min * 60
+        end = day * DAY + end_hour * 3600 + end_min * 60
+        if end <= start:
+            end += DAY
+        return start, end
+
+    def update(self, now):
+        """Work out whether now is quiet and when that next changes."""
+        today = int(now) // DAY
+        found = None
+        span = None  # Overlapping windows are merged into one span
+        for day in range(today - 1, today + LOOKAHEAD_DAYS):
+            window = self.window(day)
+            if window is None:
+                continue
+            if span and window[0] <= span[1]:
+                span = (span[0], max(span[1], window[1]))
+                continue
+            found = span and _settle(span, now)
+            if found:
+                break
+            span = window
+        if not found and span:
+            found = _settle(span, now)
+        # With no quiet hours in the coming week, look again tomorrow
+        quiet, next_change = found or (False, now + DAY)
+
+        if quiet != self.quiet or self.valid_from is None:
+            log.info("Quiet hours %s until %s", "on" if quiet else "off", _clock(next_change))
+        self.quiet = quiet
+        self.next_change = next_change
+        self.valid_from = now
+
+    def is_quiet(self, now=None):
+        if now is None:
+            now = time.time()
+        if self.next_change is None or now >= self.next_change or now < self.valid_from:
+            self.update(now)
+        return self.quiet
+
+    def seconds_left(self, now=None):
+        """Seconds until quiet hours next start or end."""
+        if now is None:
+            now = time.time()
+        self.is_quiet(now)
+        return self.next_change - now
+
+
+def load_quiet_schedule():
+    """Build the schedule from the QUIET_ settings in config.py."""
+    default = (QUIET_START_HOUR, QUIET_START_MIN, QUIET_END_HOUR, QUIET_END_MIN)
+    return QuietSchedule(default, QUIET_HOURS, QUIET_HOLIDAYS)
@@ -0,0 +1,105 @@
+import array
+import struct
+from logger import log
+
+# Layout written by tools/compile_schedule.py:
+#   header  "SCH1", stop count (B), route count (B)
+#   routes  route count x route_id (4s)
+#   stops   stop count x (stop_id 8s, first entry I, entry count H)
+#   entries little-endian uint32, sorted by time within each stop:
+#           bits 0-16 seconds after midnight, 17-23 weekday mask
+#           (bit 0 = Monday, like tm_wday), 24-31 route index
+MAGIC = b"SCH1"
+HEADER_FORMAT = "<4sBB"
+ROUTE_FORMAT = "<4s"
+STOP_FORMAT = "<8sIH"
+SECONDS_MASK = 0x1FFFF
+DAYS_SHIFT = 17
+ROUTE_SHIFT = 24
+DAY_SECONDS = 86400
+
+
+def _strip(raw):
+    end = raw.find(b"\x00")
+    return str(raw if end < 0 else raw[:end], "ascii")
+
+
+class ScheduleTable:
+    """Scheduled departures for our stops, for when realtime data is missing.
+
+    The entries are read straight into one array at boot (a few KB) and
+    searched with bisection, so there's nothing to parse.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+            magic, stop_count, route_count = struct.unpack(HEADER_FORMAT, header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a schedule table")
+
+            route_size = struct.calcsize(ROUTE_FORMAT)
+            routes = f.read(route_size * route_count)
+            self.routes = [_strip(routes[n * route_size:(n + 1) * route_size]) for n in range(route_count)]
+
+            stop_size = struct.calcsize(STOP_FORMAT)
+            stops = f.read(stop_size * stop_count)
+            self.stops = {}
+            total = 0
+            for n in range(stop_count):
+                stop_id, first, count = struct.unpack_from(STOP_FORMAT, stops, n * stop_size)
+                self.stops[_strip(stop_id)] = (first, count)
+                total = max(total, first + count)
+
+            self.entries = array.array("I", bytes(4 * total))
+            if (f.readinto(self.entries) or 0) < 4 * total:
+                raise ValueError(f"{path} is truncated")
+
+    def has_stop(self, stop_id):
+        return stop_id in self.stops
+
+    def _first_at_or_after(self, low, high, seconds):
+        entries = self.entries
+        while low < high:
+            mid = (low + high) // 2
+            if entries[mid] & SECONDS_MASK < seconds:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def next_departures(self, stop_id, seconds, weekday, limit=3):
+        """Return up to limit (seconds_until, route_id) after a local time.
+
+        seconds is seconds after local midnight and weekday is tm_wday.
+        Searches the rest of today, then tomorrow.
+        """
+        if stop_id not in self.stops:
+            return []
+        first, count = self.stops[stop_id]
+        end = first + count
+        entries = self.entries
+        found = []
+
+        start = self._first_at_or_after(first, end, seconds)
+        for day_offset, scan_from in ((0, start), (1, first)):
+            day_bit = 1 << (DAYS_SHIFT + (weekday + day_offset) % 7)
+            for i in range(scan_from, end):
+                entry = entries[i]
+                if entry & day_bit:
+                    until = (entry & SECONDS_MASK) + day_offset * DAY_SECONDS - seconds
+                    found.append((until, self.routes[entry >> ROUTE_SHIFT]))
+                    if len(found) >= limit:
+                        return found
+        return found
+
+
+def load_schedule(path):
+    """Load the schedule table if it's on flash; returns None if it isn't."""
+    if not path:
+        return None
+    try:
+        return ScheduleTable(path)
+    except (OSError, ValueError, struct.error) as e:
+        log.warning("No schedule fallback: %s", e)
+        return None
@@ -0,0 +1,118 @@
+import struct
+import time
+from config import SNAPSHOT_INTERVAL, SNAPSHOT_MAX_AGE
+from logger import log
+from loop_watchdog import POSTMORTEM_SIZE
+
+try:
+    import microcontroller
+    _nvm = microcontroller.nvm
+except (ImportError, AttributeError):
+    _nvm = None
+
+# Layout in microcontroller.nvm (little-endian):
+#   header  "SNP1", line count (B), saved at (I, local epoch seconds)
+#   lines   line count x (label 8s, kind B, count B, 3 x H seconds after saved at)
+# The last POSTMORTEM_SIZE bytes are loop_watchdog's.
+MAGIC = b"SNP1"
+HEADER_FORMAT = "<4sBI"
+LINE_FORMAT = "<8sBBHHH"
+MAX_ARRIVALS = 3
+MAX_OFFSET = 0xFFFF
+
+# Line kinds, as returned by code.station_lines
+KIND_LIVE = 0
+KIND_SCHEDULED = 1
+KIND_NO_DATA = 2
+
+
+class Snapshot:
+    """Keeps the last good arrivals in flash so a reboot can draw them at once.
+
+    Arrivals are stored as absolute times so they can be aged with the RTC
+    at boot. Writes are rate-limited to one per SNAPSHOT_INTERVAL, and
+    skipped when the stored arrivals, aged to now, still match, to spare
+    the flash.
+    """
+
+    def __init__(self, interval=SNAPSHOT_INTERVAL):
+        self.interval = interval
+        self.last_write = None
+        self.writes = 0
+        self.clock_ok = False  # Whether the last load could age the arrivals
+
+    def save(self, lines):
+        """Store lines, a list of (label, [mins, ...], kind). Returns True if written."""
+        if _nvm is None or not self.interval:
+            return False
+        now = time.monotonic()
+        if self.last_write is not None and now - self.last_write < self.interval:
+            return False
+        if not any(kind == KIND_LIVE for _, _, kind in lines):
+            return False  # Nothing worth coming back to
+
+        self.last_write = now
+        if self.load([label for label, _, _ in lines]) == lines:
+            return False
+        data = encode(lines, int(time.time()))
+        if len(data) > len(_nvm) - POSTMORTEM_SIZE:
+            return False
+        _nvm[0:len(data)] = data
+        self.writes += 1
+        log.debug("Snapshot saved (%d bytes, %d writes since boot)", len(data), self.writes)
+        return True
+
+    def load(self, labels):
+        """Return the stored lines aged to now, or None if there's nothing usable.
+
+        labels must match the stored lines, so a config change discards the
+        snapshot. If the clock is behind the snapshot (it was lost with the
+        power) or the snapshot is too old, lines come back with no times.
+        """
+        if _nvm is None:
+            return None
+        try:
+            saved_at, stored = decode(_nvm)
+        except ValueError:
+            return None
+        if [label for label, _, _ in stored] != [_label_bytes(label) for label in labels]:
+            return None
+
+        age = int(time.time()) - saved_at
+        self.clock_ok = 0 <= age <= SNAPSHOT_MAX_AGE
+        lines = []
+        for label, (_, offsets, kind) in zip(labels, stored):
+            if not self.clock_ok:
+                lines.append((label, None, kind))
+                continue
+            mins = [int((offset - age) // 60) for offset in offsets if offset >= age]
+            lines.append((label, mins, kind))
+        return lines
+
+
+def _label_bytes(label):
+    return label.encode("utf-8")[:8]
+
+
+def encode(lines, saved_at):
+    data = bytearray(struct.pack(HEADER_FORMAT, MAGIC, len(lines), saved_at))
+    for label, mins, kind in lines:
+        offsets = [min(m * 60, MAX_OFFSET) for m in (mins or [])[:MAX_ARRIVALS]]
+        padded = offsets + [0] * (MAX_ARRIVALS - len(offsets))
+        data += struct.pack(LINE_FORMAT, _label_bytes(label), kind, len(offsets), *padded)
+    return bytes(data)
+
+
+def decode(data):
+    header_size = struct.calcsize(HEADER_FORMAT)
+    magic, count, saved_at = struct.unpack(HEADER_FORMAT, data[0:header_size])
+    if magic != MAGIC:
+        raise ValueError("no snapshot")
+    line_size = struct.calcsize(LINE_FORMAT)
+    raw = data[header_size:header_size + count * line_size]
+    lines = []
+    for n in range(count):
+        label, kind, used, *offsets = struct.unpack_from(LINE_FORMAT, raw, n * line_size)
+        end = label.find(b"\x00")
+        lines.append((label if end < 0 else label[:end], offsets[:used], kind))
+    return saved_at, lines
@@ -0,0 +1,87 @@
+from config import (
+    FEEDS,
+    STATIONS,
+    MTA_FEED_URL,
+    STOP_ID_NORTHBOUND,
+    STOP_ID_SOUTHBOUND,
+    STOP_INDEX_FILE,
+)
+from stop_index import open_stop_index
+
+# Feed name used when stations are built from the single-feed settings
+DEFAULT_FEED = "default"
+
+
+def load_stations():
+    """Return (feeds, stations) from config.
+
+    feeds maps feed name -> URL. Each station is a dict with "name", "feed",
+    "route", "color" and "stops", a list of (stop_id, label) pairs shown one
+    per line. Without STATIONS, the original single station is built from
+    MTA_FEED_URL and the two stop IDs. Names and routes left out of config
+    are filled in from the stop index when it's on flash.
+    """
+    if STATIONS:
+        feeds = dict(FEEDS)
+        stations = []
+        for station in STATIONS:
+            if station["feed"] not in FEEDS:
+                raise ValueError(f"Station {station.get('name')} uses unknown feed {station['feed']}")
+            stations.append({
+                "name": station.get("name", ""),
+                "feed": station["feed"],
+                "route": station.get("route"),
+                "color": None,
+                "stops": list(station["stops"])[:2],
+            })
+    else:
+        feeds = {DEFAULT_FEED: MTA_FEED_URL}
+        stations = [{
+            "name": "",
+            "feed": DEFAULT_FEED,
+            "route": None,
+            "color": None,
+            "stops": [(STOP_ID_NORTHBOUND, "City"), (STOP_ID_SOUTHBOUND, "Bkln")],
+        }]
+
+    describe_stations(stations)
+    return feeds, stations
+
+
+def describe_stations(stations):
+    """Fill in missing names, routes and route colors from the stop index."""
+    index = open_stop_index(STOP_INDEX_FILE)
+    try:
+        for station in stations:
+            found = index.lookup(station["stops"][0][0]) if index and station["stops"] else None
+            if found:
+                name, routes = found
+                if not station["name"]:
+                    station["name"] = name
+                if not station["route"] and routes:
+                    station["route"] = routes[0]
+                station["color"] = index.route_colors.get(station["route"])
+            if not station["route"]:
+                station["route"] = "L" if station["feed"] == DEFAULT_FEED else station["feed"]
+    finally:
+        if index:
+            index.close()
+
+
+def station_stop_ids(stations):
+    """Every stop ID shown on any station, without duplicates."""
+    stop_ids = []
+    for station in stations:
+        for stop_id, _ in station["stops"]:
+            if stop_id not in stop_ids:
+                stop_ids.append(stop_id)
+    return stop_ids
+
+
+def used_feeds(feeds, stations):
+    """Only the feeds some station actually needs, as (name, url) pairs."""
+    names = []
+    for station in stations:
+        if station["feed"] not in names:
+            names.append(station["feed"])
+    return [(name, feeds[name]) for name in names]
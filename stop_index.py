@@ -0,0 +1,109 @@
+import struct
+from logger import log
+
+# Layout written by tools/compile_stops.py (all big-endian):
+#   header  "STX1", record count (H), record size (H), route count (B)
+#   routes  route count x (route_id 4s, r B, g B, b B)
+#   records sorted by stop_id: stop_id 8s, name 24s, route bitmask Q
+# Strings are ASCII padded with NULs.
+MAGIC = b"STX1"
+HEADER_FORMAT = ">4sHHB"
+ROUTE_FORMAT = ">4sBBB"
+RECORD_FORMAT = ">8s24sQ"
+STOP_ID_SIZE = 8
+
+
+def _strip(raw):
+    end = raw.find(b"\x00")
+    return str(raw if end < 0 else raw[:end], "ascii")
+
+
+class StopIndex:
+    """Looks up stop names and routes in a compiled stop index on flash.
+
+    Only the header and the small route table are read into RAM. Lookups
+    binary-search the fixed-size records with seek and readinto, reusing
+    one record buffer, so the index can cover every stop in the system.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        header = self.file.read(struct.calcsize(HEADER_FORMAT))
+        if len(header) < struct.calcsize(HEADER_FORMAT):
+            self.file.close()
+            raise ValueError(f"{path} is truncated")
+        magic, self.count, self.record_size, route_count = struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC or self.record_size != struct.calcsize(RECORD_FORMAT):
+            self.file.close()
+            raise ValueError(f"{path} is not a stop index")
+
+        route_size = struct.calcsize(ROUTE_FORMAT)
+        routes = self.file.read(route_size * route_count)
+        self.routes = []
+        self.route_colors = {}
+        for n in range(route_count):
+            route_id, r, g, b = struct.unpack_from(ROUTE_FORMAT, routes, n * route_size)
+            route_id = _strip(route_id)
+            self.routes.append(route_id)
+            self.route_colors[route_id] = (r << 16) | (g << 8) | b
+
+        self.records_start = len(header) + len(routes)
+        self.record = bytearray(self.record_size)
+        self.key = bytearray(STOP_ID_SIZE)
+
+    def _compare(self):
+        """Compare the current record's stop ID with the key, without allocating."""
+        record = self.record
+        key = self.key
+        for i in range(STOP_ID_SIZE):
+            if record[i] != key[i]:
+                return -1 if record[i] < key[i] else 1
+        return 0
+
+    def _find(self, stop_id):
+        encoded = stop_id.encode("ascii")
+        if len(encoded) > STOP_ID_SIZE:
+            return False
+        key = self.key
+        for i in range(STOP_ID_SIZE):
+            key[i] = encoded[i] if i < len(encoded) else 0
+
+        low = 0
+        high = self.count - 1
+        while low <= high:
+            mid = (low + high) // 2
+            self.file.seek(self.records_start + mid * self.record_size)
+            self.file.readinto(self.record)
+            order = self._compare()
+            if order == 0:
+                return True
+            if order < 0:
+                low = mid + 1
+            else:
+                high = mid - 1
+        return False
+
+    def lookup(self, stop_id):
+        """Return (name, [route_id, ...]) for a stop, or None if it isn't indexed."""
+        if not self._find(stop_id):
+            return None
+        _, name, mask = struct.unpack(RECORD_FORMAT, self.record)
+        routes = [route for n, route in enumerate(self.routes) if mask & (1 << n)]
+        return _strip(name), routes
+
+    def close(self):
+        self.file.close()
+
+
+def open_stop_index(path):
+    """Open the stop index if it's on flash; returns None if it isn't."""
+    if not path:
+        return None
+    try:
+        return StopIndex(path)
+    except OSError:
+        return None
+    except (ValueError, struct.error) as e:
+        # A truncated or corrupt index mustn't stop the board booting
+        log.warning("Stop index not used: %s", e)
+        return None
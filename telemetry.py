@@ -0,0 +1,181 @@
+import gc
+import os
+import time
+from config import (
+    TELEMETRY_ENABLED,
+    TELEMETRY_GROUP,
+    TELEMETRY_INTERVAL,
+    TELEMETRY_BATCH,
+    TELEMETRY_MAX_SHARE,
+    TELEMETRY_URL,
+    TELEMETRY_TIMEOUT,
+)
+from logger import log
+from profiler import profiler
+from memory_governor import governor
+from loop_watchdog import monitor
+
+# Feeds in TELEMETRY_GROUP, one value each per summary
+FIELDS = (
+    "refreshes",
+    "errors",
+    "fetch-ms",
+    "fetch-max-ms",
+    "parse-ms",
+    "render-ms",
+    "heap-min",
+    "memory-state",
+    "stalls",
+)
+
+# Summaries kept while they can't be sent; the oldest are dropped
+MAX_PENDING = 12
+
+# Seconds between sends at least, so a batch stays under Adafruit IO's free
+# rate limit of 30 data points a minute
+MIN_SEND_SPACING = 60
+
+
+def iso8601(utc_time):
+    t = time.localtime(utc_time)
+    return f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}Z"
+
+
+def _io_client(pool, ssl_context):
+    """An adafruit_io IO_HTTP client, pointed at TELEMETRY_URL when it's set."""
+    import adafruit_requests
+    from adafruit_io.adafruit_io import IO_HTTP
+
+    username = os.getenv("ADAFRUIT_AIO_USERNAME")
+    key = os.getenv("ADAFRUIT_AIO_KEY")
+    if not username or not key:
+        raise ValueError("ADAFRUIT_AIO_USERNAME and ADAFRUIT_AIO_KEY must be set in settings.toml")
+
+    class TimedSession(adafruit_requests.Session):
+        # IO_HTTP doesn't pass a timeout, which would leave adafruit_requests' minute-long default
+        def request(self, method, url, *args, **kwargs):
+            kwargs.setdefault("timeout", TELEMETRY_TIMEOUT)
+            return super().request(method, url, *args, **kwargs)
+
+    session = TimedSession(pool, ssl_context)
+
+    if not TELEMETRY_URL:
+        return IO_HTTP(username, key, session)
+
+    class LocalIO(IO_HTTP):
+        def _compose_path(self, path):
+            return f"{TELEMETRY_URL.rstrip('/')}/api/v2/{username}/{path}"
+
+    return LocalIO(username, key, session)
+
+
+class Telemetry:
+    """Fixed-interval summaries of how the board is doing, sent in batches.
+
+    Stage times come from the profiler's windows, the memory state from the
+    governor and stalls from the loop monitor, so nothing extra is measured
+    on the hot path. A summary is a tuple of FIELDS values; they queue until
+    TELEMETRY_BATCH are waiting and then go out back to back, right after a
+    refresh while the network is up, over one kept-alive session.
+    """
+
+    def __init__(self, enabled=False, interval=300, batch=3, max_share=0.02):
+        self.enabled = enabled
+        self.interval = interval
+        self.batch = batch
+        self.max_share = max_share
+        self.pending = []  # (utc time, values)
+        self.io = None
+        self.interval_started = time.monotonic()
+        self.next_send = 0
+        self.sent = 0
+        self.send_ms = 0  # Total time spent sending
+
+        self.refreshes = 0
+        self.errors = 0
+        self.heap_min = None
+        self.stage_counts = {}  # Stage runs already summarized, by stage
+        self.stalls_seen = 0
+
+    def refreshed(self):
+        """Count a refresh and sample the heap."""
+        if not self.enabled:
+            return
+        self.refreshes += 1
+        free = gc.mem_free()
+        if self.heap_min is None or free < self.heap_min:
+            self.heap_min = free
+
+    def error(self):
+        if self.enabled:
+            self.errors += 1
+
+    def poll(self, connection_manager):
+        """Close the interval if it's over and send a batch if one is due."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self.interval_started >= self.interval:
+            self._summarize(connection_manager.clock.utc_now())
+            self.interval_started = now
+        if len(self.pending) >= self.batch and now >= self.next_send:
+            self._send(connection_manager)
+
+    def _stage(self, name):
+        """(runs, avg ms, max ms) of a stage since the last summary."""
+        stage = profiler.stages.get(name)
+        if stage is None:
+            return 0, 0, 0
+        runs, total, peak = stage.since(self.stage_counts.get(name, 0))
+        self.stage_counts[name] = stage.count
+        if not runs:
+            return 0, 0, 0
+        return runs, total // runs // 1000, peak // 1000
+
+    def _summarize(self, utc_time):
+        _, fetch_ms, fetch_max = self._stage("fetch")
+        _, parse_ms, _ = self._stage("parse")
+        _, render_ms, _ = self._stage("render")
+        values = (
+            self.refreshes,
+            self.errors,
+            fetch_ms,
+            fetch_max,
+            parse_ms,
+            render_ms,
+            self.heap_min or 0,
+            governor.state,
+            monitor.stalls - self.stalls_seen,
+        )
+        self.stalls_seen = monitor.stalls
+        self.refreshes = self.errors = 0
+        self.heap_min = None
+
+        self.pending.append((int(utc_time), values))
+        if len(self.pending) > MAX_PENDING:
+            self.pending.pop(0)
+
+    def _send(self, connection_manager):
+        start = time.monotonic_ns()
+        try:
+            if self.io is None:
+                self.io = _io_client(connection_manager.pool, connection_manager.ssl_context)
+            # One batch per send; a backlog after an outage goes out over several
+            for _ in range(min(self.batch, len(self.pending))):
+                monitor.stage("telemetry")
+                utc_time, values = self.pending[0]
+                feeds = [{"key": key, "value": value} for key, value in zip(FIELDS, values)]
+                self.io.send_group_data(TELEMETRY_GROUP, feeds, {"created_at": iso8601(utc_time)})
+                self.pending.pop(0)
+                self.sent += 1
+        except Exception as e:
+            log.warning("Telemetry not sent (%d summaries waiting): %s", len(self.pending), e)
+
+        elapsed_ms = (time.monotonic_ns() - start) // 1000000
+        self.send_ms += elapsed_ms
+        # A slow send pushes the next one back, so sending stays a small share of the time
+        self.next_send = time.monotonic() + max(MIN_SEND_SPACING, elapsed_ms / 1000 / self.max_share)
+        log.debug("Telemetry send took %dms (%d summaries sent so far)", elapsed_ms, self.sent)
+
+
+telemetry = Telemetry(TELEMETRY_ENABLED, TELEMETRY_INTERVAL, TELEMETRY_BATCH, TELEMETRY_MAX_SHARE)
@@ -0,0 +1,269 @@
+"""
+Edge aggregator: fetch each MTA feed once and serve boards only their stops.
+
+Every board otherwise downloads a whole line feed and parses all of it to
+show six numbers. The aggregator fetches each upstream feed at most once per
+--ttl seconds (however many boards ask), indexes arrivals per stop with
+train_service.index_stop_times, and answers
+
+    GET /v1/arrivals?stops=L16N,L16S
+
+with a small JSON payload and an ETag, returning 304 when nothing changed:
+
+    {"ts": 1734835126, "stops": {"L16N": [["128400_L..N", 1734835283, "L"], ...]}}
+
+Boards use it with FEED_MODE = "aggregator" and MTA_FEED_URL set to the
+aggregator's base URL. GET /v1/status reports upstream and client counters.
+
+    python tools/feed_server.py --port 8081 &
+    python tools/aggregator.py --feed L=http://127.0.0.1:8081/ --port 8080
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, "lib")]
+
+from http_client import FeedClient, GZIP_SUPPORTED  # noqa: E402
+from partial_protobuf_feed import parse_feed_message  # noqa: E402
+from train_service import index_stop_times  # noqa: E402
+
+# Arrivals per stop included in a payload
+DEFAULT_LIMIT = 6
+
+
+class UpstreamFeed:
+    """One upstream GTFS-realtime feed, refreshed at most once per ttl."""
+
+    def __init__(self, name, url, ttl, ssl_context):
+        self.name = name
+        self.url = url
+        self.ttl = ttl
+        self._client = FeedClient(socket, ssl_context)
+        self._lock = threading.Lock()
+        self.index = {}
+        self.timestamp = 0
+        self.generation = 0
+        self.fetched_at = 0
+        self.fetches = 0
+        self.errors = 0
+
+    def refresh(self):
+        """Re-fetch the feed if it's stale; concurrent callers wait for one fetch."""
+        if time.monotonic() - self.fetched_at < self.ttl:
+            return
+        with self._lock:
+            if time.monotonic() - self.fetched_at < self.ttl:
+                return
+            headers = {"Accept-Encoding": "gzip"} if GZIP_SUPPORTED else None
+            try:
+                response = self._client.get(self.url, headers)
+                body = response.read()
+                if response.status_code != 200:
+                    raise OSError(f"HTTP {response.status_code}")
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                self._client.reset(self.url)
+                print(f"[{self.name}] upstream fetch failed: {e}")
+                # Back off for a full ttl rather than hammering a failing upstream
+                self.fetched_at = time.monotonic()
+                return
+            finally:
+                self.fetches += 1
+
+            try:
+                feed = parse_feed_message(body)
+                index = index_stop_times(feed)
+                timestamp = feed["header"]["timestamp"]
+            except (IndexError, KeyError, ValueError) as e:
+                # A malformed body backs off like a failed fetch; the last index is kept
+                self.errors += 1
+                print(f"[{self.name}] upstream feed unparseable: {e!r}")
+                self.fetched_at = time.monotonic()
+                return
+            self.index = index
+            self.timestamp = timestamp
+            self.generation += 1
+            self.fetched_at = time.monotonic()
+
+
+class Aggregator:
+    """Routes stop queries to the upstream feeds that carry those stops."""
+
+    def __init__(self, feeds, ttl=30, limit=DEFAULT_LIMIT, ssl_context=None):
+        ssl_context = ssl_context or ssl.create_default_context()
+        self.feeds = [UpstreamFeed(name, url, ttl, ssl_context) for name, url in feeds]
+        self.limit = limit
+        self._stop_feeds = {}
+        self._mapped_generations = None
+        self._payloads = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+
+    def _feeds_for(self, stops):
+        feeds = []
+        for stop in stops:
+            feed = self._stop_feeds.get(stop)
+            if feed is None:
+                # Unknown stop: every feed might carry it
+                return self.feeds
+            if feed not in feeds:
+                feeds.append(feed)
+        return feeds
+
+    def payload(self, stops):
+        """Return (body, etag) for the given stop IDs."""
+        feeds = self._feeds_for(stops)
+        for feed in feeds:
+            feed.refresh()
+        generations = tuple(f.generation for f in self.feeds)
+        if generations != self._mapped_generations:
+            stop_feeds = {}
+            for feed in self.feeds:
+                for stop in feed.index:
+                    stop_feeds.setdefault(stop, feed)
+            self._stop_feeds = stop_feeds
+            self._mapped_generations = generations
+
+        key = (tuple(stops), tuple(f.generation for f in feeds))
+        with self._lock:
+            cached = self._payloads.get(tuple(stops))
+            if cached and cached[0] == key:
+                return cached[1], cached[2]
+
+        now = int(time.time())
+        result = {"ts": max((f.timestamp for f in feeds), default=0), "stops": {}}
+        for stop in stops:
+            feed = self._stop_feeds.get(stop)
+            arrivals = feed.index.get(stop, []) if feed else []
+            upcoming = [a for a in arrivals if a[0] >= now][: self.limit]
+            result["stops"][stop] = [[trip_id, t, route_id] for t, trip_id, route_id in upcoming]
+
+        body = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        with self._lock:
+            self._payloads[tuple(stops)] = (key, body, etag)
+        return body, etag
+
+    def record_request(self, not_modified):
+        with self._lock:
+            self.requests += 1
+            if not_modified:
+                self.not_modified += 1
+
+    def status(self):
+        return {
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "feeds": {
+                f.name: {
+                    "fetches": f.fetches,
+                    "errors": f.errors,
+                    "generation": f.generation,
+                    "stops": len(f.index),
+                    "timestamp": f.timestamp,
+                }
+                for f in self.feeds
+            },
+        }
+
+
+class AggregatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, aggregator, quiet=True):
+        super().__init__(address, AggregatorRequestHandler)
+        self.aggregator = aggregator
+        self.quiet = quiet
+
+
+class AggregatorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        aggregator = self.server.aggregator
+        url = urlsplit(self.path)
+
+        if url.path == "/v1/status":
+            self._send(200, json.dumps(aggregator.status()).encode("utf-8"))
+            return
+        if url.path != "/v1/arrivals":
+            self._send(404, b'{"error":"not found"}')
+            return
+
+        query = parse_qs(url.query)
+        stops = [s for s in ",".join(query.get("stops", [])).split(",") if s]
+        if not stops:
+            self._send(400, b'{"error":"stops required"}')
+            return
+
+        body, etag = aggregator.payload(stops)
+        not_modified = self.headers.get("If-None-Match") == etag
+        aggregator.record_request(not_modified)
+        if not_modified:
+            self._send(304, b"", etag)
+        else:
+            self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def parse_feed_arg(value):
+    name, sep, url = value.partition("=")
+    if not sep or not url:
+        raise argparse.ArgumentTypeError("expected NAME=URL")
+    return name, url
+
+
+def make_server(feeds, host="127.0.0.1", port=0, ttl=30, limit=DEFAULT_LIMIT, ssl_context=None, quiet=True):
+    return AggregatorServer((host, port), Aggregator(feeds, ttl, limit, ssl_context), quiet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--feed", action="append", type=parse_feed_arg, required=True, help="upstream feed as NAME=URL"
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ttl", type=float, default=30, help="seconds between upstream fetches")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="arrivals per stop")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.feed, args.host, args.port, args.ttl, args.limit, quiet=not args.verbose)
+    print(f"Aggregator on http://{args.host}:{server.server_address[1]}/v1/arrivals")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.aggregator.status()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Analyze an archive of recorded GTFS-realtime feeds in parallel.
+
+Each file in the archive is one raw feed snapshot (optionally gzipped). A
+multiprocessing pool parses batches of snapshots with parse_feed_message and
+indexes them per stop with train_service.index_stop_times; each worker joins
+its batch per (trip, stop) before handing it back, so only compact partial
+joins cross the process boundary. The main process merges them and writes:
+
+    predictions.csv    trip_id, stop_id, route_id, feed_ts, lead_s, error_s
+    error_by_lead.csv  prediction error by minutes before arrival
+    headways.csv       time between arrivals per stop and route
+
+A trip's "actual" time at a stop is its last prediction before it left the
+feed, and only trips seen arriving before the archive ends are counted.
+With NumPy installed the columns are also saved to analysis.npz and the
+stats are computed vectorized; otherwise plain Python does the same.
+
+    python tools/archive_analyzer.py archive/ -o analysis/ --jobs 8
+    python tools/archive_analyzer.py archive/ --stops L16N,L16S
+"""
+
+import argparse
+import csv
+import glob
+import gzip
+import multiprocessing
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, "lib")]
+
+from partial_protobuf_feed import parse_feed_message  # noqa: E402
+from train_service import index_stop_times  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# A trip counts as arrived if its last prediction was no later than this
+# after the last snapshot that still listed it
+ARRIVAL_SLACK = 90
+LEAD_BUCKET = 60  # seconds per row of error_by_lead.csv
+MAX_LEAD_MINUTES = 30
+
+
+def read_snapshot(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return data
+
+
+def analyze_batch(args):
+    """Parse one batch of snapshots and join them per (trip, stop).
+
+    Returns (timestamps, joined, routes, failed) where joined maps
+    (trip_id, stop_id) -> [(feed_ts, predicted), ...].
+    """
+    paths, stop_ids = args
+    timestamps = []
+    joined = {}
+    routes = {}
+    failed = 0
+    for path in paths:
+        try:
+            feed_dict = parse_feed_message(read_snapshot(path))
+        except Exception:
+            failed += 1
+            continue
+        feed_ts = feed_dict["header"].get("timestamp") or 0
+        timestamps.append(feed_ts)
+        for stop_id, arrivals in index_stop_times(feed_dict, stop_ids).items():
+            for predicted, trip_id, route_id in arrivals:
+                joined.setdefault((trip_id, stop_id), []).append((feed_ts, predicted))
+                routes[trip_id] = route_id
+    return timestamps, joined, routes, failed
+
+
+def find_snapshots(sources):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                paths.extend(os.path.join(root, name) for name in names)
+        else:
+            paths.extend(glob.glob(source))
+    return sorted(paths)
+
+
+def batches(paths, jobs, stop_ids, per_worker=4):
+    """Contiguous batches, several per worker so the pool stays balanced."""
+    count = max(1, min(len(paths), jobs * per_worker))
+    size = -(-len(paths) // count)
+    return [(paths[i : i + size], stop_ids) for i in range(0, len(paths), size)]
+
+
+def merge(results):
+    timestamps = []
+    joined = {}
+    routes = {}
+    failed = 0
+    for batch_timestamps, batch_joined, batch_routes, batch_failed in results:
+        timestamps.extend(batch_timestamps)
+        for key, observations in batch_joined.items():
+            joined.setdefault(key, []).extend(observations)
+        routes.update(batch_routes)
+        failed += batch_failed
+    return timestamps, joined, routes, failed
+
+
+def prediction_columns(joined, routes):
+    """Flatten the join into columns, one row per prediction of an arrived trip."""
+    columns = {"trip_id": [], "stop_id": [], "route_id": [], "feed_ts": [], "lead_s": [], "error_s": []}
+    actuals = []
+    for (trip_id, stop_id), observations in joined.items():
+        observations.sort()
+        last_seen, actual = observations[-1]
+        if actual > last_seen + ARRIVAL_SLACK:
+            continue  # still on its way when the archive ended
+        route_id = routes.get(trip_id)
+        actuals.append((stop_id, route_id, actual))
+        for feed_ts, predicted in observations:
+            columns["trip_id"].append(trip_id)
+            columns["stop_id"].append(stop_id)
+            columns["route_id"].append(route_id)
+            columns["feed_ts"].append(feed_ts)
+            columns["lead_s"].append(actual - feed_ts)
+            columns["error_s"].append(predicted - actual)
+    return columns, actuals
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(values):
+    """count, mean, p50, p90 and mean absolute value of a list of numbers."""
+    if np is not None:
+        a = np.asarray(values, dtype=np.float64)
+        return len(a), a.mean(), np.percentile(a, 50), np.percentile(a, 90), np.abs(a).mean()
+    ordered = sorted(values)
+    return (
+        len(ordered),
+        sum(ordered) / len(ordered),
+        percentile(ordered, 0.5),
+        percentile(ordered, 0.9),
+        sum(abs(v) for v in ordered) / len(ordered),
+    )
+
+
+def error_by_lead(columns):
+    buckets = {}
+    for lead, error in zip(columns["lead_s"], columns["error_s"]):
+        if 0 <= lead < MAX_LEAD_MINUTES * 60:
+            buckets.setdefault(lead // LEAD_BUCKET, []).append(error)
+    rows = []
+    for bucket in sorted(buckets):
+        count, mean, p50, p90, mae = summarize(buckets[bucket])
+        rows.append((bucket, count, round(mean, 1), round(p50, 1), round(p90, 1), round(mae, 1)))
+    return rows
+
+
+def headways(actuals):
+    by_stop = {}
+    for stop_id, route_id, actual in actuals:
+        by_stop.setdefault((stop_id, route_id), []).append(actual)
+    rows = []
+    for (stop_id, route_id), times in sorted(by_stop.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        if len(times) < 2:
+            continue
+        times.sort()
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        count, mean, p50, p90, _ = summarize(gaps)
+        rows.append((stop_id, route_id, count, round(mean, 1), round(p50, 1), round(p90, 1)))
+    return rows
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def write_outputs(out_dir, columns, lead_rows, headway_rows):
+    os.makedirs(out_dir, exist_ok=True)
+    names = list(columns)
+    write_csv(os.path.join(out_dir, "predictions.csv"), names, zip(*(columns[name] for name in names)))
+    write_csv(
+        os.path.join(out_dir, "error_by_lead.csv"),
+        ["lead_min", "count", "mean_error_s", "p50_error_s", "p90_error_s", "mae_s"],
+        lead_rows,
+    )
+    write_csv(
+        os.path.join(out_dir, "headways.csv"),
+        ["stop_id", "route_id", "count", "mean_s", "p50_s", "p90_s"],
+        headway_rows,
+    )
+    if np is not None:
+        np.savez_compressed(
+            os.path.join(out_dir, "analysis.npz"),
+            trip_id=np.array(columns["trip_id"], dtype=str),
+            stop_id=np.array(columns["stop_id"], dtype=str),
+            route_id=np.array([r or "" for r in columns["route_id"]], dtype=str),
+            feed_ts=np.array(columns["feed_ts"], dtype=np.int64),
+            lead_s=np.array(columns["lead_s"], dtype=np.int32),
+            error_s=np.array(columns["error_s"], dtype=np.int32),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("archive", nargs="+", help="directories or globs of recorded feeds")
+    parser.add_argument("-o", "--output", default="analysis", help="output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--stops", help="comma-separated stop IDs to analyze (default: all)")
+    args = parser.parse_args()
+
+    paths = find_snapshots(args.archive)
+    if not paths:
+        parser.error("no snapshots found")
+    stop_ids = set(args.stops.split(",")) if args.stops else None
+
+    started = time.monotonic()
+    work = batches(paths, args.jobs, stop_ids)
+    if args.jobs > 1:
+        with multiprocessing.Pool(args.jobs) as pool:
+            results = pool.imap_unordered(analyze_batch, work)
+            timestamps, joined, routes, failed = merge(results)
+    else:
+        timestamps, joined, routes, failed = merge(map(analyze_batch, work))
+    parsed = time.monotonic() - started
+
+    columns, actuals = prediction_columns(joined, routes)
+    lead_rows = error_by_lead(columns)
+    headway_rows = headways(actuals)
+    write_outputs(args.output, columns, lead_rows, headway_rows)
+    total = time.monotonic() - started
+
+    span = (max(timestamps) - min(timestamps)) / 3600 if timestamps else 0
+    print(
+        f"{len(paths)} snapshots ({failed} unreadable) spanning {span:.1f}h, "
+        f"{len(paths) / parsed:.0f} snapshots/s on {args.jobs} worker(s)"
+    )
+    print(
+        f"{len(actuals)} arrivals, {len(columns['error_s'])} predictions, "
+        f"{len(headway_rows)} stop/route headway rows -> {args.output}/ ({total:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Bake the display's bitmaps and lookup tables into assets.bin.
+
+The board used to draw the L bullet and the night-mode moon pixel by pixel,
+and look up every character in terminalio.FONT, on each start. This writes
+all of that, plus a bullet for every subway route, as one-byte-per-pixel
+data that the Display copies into its bitmaps with a single blit:
+
+    python tools/build_assets.py -o assets.bin
+
+Copy assets.bin to the board's root (ASSETS_FILE in config.py). Bullets are
+12x12: a circle (a diamond for express routes) in the route color with the
+route's letter or number cut out. The charmap assumes the built-in font
+lays out printable ASCII in order from the space, as CircuitPython's does;
+the board checks a few glyphs and rebuilds it if that doesn't hold.
+"""
+
+import argparse
+import os
+import struct
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from assets import MAGIC, HEADER_FORMAT, BULLET_HEADER_FORMAT, CHARMAP_SIZE, AssetPack  # noqa: E402
+
+BULLET_SIZE = 12
+MOON_SIZE = 8
+
+# route_id -> (character, RGB color, express)
+ROUTES = {
+    "1": ("1", 0xEE352E, False),
+    "2": ("2", 0xEE352E, False),
+    "3": ("3", 0xEE352E, False),
+    "4": ("4", 0x00933C, False),
+    "5": ("5", 0x00933C, False),
+    "6": ("6", 0x00933C, False),
+    "6X": ("6", 0x00933C, True),
+    "7": ("7", 0xB933AD, False),
+    "7X": ("7", 0xB933AD, True),
+    "A": ("A", 0x0039A6, False),
+    "C": ("C", 0x0039A6, False),
+    "E": ("E", 0x0039A6, False),
+    "B": ("B", 0xFF6319, False),
+    "D": ("D", 0xFF6319, False),
+    "F": ("F", 0xFF6319, False),
+    "FX": ("F", 0xFF6319, True),
+    "M": ("M", 0xFF6319, False),
+    "G": ("G", 0x6CBE45, False),
+    "J": ("J", 0x996633, False),
+    "Z": ("Z", 0x996633, False),
+    "L": ("L", 0xFFFFFF, False),  # White as the board always drew it, not the MTA's gray A7A9AC
+    "N": ("N", 0xFCCC0A, False),
+    "Q": ("Q", 0xFCCC0A, False),
+    "R": ("R", 0xFCCC0A, False),
+    "W": ("W", 0xFCCC0A, False),
+    "GS": ("S", 0x808183, False),
+    "FS": ("S", 0x808183, False),
+    "H": ("S", 0x808183, False),
+    "SI": ("S", 0x1D2E86, False),
+}
+
+# 5x7 glyphs for the bullets
+GLYPHS = {
+    "1": ("..#..", ".##..", "..#..", "..#..", "..#..", "..#..", ".###."),
+    "2": (".###.", "#...#", "....#", "...#.", "..#..", ".#...", "#####"),
+    "3": ("#####", "...#.", "..#..", "...#.", "....#", "#...#", ".###."),
+    "4": ("...#.", "..##.", ".#.#.", "#..#.", "#####", "...#.", "...#."),
+    "5": ("#####", "#....", "####.", "....#", "....#", "#...#", ".###."),
+    "6": ("..##.", ".#...", "#....", "####.", "#...#", "#...#", ".###."),
+    "7": ("#####", "....#", "...#.", "..#..", ".#...", ".#...", ".#..."),
+    "A": (".###.", "#...#", "#...#", "#####", "#...#", "#...#", "#...#"),
+    "B": ("####.", "#...#", "#...#", "####.", "#...#", "#...#", "####."),
+    "C": (".###.", "#...#", "#....", "#....", "#....", "#...#", ".###."),
+    "D": ("####.", "#...#", "#...#", "#...#", "#...#", "#...#", "####."),
+    "E": ("#####", "#....", "#....", "####.", "#....", "#....", "#####"),
+    "F": ("#####", "#....", "#....", "####.", "#....", "#....", "#...."),
+    "G": (".###.", "#...#", "#....", "#.###", "#...#", "#...#", ".####"),
+    "J": ("..###", "...#.", "...#.", "...#.", "...#.", "#..#.", ".##.."),
+    "M": ("#...#", "##.##", "#.#.#", "#.#.#", "#...#", "#...#", "#...#"),
+    "N": ("#...#", "#...#", "##..#", "#.#.#", "#..##", "#...#", "#...#"),
+    "Q": (".###.", "#...#", "#...#", "#...#", "#.#.#", "#..#.", ".##.#"),
+    "R": ("####.", "#...#", "#...#", "####.", "#.#..", "#..#.", "#...#"),
+    "S": (".####", "#....", "#....", ".###.", "....#", "....#", "####."),
+    "W": ("#...#", "#...#", "#...#", "#.#.#", "#.#.#", "#.#.#", ".#.#."),
+    "Z": ("#####", "....#", "...#.", "..#..", ".#...", "#....", "#####"),
+}
+GLYPH_X = 3
+GLYPH_Y = 2
+
+
+def new_bitmap(width, height):
+    return [[0] * width for _ in range(height)]
+
+
+def circle(bitmap):
+    """The 12x12 circle the board has always drawn for the L bullet."""
+    for y in range(1, 11):
+        for x in range(1, 11):
+            bitmap[y][x] = 1
+    for a, b in ((0, 5), (0, 6), (11, 5), (11, 6)):
+        bitmap[b][a] = 1  # Middle of the left and right edges
+        bitmap[a][b] = 1  # Middle of the top and bottom edges
+    for x, y in ((1, 1), (1, 10), (10, 1), (10, 10)):
+        bitmap[y][x] = 0
+
+
+def diamond(bitmap):
+    for y in range(BULLET_SIZE):
+        for x in range(BULLET_SIZE):
+            if abs(x - 5.5) + abs(y - 5.5) <= 6:
+                bitmap[y][x] = 1
+
+
+def cut_l(bitmap):
+    """The board's original L, kept so the L bullet looks the same."""
+    for y in range(3, 9):
+        for x in range(4, 6):
+            bitmap[y][x] = 0
+    for y in range(7, 9):
+        for x in range(5, 9):
+            bitmap[y][x] = 0
+
+
+def cut_glyph(bitmap, char):
+    for row, bits in enumerate(GLYPHS[char]):
+        for col, bit in enumerate(bits):
+            if bit == "#":
+                bitmap[GLYPH_Y + row][GLYPH_X + col] = 0
+
+
+def bullet(char, express):
+    bitmap = new_bitmap(BULLET_SIZE, BULLET_SIZE)
+    if express:
+        diamond(bitmap)
+    else:
+        circle(bitmap)
+    if char == "L":
+        cut_l(bitmap)
+    else:
+        cut_glyph(bitmap, char)
+    return bitmap
+
+
+def moon():
+    """Crescent moon, as the board drew it for night mode."""
+    bitmap = new_bitmap(MOON_SIZE, MOON_SIZE)
+    for x in range(1, 7):
+        for y in range(1, 7):
+            if (x - 3.5) ** 2 + (y - 3.5) ** 2 <= 12:
+                bitmap[y][x] = 1
+    for x in range(2, 7):
+        for y in range(1, 7):
+            if (x - 4.5) ** 2 + (y - 3.5) ** 2 <= 8:
+                bitmap[y][x] = 0
+    return bitmap
+
+
+def charmap():
+    """Tile index per character code: printable ASCII in order, else space."""
+    table = [0] * CHARMAP_SIZE
+    for ch in range(33, 127):
+        table[ch] = ch - 32
+    return table
+
+
+def pixels(bitmap):
+    return bytes(value for row in bitmap for value in row)
+
+
+def build():
+    out = bytearray(struct.pack(HEADER_FORMAT, MAGIC, BULLET_SIZE, BULLET_SIZE, MOON_SIZE, MOON_SIZE, len(ROUTES)))
+    out += struct.pack(f"<{CHARMAP_SIZE}b", *charmap())
+    out += pixels(moon())
+    for route_id, (char, color, express) in ROUTES.items():
+        out += struct.pack(BULLET_HEADER_FORMAT, route_id.encode("ascii"), color >> 16, (color >> 8) & 0xFF, color & 0xFF)
+        out += pixels(bullet(char, express))
+    return bytes(out)
+
+
+def preview(bitmap):
+    return "\n".join("".join("#" if value else "." for value in row) for row in bitmap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", default="assets.bin")
+    parser.add_argument("--show", help="print the bullet for this route")
+    args = parser.parse_args()
+
+    data = build()
+    with open(args.output, "wb") as f:
+        f.write(data)
+    pack = AssetPack(args.output)
+    print(f"Wrote {len(data)} bytes to {args.output}: charmap, moon and {len(pack.bullets)} route bullets")
+
+    if args.show:
+        char, _, express = ROUTES[args.show]
+        print(preview(bullet(char, express)))
+
+
+if __name__ == "__main__":
+    main()
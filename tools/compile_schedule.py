@@ -0,0 +1,146 @@
+"""
+Compile GTFS static stop times for our stops into the board's fallback table.
+
+When the realtime feed is down or stale, the board shows scheduled
+departures from schedule.bin instead of an error. Only the configured stops
+are kept, one packed 32-bit entry per (time of day, route) with a mask of
+the weekdays it runs, so a stop with a few hundred daily trains costs a few
+KB of flash:
+
+    python tools/compile_schedule.py gtfs_subway.zip --stops L10N,L10S -o schedule.bin
+
+Service days come from calendar.txt (or, for services only listed in
+calendar_dates.txt, the weekdays they're added on). Holiday exceptions
+aren't encoded; the board just assumes the regular weekday schedule.
+Times past 24:00 are folded into the next day. Copy schedule.bin to the
+board's root (SCHEDULE_FILE in config.py).
+"""
+
+import argparse
+import datetime
+import os
+import struct
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.dirname(os.path.abspath(__file__))]
+
+from compile_stops import GTFSSource  # noqa: E402
+from schedule_fallback import (  # noqa: E402
+    MAGIC,
+    HEADER_FORMAT,
+    ROUTE_FORMAT,
+    STOP_FORMAT,
+    DAYS_SHIFT,
+    ROUTE_SHIFT,
+    DAY_SECONDS,
+    ScheduleTable,
+)
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+ALL_DAYS = 0x7F
+
+
+def service_days(source):
+    """service_id -> weekday mask (bit 0 = Monday)."""
+    days = {}
+    if source.has("calendar.txt"):
+        for row in source.rows("calendar.txt"):
+            mask = 0
+            for bit, day in enumerate(WEEKDAYS):
+                if row.get(day) == "1":
+                    mask |= 1 << bit
+            days[row["service_id"]] = mask
+    added = {}
+    if source.has("calendar_dates.txt"):
+        for row in source.rows("calendar_dates.txt"):
+            if row["service_id"] in days or row.get("exception_type") != "1":
+                continue
+            date = datetime.datetime.strptime(row["date"], "%Y%m%d")
+            added[row["service_id"]] = added.get(row["service_id"], 0) | (1 << date.weekday())
+    days.update(added)
+    return days
+
+
+def parse_gtfs_time(value):
+    hours, minutes, seconds = value.strip().split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def next_day(mask):
+    """Shift a weekday mask one day later, Sunday wrapping to Monday."""
+    return ((mask << 1) | (mask >> 6)) & ALL_DAYS
+
+
+def collect(source, stop_ids):
+    """{stop_id: {(seconds, route_id): weekday mask}} for the given stops."""
+    days = service_days(source)
+    trips = {row["trip_id"]: (row["route_id"], row["service_id"]) for row in source.rows("trips.txt")}
+    table = {stop_id: {} for stop_id in stop_ids}
+    for row in source.rows("stop_times.txt"):
+        stop = table.get(row["stop_id"])
+        if stop is None or row["trip_id"] not in trips:
+            continue
+        route_id, service_id = trips[row["trip_id"]]
+        seconds = parse_gtfs_time(row.get("departure_time") or row["arrival_time"])
+        mask = days.get(service_id, ALL_DAYS)
+        while seconds >= DAY_SECONDS:
+            seconds -= DAY_SECONDS
+            mask = next_day(mask)
+        key = (seconds, route_id)
+        stop[key] = stop.get(key, 0) | mask
+    return table
+
+
+def compile_table(table):
+    route_ids = sorted({route_id for stop in table.values() for _, route_id in stop})
+    if len(route_ids) > 255:
+        raise SystemExit("too many routes for one table")
+    route_index = {route_id: n for n, route_id in enumerate(route_ids)}
+
+    stop_rows = []
+    entries = bytearray()
+    count = 0
+    for stop_id in sorted(table):
+        if not table[stop_id]:
+            print(f"No scheduled trains at {stop_id}; leaving it out")
+            continue
+        first = count
+        for (seconds, route_id), mask in sorted(table[stop_id].items()):
+            entries += struct.pack("<I", seconds | (mask << DAYS_SHIFT) | (route_index[route_id] << ROUTE_SHIFT))
+            count += 1
+        stop_rows.append((stop_id, first, count - first))
+
+    out = bytearray(struct.pack(HEADER_FORMAT, MAGIC, len(stop_rows), len(route_ids)))
+    for route_id in route_ids:
+        out += struct.pack(ROUTE_FORMAT, route_id.encode("ascii"))
+    for stop_id, first, n in stop_rows:
+        out += struct.pack(STOP_FORMAT, stop_id.encode("ascii"), first, n)
+    return bytes(out + entries), stop_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("gtfs", help="GTFS static zip or directory")
+    parser.add_argument("--stops", required=True, help="comma-separated stop IDs, as in config.py")
+    parser.add_argument("-o", "--output", default="schedule.bin")
+    args = parser.parse_args()
+
+    data, stop_rows = compile_table(collect(GTFSSource(args.gtfs), args.stops.split(",")))
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {len(data)} bytes to {args.output}")
+
+    # Read it back the way the board does
+    schedule = ScheduleTable(args.output)
+    now = datetime.datetime.now()
+    seconds = now.hour * 3600 + now.minute * 60 + now.second
+    for stop_id, _, n in stop_rows:
+        upcoming = ", ".join(
+            f"{route_id} {until // 60}m" for until, route_id in schedule.next_departures(stop_id, seconds, now.weekday())
+        )
+        print(f"{stop_id:8s} {n:5d} entries  next: {upcoming or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
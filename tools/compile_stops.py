@@ -0,0 +1,178 @@
+"""
+Compile GTFS static stops into the board's on-flash stop index.
+
+Reads stops.txt and routes.txt (plus trips.txt and stop_times.txt, when
+present, to learn which routes serve each stop) from a GTFS static zip or
+directory and writes a sorted, fixed-record binary file. The board's
+stop_index.StopIndex binary-searches it in place, so station names and
+route bullets cost a record-sized buffer instead of a table in RAM.
+
+    python tools/compile_stops.py gtfs_subway.zip -o stops.idx
+    python tools/compile_stops.py gtfs_subway.zip --find lorimer
+
+Copy stops.idx to the board's root (STOP_INDEX_FILE in config.py). --find
+searches station names and prints matching stop IDs and their routes,
+which is the easiest way to fill in the stop IDs in config.py.
+"""
+
+import argparse
+import csv
+import io
+import os
+import struct
+import sys
+import unicodedata
+import zipfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from stop_index import (  # noqa: E402
+    MAGIC,
+    HEADER_FORMAT,
+    ROUTE_FORMAT,
+    RECORD_FORMAT,
+    STOP_ID_SIZE,
+    StopIndex,
+)
+
+NAME_SIZE = struct.calcsize(RECORD_FORMAT) - STOP_ID_SIZE - 8
+MAX_ROUTES = 64
+
+
+class GTFSSource:
+    """Reads GTFS tables from a zip file or an unpacked directory."""
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+
+    def has(self, name):
+        if self.zip:
+            return name in self.zip.namelist()
+        return os.path.exists(os.path.join(self.path, name))
+
+    def rows(self, name):
+        if self.zip:
+            f = io.TextIOWrapper(self.zip.open(name), encoding="utf-8-sig")
+        else:
+            f = open(os.path.join(self.path, name), encoding="utf-8-sig", newline="")
+        with f:
+            yield from csv.DictReader(f)
+
+
+def ascii_name(name):
+    """Fold a station name to what the matrix font can draw."""
+    name = name.replace("\u2013", "-").replace("\u2014", "-")
+    folded = unicodedata.normalize("NFKD", name).encode("ascii", "ignore")
+    return folded[:NAME_SIZE]
+
+
+def parse_color(value):
+    try:
+        return int(value, 16) if value else 0xFFFFFF
+    except ValueError:
+        return 0xFFFFFF
+
+
+def load_routes(source):
+    """route_id -> RGB color, in routes.txt order."""
+    routes = {}
+    for row in source.rows("routes.txt"):
+        routes[row["route_id"]] = parse_color(row.get("route_color"))
+    return routes
+
+
+def stop_routes(source, stops):
+    """stop_id -> set of route_ids serving it, from trips and stop_times.
+
+    Platform stops get the routes of the trips that call there; parent
+    stations get the union of their platforms, and platforms no trip calls
+    at fall back to their parent's routes.
+    """
+    served = {}
+    if not (source.has("trips.txt") and source.has("stop_times.txt")):
+        return served
+    trip_routes = {row["trip_id"]: row["route_id"] for row in source.rows("trips.txt")}
+    for row in source.rows("stop_times.txt"):
+        route_id = trip_routes.get(row["trip_id"])
+        if route_id:
+            served.setdefault(row["stop_id"], set()).add(route_id)
+    for stop_id, stop in stops.items():
+        parent = stop.get("parent_station")
+        if parent and stop_id in served:
+            served.setdefault(parent, set()).update(served[stop_id])
+    for stop_id, stop in stops.items():
+        parent = stop.get("parent_station")
+        if parent and stop_id not in served and parent in served:
+            served[stop_id] = served[parent]
+    return served
+
+
+def compile_index(source):
+    """Return the index file's bytes and the number of stops in it."""
+    stops = {row["stop_id"]: row for row in source.rows("stops.txt")}
+    routes = load_routes(source)
+    served = stop_routes(source, stops)
+
+    route_ids = [route_id for route_id in routes if any(route_id in r for r in served.values())] or list(routes)
+    if len(route_ids) > MAX_ROUTES:
+        raise SystemExit(f"{len(route_ids)} routes; the index holds at most {MAX_ROUTES}")
+    route_bits = {route_id: 1 << n for n, route_id in enumerate(route_ids)}
+
+    records = []
+    for stop_id, stop in stops.items():
+        encoded = stop_id.encode("ascii")
+        if len(encoded) > STOP_ID_SIZE:
+            print(f"Skipping stop ID longer than {STOP_ID_SIZE} bytes: {stop_id}")
+            continue
+        mask = 0
+        for route_id in served.get(stop_id, ()):
+            mask |= route_bits.get(route_id, 0)
+        records.append((encoded, ascii_name(stop.get("stop_name", "")), mask))
+    records.sort()
+
+    out = bytearray(struct.pack(HEADER_FORMAT, MAGIC, len(records), struct.calcsize(RECORD_FORMAT), len(route_ids)))
+    for route_id in route_ids:
+        color = routes[route_id]
+        out += struct.pack(ROUTE_FORMAT, route_id.encode("ascii")[:4], color >> 16, (color >> 8) & 0xFF, color & 0xFF)
+    for encoded, name, mask in records:
+        out += struct.pack(RECORD_FORMAT, encoded, name, mask)
+    return bytes(out), len(records)
+
+
+def find_stops(index_path, source, query):
+    """Print stop IDs whose station name contains query."""
+    index = StopIndex(index_path)
+    query = query.lower()
+    try:
+        for row in source.rows("stops.txt"):
+            if query not in row.get("stop_name", "").lower():
+                continue
+            found = index.lookup(row["stop_id"])
+            if found:
+                name, route_ids = found
+                print(f"{row['stop_id']:8s} {name:24s} {' '.join(route_ids)}")
+    finally:
+        index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("gtfs", help="GTFS static zip or directory")
+    parser.add_argument("-o", "--output", default="stops.idx")
+    parser.add_argument("--find", help="print stop IDs whose name contains this text")
+    args = parser.parse_args()
+
+    source = GTFSSource(args.gtfs)
+    data, count = compile_index(source)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {count} stops ({len(data)} bytes) to {args.output}")
+
+    if args.find:
+        find_stops(args.output, source, args.find)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Local stand-in for the MTA feed endpoint.
+
+Serves a recorded feed file (or a synthetic one from feedgen) over HTTP/1.1
+with keep-alive, optionally over TLS and gzip, and counts connections and
+bytes so socket reuse and compression can be checked from the client side (GET /status returns the counters):
+
+    openssl req -x509 -newkey rsa:2048 -nodes -days 30 -subj /CN=localhost \\
+        -keyout key.pem -out cert.pem
+    python tools/feed_server.py --port 8443 --certfile cert.pem --keyfile key.pem
+"""
+
+import argparse
+import gzip
+import json
+import os
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import feedgen
+
+
+class FeedSource:
+    """Holds the feed bytes served to clients."""
+
+    def __init__(self, path=None, route="L", trips=60, regenerate=30):
+        self.path = path
+        self.route = route
+        self.trips = trips
+        self.regenerate = regenerate
+        self._lock = threading.Lock()
+        self._data = None
+        self._gzipped = None
+        self._built_at = 0
+
+    def get(self):
+        with self._lock:
+            if self.path:
+                if self._data is None:
+                    with open(self.path, "rb") as f:
+                        self._data = f.read()
+                    self._gzipped = None
+            elif self._data is None or time.time() - self._built_at >= self.regenerate:
+                self._data = feedgen.build_feed(self.route, self.trips)
+                self._gzipped = None
+                self._built_at = time.time()
+            return self._data
+
+    def get_gzipped(self):
+        data = self.get()
+        with self._lock:
+            if self._gzipped is None:
+                self._gzipped = gzip.compress(data)
+            return self._gzipped
+
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, source, quiet=True, gzip_enabled=False):
+        super().__init__(address, FeedRequestHandler)
+        self.source = source
+        self.quiet = quiet
+        self.gzip_enabled = gzip_enabled
+        self.stats_lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def count(self, name, amount=1):
+        with self.stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def do_GET(self):
+        if self.path == "/status":
+            body = json.dumps(
+                {
+                    "connections": self.server.connections,
+                    "requests": self.server.requests,
+                    "bytes_sent": self.server.bytes_sent,
+                }
+            ).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.server.count("requests")
+        accepts_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        if self.server.gzip_enabled and accepts_gzip:
+            body = self.server.source.get_gzipped()
+        else:
+            body = self.server.source.get()
+            accepts_gzip = False
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-protobuf")
+        if accepts_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count("bytes_sent", len(body))
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(
+    host="127.0.0.1", port=0, source=None, certfile=None, keyfile=None, quiet=True, gzip_enabled=False
+):
+    """Create a FeedServer; wraps the listening socket in TLS when given a cert."""
+    server = FeedServer((host, port), source or FeedSource(), quiet, gzip_enabled)
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    return server
+
+
+def serve_in_thread(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--feed", help="recorded feed file to serve (default: synthetic)")
+    parser.add_argument("--route", default="L")
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--gzip", action="store_true", help="gzip bodies for clients that accept it")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.feed and not os.path.exists(args.feed):
+        sys.exit(f"No such feed file: {args.feed}")
+
+    server = make_server(
+        args.host,
+        args.port,
+        FeedSource(args.feed, args.route),
+        args.certfile,
+        args.keyfile,
+        quiet=not args.verbose,
+        gzip_enabled=args.gzip,
+    )
+    scheme = "https" if args.certfile else "http"
+    print(f"Serving feed on {scheme}://{args.host}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"connections={server.connections} requests={server.requests} bytes={server.bytes_sent}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Synthetic GTFS-realtime feed generator for host-side tools.
+
+Builds FeedMessage bytes with the same field layout partial_protobuf_feed
+expects from the MTA feeds (header, entities with trip descriptors and
+stop_time_updates). Useful when there's no recorded feed at hand:
+
+    python tools/feedgen.py --route L --trips 60 -o feed.bin
+"""
+
+import argparse
+import random
+import time
+
+
+def encode_varint(value):
+    out = bytearray()
+    while True:
+        b = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def encode_key(field_num, wire_type):
+    return encode_varint((field_num << 3) | wire_type)
+
+
+def encode_varint_field(field_num, value):
+    return encode_key(field_num, 0) + encode_varint(value)
+
+
+def encode_bytes_field(field_num, payload):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return encode_key(field_num, 2) + encode_varint(len(payload)) + payload
+
+
+def encode_header(timestamp):
+    return encode_bytes_field(1, "1.0") + encode_varint_field(2, 0) + encode_varint_field(3, timestamp)
+
+
+def encode_stop_time_update(stop_sequence, stop_id, arrival, departure):
+    body = encode_varint_field(1, stop_sequence) + encode_bytes_field(4, stop_id)
+    if arrival is not None:
+        body += encode_bytes_field(2, encode_varint_field(2, arrival))
+    if departure is not None:
+        body += encode_bytes_field(3, encode_varint_field(2, departure))
+    return body
+
+
+def encode_trip_update(trip_id, route_id, stop_times, timestamp):
+    """stop_times is a list of (stop_id, arrival, departure)."""
+    trip = encode_bytes_field(1, trip_id) + encode_bytes_field(5, route_id)
+    body = encode_bytes_field(1, trip)
+    for seq, (stop_id, arrival, departure) in enumerate(stop_times, 1):
+        body += encode_bytes_field(2, encode_stop_time_update(seq, stop_id, arrival, departure))
+    body += encode_varint_field(4, timestamp)
+    return body
+
+
+def encode_feed(timestamp, trips):
+    """trips is a list of (trip_id, route_id, stop_times)."""
+    out = bytearray(encode_bytes_field(1, encode_header(timestamp)))
+    for n, (trip_id, route_id, stop_times) in enumerate(trips, 1):
+        entity = encode_bytes_field(1, str(n)) + encode_bytes_field(
+            3, encode_trip_update(trip_id, route_id, stop_times, timestamp)
+        )
+        out += encode_bytes_field(2, entity)
+    return bytes(out)
+
+
+def stop_ids_for(route_id, stations):
+    """Return the stop IDs of a synthetic line, without the N/S suffix."""
+    return [f"{route_id}{n:02d}" for n in range(1, stations + 1)]
+
+
+def build_trips(route_id, trips, stations=24, now=None, seed=0, spacing=150):
+    """Trips running in both directions, one every `spacing` seconds."""
+    rng = random.Random(seed)
+    now = int(now if now is not None else time.time())
+    stops = stop_ids_for(route_id, stations)
+    result = []
+
+    for n in range(trips):
+        direction = "N" if n % 2 else "S"
+        route_stops = stops if direction == "S" else list(reversed(stops))
+        start = now + (n // 2) * spacing - stations * 60
+        origin = 60000 + n * 100
+        trip_id = f"{origin:06d}_{route_id}..{direction}"
+
+        stop_times = []
+        t = start
+        for stop in route_stops:
+            t += 90 + rng.randint(-15, 15)
+            if t < now - 60:
+                continue
+            stop_times.append((stop + direction, t, t + 20))
+        if stop_times:
+            result.append((trip_id, route_id, stop_times))
+
+    return result
+
+
+def build_feed(route_id="L", trips=60, stations=24, now=None, seed=0):
+    now = int(now if now is not None else time.time())
+    return encode_feed(now, build_trips(route_id, trips, stations, now, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--route", default="L")
+    parser.add_argument("--trips", type=int, default=60)
+    parser.add_argument("--stations", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    data = build_feed(args.route, args.trips, args.stations, seed=args.seed)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {len(data)} bytes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
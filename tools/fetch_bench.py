@@ -0,0 +1,121 @@
+"""
+Run the board's feed client against a feed server from the host.
+
+Uses http_client.FeedClient with CPython's socket and ssl modules standing in
+for socketpool and the board's ssl, and prints the per-phase timings and
+handshake counts for a series of fetches. With --serve a local feed_server is
+started in-process, so a full TLS check needs nothing else:
+
+    python tools/fetch_bench.py --serve --certfile cert.pem --keyfile key.pem -n 20
+
+Add --gzip to request (and, with --serve, send) gzip-compressed feeds and
+compare wire bytes and transfer time against the uncompressed run. With
+--buffer the bodies are read into one ReceiveBuffer, as on the board, and
+parsed straight from it.
+"""
+
+import argparse
+import os
+import socket
+import ssl
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, "lib")]
+
+from http_client import FeedClient, ReceiveBuffer  # noqa: E402
+from partial_protobuf_feed import parse_feed_message  # noqa: E402
+
+import feed_server  # noqa: E402
+
+
+def make_ssl_context(cafile=None, insecure=False):
+    context = ssl.create_default_context(cafile=cafile)
+    if insecure:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def run(client, url, count, interval=0.0, headers=None, rx_buffer=None, verbose=True):
+    """Fetch url count times; returns a list of per-request timing dicts."""
+    results = []
+    for n in range(count):
+        response = client.get(url, headers)
+        if rx_buffer is not None:
+            body = response.read_into(rx_buffer)
+            parse_feed_message(body)
+        else:
+            body = response.read()
+        timing = dict(client.last_connection.timing)
+        timing["status"] = response.status_code
+        timing["bytes"] = len(body)
+        timing["wire_bytes"] = response.wire_bytes
+        results.append(timing)
+        if verbose:
+            print(
+                f"#{n + 1:3d} status={response.status_code} bytes={len(body)} "
+                f"wire={response.wire_bytes} "
+                f"dns={timing['dns']}ms connect={timing['connect']}ms "
+                f"tls={timing['tls']}ms transfer={timing['transfer']}ms"
+            )
+        if interval:
+            time.sleep(interval)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("url", nargs="?", help="feed URL (default: the --serve server)")
+    parser.add_argument("-n", "--count", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds between fetches")
+    parser.add_argument("--serve", action="store_true", help="start a local feed server")
+    parser.add_argument("--feed", help="recorded feed file for --serve")
+    parser.add_argument("--certfile", help="server certificate for --serve (enables TLS)")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--cafile", help="CA bundle for verifying the server")
+    parser.add_argument("--insecure", action="store_true", help="skip certificate checks")
+    parser.add_argument("--gzip", action="store_true", help="request gzip-compressed feeds")
+    parser.add_argument("--buffer", type=int, help="read into a ReceiveBuffer of this initial size")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    cafile = args.cafile
+    if args.serve:
+        server = feed_server.make_server(
+            source=feed_server.FeedSource(args.feed),
+            certfile=args.certfile,
+            keyfile=args.keyfile,
+            gzip_enabled=args.gzip,
+        )
+        feed_server.serve_in_thread(server)
+        scheme = "https" if args.certfile else "http"
+        url = url or f"{scheme}://localhost:{server.server_address[1]}/feed"
+        cafile = cafile or args.certfile
+    if not url:
+        parser.error("a URL is required without --serve")
+
+    client = FeedClient(socket, make_ssl_context(cafile, args.insecure))
+    headers = {"Accept-Encoding": "gzip"} if args.gzip else None
+    rx_buffer = ReceiveBuffer(args.buffer) if args.buffer else None
+    results = run(client, url, args.count, args.interval, headers, rx_buffer)
+    client.close()
+
+    stats = client.stats()
+    transfers = sorted(r["transfer"] for r in results)
+    print(
+        f"requests={stats['requests']} handshakes={stats['handshakes']} "
+        f"reused={stats['reused']} transfer_median={transfers[len(transfers) // 2]}ms "
+        f"wire_total={sum(r['wire_bytes'] for r in results)} body_total={sum(r['bytes'] for r in results)}"
+    )
+    if rx_buffer is not None:
+        print(f"rx_buffer size={len(rx_buffer.buf)} grows={rx_buffer.grows}")
+    if server:
+        print(f"server connections={server.connections} requests={server.requests}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Fleet load test: many simulated boards against an aggregator or feed server.
+
+Each simulated board is a thread running the board's own fetch path,
+http_client.FeedClient.fetch_with_retry into a ReceiveBuffer (what
+ConnectionManager.fetch_with_retry calls), with its own pair of stop IDs.
+It parses what it gets, exactly as get_feed_data does. The test sweeps the
+number of boards and reports throughput, p50/p99 latency and how many
+upstream fetches the target made per board request.
+
+    # Spawn a feed_server and an aggregator in subprocesses and sweep N
+    python tools/load_test.py --serve --boards 10,50,100,200,400 --duration 20
+
+    # Boards hitting the feed server directly, for comparison
+    python tools/load_test.py --serve --mode feed --boards 10,50,100
+
+A row is flagged "saturated" when completed requests fall below 90% of the
+offered load (boards / interval); the first such row is where one
+aggregator process stops scaling on this machine.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, "lib")]
+
+from http_client import FeedClient, ReceiveBuffer, NOT_MODIFIED  # noqa: E402
+from partial_protobuf_feed import parse_feed_message  # noqa: E402
+from train_service import AGGREGATOR_PATH, parse_aggregator_payload  # noqa: E402
+
+import feedgen  # noqa: E402
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SimulatedBoard(threading.Thread):
+    """One board refreshing every `interval` seconds until told to stop."""
+
+    def __init__(self, url, mode, interval, retry_delay, stop_event):
+        super().__init__(daemon=True)
+        self.url = url
+        self.mode = mode
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.stop_event = stop_event
+        self.client = FeedClient(socket, None)
+        self.rx_buffer = ReceiveBuffer(4096)
+        self.latencies = []
+        self.not_modified = 0
+        self.errors = 0
+
+    def run(self):
+        # Boards boot at different times, so spread the first fetches out
+        if self.stop_event.wait(random.uniform(0, self.interval)):
+            return
+        conditional = self.mode == "aggregator"
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                data = self.client.fetch_with_retry(
+                    self.url,
+                    self.rx_buffer,
+                    conditional=conditional,
+                    max_retries=3,
+                    retry_delay=self.retry_delay,
+                )
+                if data is NOT_MODIFIED:
+                    self.not_modified += 1
+                elif data is None:
+                    self.errors += 1
+                elif conditional:
+                    parse_aggregator_payload(data)
+                else:
+                    parse_feed_message(data)
+                if data is not None:
+                    self.latencies.append(time.perf_counter() - start)
+            except (OSError, RuntimeError, ValueError):
+                self.errors += 1
+            elapsed = time.perf_counter() - start
+            self.stop_event.wait(max(0.0, self.interval - elapsed))
+        self.client.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def board_url(base_url, mode, stops):
+    if mode == "aggregator":
+        return f"{base_url.rstrip('/')}{AGGREGATOR_PATH}?stops={','.join(stops)}"
+    return base_url
+
+
+def upstream_requests(status_url):
+    """Requests the upstream feed server has answered so far."""
+    if not status_url:
+        return None
+    with urllib.request.urlopen(status_url, timeout=5) as response:
+        return json.load(response)["requests"]
+
+
+def run_step(base_url, mode, boards, duration, interval, retry_delay, status_url, route, stations):
+    stop_ids = [s + d for s in feedgen.stop_ids_for(route, stations) for d in "NS"]
+    stop_event = threading.Event()
+    threads = []
+    for _ in range(boards):
+        stops = random.sample(stop_ids, 2)
+        threads.append(SimulatedBoard(board_url(base_url, mode, stops), mode, interval, retry_delay, stop_event))
+
+    upstream_before = upstream_requests(status_url)
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop_event.set()
+    for thread in threads:
+        thread.join(timeout=interval + 10)
+    elapsed = time.perf_counter() - started
+    upstream_after = upstream_requests(status_url)
+
+    latencies = sorted(lat for t in threads for lat in t.latencies)
+    completed = len(latencies)
+    # The first interval is spent staggering board start-up
+    offered = boards * max(duration - interval / 2, interval) / interval
+    upstream = None if upstream_before is None else upstream_after - upstream_before
+    return {
+        "boards": boards,
+        "requests": completed,
+        "throughput": completed / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "not_modified": sum(t.not_modified for t in threads),
+        "errors": sum(t.errors for t in threads),
+        "upstream_fetches": upstream,
+        "amplification": (upstream / completed) if upstream is not None and completed else None,
+        "saturated": completed < 0.9 * offered,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def spawn_servers(mode, ttl, route):
+    """Start feed_server (and an aggregator in front of it) as subprocesses."""
+    processes = []
+    feed_port = free_port()
+    processes.append(
+        subprocess.Popen(
+            [sys.executable, os.path.join(TOOLS_DIR, "feed_server.py"), "--port", str(feed_port), "--route", route]
+        )
+    )
+    feed_url = f"http://127.0.0.1:{feed_port}/"
+    status_url = f"{feed_url}status"
+    wait_for(status_url)
+    if mode == "feed":
+        return processes, feed_url, status_url
+
+    agg_port = free_port()
+    processes.append(
+        subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(TOOLS_DIR, "aggregator.py"),
+                "--feed",
+                f"{route}={feed_url}",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(agg_port),
+                "--ttl",
+                str(ttl),
+            ]
+        )
+    )
+    agg_url = f"http://127.0.0.1:{agg_port}"
+    wait_for(f"{agg_url}/v1/status")
+    return processes, agg_url, status_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", help="aggregator base URL or feed URL")
+    parser.add_argument("--mode", choices=("aggregator", "feed"), default="aggregator")
+    parser.add_argument("--status-url", help="upstream feed server /status URL, for amplification")
+    parser.add_argument("--serve", action="store_true", help="spawn local feed server (and aggregator)")
+    parser.add_argument("--boards", default="10,50,100,200", help="comma-separated board counts")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per step")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between each board's fetches")
+    parser.add_argument("--retry-delay", type=float, default=0.5)
+    parser.add_argument("--ttl", type=float, default=5, help="aggregator upstream TTL with --serve")
+    parser.add_argument("--route", default="L")
+    parser.add_argument("--stations", type=int, default=24)
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    processes = []
+    target, status_url = args.target, args.status_url
+    if args.serve:
+        processes, target, status_url = spawn_servers(args.mode, args.ttl, args.route)
+    if not target:
+        parser.error("--target is required without --serve")
+
+    try:
+        if not args.json:
+            print(
+                f"{'boards':>6} {'reqs':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+                f"{'304s':>6} {'errors':>6} {'upstream':>8} {'ampl':>7}"
+            )
+        for boards in (int(n) for n in args.boards.split(",")):
+            result = run_step(
+                target,
+                args.mode,
+                boards,
+                args.duration,
+                args.interval,
+                args.retry_delay,
+                status_url,
+                args.route,
+                args.stations,
+            )
+            if args.json:
+                print(json.dumps(result))
+                continue
+            upstream = "-" if result["upstream_fetches"] is None else result["upstream_fetches"]
+            ampl = "-" if result["amplification"] is None else f"{result['amplification']:.4f}"
+            print(
+                f"{result['boards']:>6} {result['requests']:>7} {result['throughput']:>8.1f} "
+                f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['not_modified']:>6} "
+                f"{result['errors']:>6} {upstream:>8} {ampl:>7}"
+                + ("  saturated" if result["saturated"] else "")
+            )
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
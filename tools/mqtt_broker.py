@@ -0,0 +1,150 @@
+"""
+Local MQTT broker stand-in for testing push mode.
+
+Handles what the board and publisher use: CONNECT, SUBSCRIBE (with + and #
+wildcards), QoS 0 PUBLISH, retained messages, PINGREQ and DISCONNECT. QoS 1
+publishes are acknowledged and delivered at QoS 0. Counts messages and bytes
+delivered, so steady-state traffic can be read off after a run.
+
+    python tools/mqtt_broker.py --port 1883
+"""
+
+import argparse
+import socketserver
+import struct
+import threading
+
+import mqtt_wire as wire
+
+
+class Broker(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, verbose=False):
+        super().__init__(address, BrokerHandler)
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.retained = {}
+        self.published = 0
+        self.delivered = 0
+        self.bytes_delivered = 0
+
+    def route(self, topic, payload, retain):
+        data = wire.publish_packet(topic, payload)
+        with self.lock:
+            self.published += 1
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            targets = [s for s in self.sessions if s.wants(topic)]
+        for session in targets:
+            if session.send(data):
+                with self.lock:
+                    self.delivered += 1
+                    self.bytes_delivered += len(data)
+
+
+class BrokerHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.subscriptions = []
+        self.send_lock = threading.Lock()
+
+    def wants(self, topic):
+        return any(wire.topic_matches(pattern, topic) for pattern in self.subscriptions)
+
+    def send(self, data):
+        try:
+            with self.send_lock:
+                self.request.sendall(data)
+            return True
+        except OSError:
+            return False
+
+    def handle(self):
+        broker = self.server
+        try:
+            packet_type, _, _ = wire.read_packet(self.request)
+            if packet_type != wire.CONNECT:
+                return
+            self.send(wire.packet(wire.CONNACK, 0, b"\x00\x00"))
+            with broker.lock:
+                broker.sessions.add(self)
+
+            while True:
+                packet_type, flags, body = wire.read_packet(self.request)
+                if packet_type == wire.PUBLISH:
+                    topic, payload, retain = wire.parse_publish(flags, body)
+                    if (flags >> 1) & 0x03:
+                        (topic_length,) = struct.unpack_from("!H", body, 0)
+                        packet_id = body[2 + topic_length : 4 + topic_length]
+                        self.send(wire.packet(wire.PUBACK, 0, packet_id))
+                    broker.route(topic, payload, retain)
+                elif packet_type == wire.SUBSCRIBE:
+                    self._subscribe(body)
+                elif packet_type == wire.UNSUBSCRIBE:
+                    index = 2
+                    while index < len(body):
+                        topic, index = wire.read_string(body, index)
+                        if topic.decode("utf-8") in self.subscriptions:
+                            self.subscriptions.remove(topic.decode("utf-8"))
+                    self.send(wire.packet(wire.UNSUBACK, 0, body[:2]))
+                elif packet_type == wire.PINGREQ:
+                    self.send(wire.packet(wire.PINGRESP, 0))
+                elif packet_type == wire.DISCONNECT:
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with broker.lock:
+                broker.sessions.discard(self)
+
+    def _subscribe(self, body):
+        broker = self.server
+        (packet_id,) = struct.unpack_from("!H", body, 0)
+        index = 2
+        granted = bytearray()
+        new_topics = []
+        while index < len(body):
+            topic, index = wire.read_string(body, index)
+            index += 1  # requested QoS; we only grant 0
+            self.subscriptions.append(topic.decode("utf-8"))
+            new_topics.append(topic.decode("utf-8"))
+            granted.append(0)
+        self.send(wire.packet(wire.SUBACK, 0, struct.pack("!H", packet_id) + bytes(granted)))
+        if broker.verbose:
+            print(f"subscribe {new_topics}")
+
+        with broker.lock:
+            retained = [
+                (t, p) for t, p in broker.retained.items() if any(wire.topic_matches(n, t) for n in new_topics)
+            ]
+        for topic, payload in retained:
+            self.send(wire.publish_packet(topic, payload, retain=True))
+
+
+def make_broker(host="127.0.0.1", port=0, verbose=False):
+    return Broker((host, port), verbose)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    broker = make_broker(args.host, args.port, args.verbose)
+    print(f"MQTT broker stand-in on {args.host}:{broker.server_address[1]}")
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"published={broker.published} delivered={broker.delivered} bytes={broker.bytes_delivered}")
+
+
+if __name__ == "__main__":
+    main()
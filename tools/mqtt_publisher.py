@@ -0,0 +1,181 @@
+"""
+Publish per-stop arrival updates to MQTT for boards in push mode.
+
+Polls one or more GTFS-realtime feeds, indexes them per stop with
+train_service.index_stop_times, and publishes a retained message to
+<prefix>/<stop_id> only when that stop's upcoming arrivals change:
+
+    {"ts": <feed timestamp>, "sent": <publish time>, "arrivals": [[trip_id, time, route_id], ...]}
+
+After every poll that read a feed it also publishes {"ts": <newest feed
+timestamp>, "sent": <publish time>} to <prefix>/heartbeat, so boards can tell
+a quiet stop from a publisher that has stopped.
+
+Boards set PUSH_MODE_ENABLED and subscribe to their stops and the heartbeat,
+so between changes only one small message per poll crosses the network. Try it locally with the
+stand-ins:
+
+    python tools/feed_server.py --port 8081 &
+    python tools/mqtt_broker.py --port 1883 &
+    python tools/mqtt_publisher.py --feed http://127.0.0.1:8081/ --broker 127.0.0.1 --measure
+"""
+
+import argparse
+import json
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, "lib")]
+
+from http_client import FeedClient, ReceiveBuffer, GZIP_SUPPORTED  # noqa: E402
+from partial_protobuf_feed import parse_feed_message  # noqa: E402
+from train_service import index_stop_times  # noqa: E402
+
+import mqtt_wire  # noqa: E402
+
+# <prefix>/<this> carries the newest feed timestamp after every poll
+HEARTBEAT_TOPIC = "heartbeat"
+
+
+class Publisher:
+    """Tracks what each stop last published and sends only changes."""
+
+    def __init__(self, client, prefix="subway", limit=6, stops=None):
+        self.client = client
+        self.prefix = prefix
+        self.limit = limit
+        self.stops = set(stops) if stops else None
+        self.last = {}
+        self.sources = {}  # feed -> stops it had arrivals for last time
+        self.published = 0
+        self.bytes_published = 0
+
+    def publish_feed(self, feed_dict, now=None, source=None):
+        """Publish changed stops from one parsed feed; returns the count sent.
+
+        source names the feed (its URL) so that a stop it carried last time
+        and has dropped since, e.g. at the end of service, is published with
+        no arrivals rather than left showing its last ones.
+        """
+        now = time.time() if now is None else now
+        timestamp = feed_dict["header"]["timestamp"]
+        index = index_stop_times(feed_dict, self.stops)
+        for stop_id in self.sources.get(source, ()):
+            if stop_id not in index:
+                index[stop_id] = []
+        self.sources[source] = [stop_id for stop_id, arrivals in index.items() if arrivals]
+        changed = 0
+        for stop_id, arrivals in index.items():
+            upcoming = [[trip_id, t, route_id] for t, trip_id, route_id in arrivals if t >= now][: self.limit]
+            if self.last.get(stop_id) == upcoming:
+                continue
+            self.last[stop_id] = upcoming
+            payload = json.dumps(
+                {"ts": timestamp, "sent": round(time.time(), 3), "arrivals": upcoming}, separators=(",", ":")
+            )
+            self.client.publish(f"{self.prefix}/{stop_id}", payload, retain=True)
+            self.published += 1
+            self.bytes_published += len(payload)
+            changed += 1
+        return changed
+
+    def heartbeat(self, timestamp):
+        """Tell boards the feeds are still being read, changed or not."""
+        payload = json.dumps({"ts": timestamp, "sent": round(time.time(), 3)}, separators=(",", ":"))
+        self.client.publish(f"{self.prefix}/{HEARTBEAT_TOPIC}", payload, retain=True)
+
+
+class LatencyProbe:
+    """Subscribes like a board and measures publish -> delivery time."""
+
+    def __init__(self, host, port, prefix):
+        self.samples = []
+        self._lock = threading.Lock()
+        self.client = mqtt_wire.Client(host, port, client_id="latency-probe")
+        self.client.on_message = self._on_message
+        self.client.connect()
+        self.client.subscribe(f"{prefix}/#")
+
+    def _on_message(self, topic, payload):
+        sent = json.loads(payload).get("sent")
+        if sent:
+            with self._lock:
+                self.samples.append(time.time() - sent)
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self.samples)
+            self.samples = []
+        if not samples:
+            return "no deliveries"
+        p50 = samples[len(samples) // 2] * 1000
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+        return f"deliveries={len(samples)} p50={p50:.2f}ms p99={p99:.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--feed", action="append", required=True, help="GTFS-realtime feed URL")
+    parser.add_argument("--broker", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--prefix", default="subway")
+    parser.add_argument("--interval", type=float, default=30)
+    parser.add_argument("--limit", type=int, default=6, help="arrivals per stop")
+    parser.add_argument("--stops", help="comma-separated stop IDs to publish (default: all)")
+    parser.add_argument("--once", action="store_true", help="publish one round and exit")
+    parser.add_argument("--measure", action="store_true", help="report publish->delivery latency")
+    args = parser.parse_args()
+
+    client = mqtt_wire.Client(args.broker, args.port, client_id="subway-publisher")
+    client.connect()
+    publisher = Publisher(client, args.prefix, args.limit, args.stops.split(",") if args.stops else None)
+    probe = LatencyProbe(args.broker, args.port, args.prefix) if args.measure else None
+
+    feed_client = FeedClient(socket, ssl.create_default_context())
+    rx_buffer = ReceiveBuffer(65536)
+    headers = {"Accept-Encoding": "gzip"} if GZIP_SUPPORTED else None
+
+    try:
+        while True:
+            started = time.monotonic()
+            changed = 0
+            newest = 0
+            for url in args.feed:
+                try:
+                    data = feed_client.fetch_with_retry(url, rx_buffer, headers, retry_delay=1)
+                except (OSError, RuntimeError) as e:
+                    print(f"Fetch failed for {url}: {e}")
+                    continue
+                if data:
+                    feed_dict = parse_feed_message(data)
+                    newest = max(newest, feed_dict["header"]["timestamp"])
+                    changed += publisher.publish_feed(feed_dict, source=url)
+            if newest:
+                publisher.heartbeat(newest)
+            else:
+                client.ping()
+
+            line = f"changed={changed} published={publisher.published} bytes={publisher.bytes_published}"
+            if probe:
+                time.sleep(0.2)
+                line += " " + probe.summary()
+            print(line)
+
+            if args.once:
+                break
+            time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.disconnect()
+        if probe:
+            probe.client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Just enough MQTT 3.1.1 for the host tools: packet framing plus a tiny client.
+
+The broker stand-in (mqtt_broker.py) and the publisher (mqtt_publisher.py)
+both use it, so the push path can be exercised without installing a broker
+or a client library. Only QoS 0 is supported.
+"""
+
+import socket
+import struct
+import threading
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def encode_remaining_length(length):
+    out = bytearray()
+    while True:
+        b = length % 128
+        length //= 128
+        out.append(b | 0x80 if length else b)
+        if not length:
+            return bytes(out)
+
+
+def encode_string(value):
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return struct.pack("!H", len(value)) + value
+
+
+def packet(packet_type, flags, body=b""):
+    return bytes([(packet_type << 4) | flags]) + encode_remaining_length(len(body)) + body
+
+
+def read_exact(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("socket closed")
+        data += chunk
+    return bytes(data)
+
+
+def read_packet(sock):
+    """Return (packet_type, flags, body) for the next packet on sock."""
+    first = read_exact(sock, 1)[0]
+    multiplier = 1
+    length = 0
+    while True:
+        b = read_exact(sock, 1)[0]
+        length += (b & 0x7F) * multiplier
+        if not b & 0x80:
+            break
+        multiplier *= 128
+    return first >> 4, first & 0x0F, read_exact(sock, length) if length else b""
+
+
+def read_string(body, index):
+    (length,) = struct.unpack_from("!H", body, index)
+    start = index + 2
+    return body[start : start + length], start + length
+
+
+def publish_packet(topic, payload, retain=False):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return packet(PUBLISH, 1 if retain else 0, encode_string(topic) + payload)
+
+
+def parse_publish(flags, body):
+    """Return (topic, payload, retain) of a PUBLISH body."""
+    topic, index = read_string(body, 0)
+    if (flags >> 1) & 0x03:
+        index += 2  # packet identifier, QoS > 0 only
+    return topic.decode("utf-8"), body[index:], bool(flags & 0x01)
+
+
+def topic_matches(pattern, topic):
+    """MQTT wildcard match for + and #."""
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class Client:
+    """Blocking QoS 0 client; on_message(topic, payload) runs on a reader thread."""
+
+    def __init__(self, host, port=1883, client_id="host-tool", keep_alive=60):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.keep_alive = keep_alive
+        self.on_message = None
+        self.sock = None
+        self._send_lock = threading.Lock()
+        self._packet_id = 0
+        self._reader = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        body = encode_string("MQTT") + bytes([4, 0x02]) + struct.pack("!H", self.keep_alive)
+        body += encode_string(self.client_id)
+        self._send(packet(CONNECT, 0, body))
+        packet_type, _, ack = read_packet(self.sock)
+        if packet_type != CONNACK or ack[1] != 0:
+            raise ConnectionError(f"CONNACK refused: {ack!r}")
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def _send(self, data):
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def _read_loop(self):
+        try:
+            while True:
+                packet_type, flags, body = read_packet(self.sock)
+                if packet_type == PUBLISH and self.on_message:
+                    topic, payload, _ = parse_publish(flags, body)
+                    self.on_message(topic, payload)
+        except (ConnectionError, OSError):
+            pass
+
+    def subscribe(self, topic):
+        self._packet_id = self._packet_id % 0xFFFF + 1
+        body = struct.pack("!H", self._packet_id) + encode_string(topic) + b"\x00"
+        self._send(packet(SUBSCRIBE, 0x02, body))
+
+    def publish(self, topic, payload, retain=False):
+        self._send(publish_packet(topic, payload, retain))
+
+    def ping(self):
+        self._send(packet(PINGREQ, 0))
+
+    def disconnect(self):
+        if self.sock:
+            try:
+                self._send(packet(DISCONNECT, 0))
+            finally:
+                self.sock.close()
+                self.sock = None
@@ -0,0 +1,111 @@
+"""
+Local stand-in for the Adafruit IO group data endpoint the board sends telemetry to.
+
+Accepts POST /api/v2/<username>/groups/<group>/data the way Adafruit IO
+does and prints one line per summary, so telemetry can be checked without
+an Adafruit IO account. Point the board at it with TELEMETRY_URL in
+config.py (any ADAFRUIT_AIO_KEY is accepted unless --key is given):
+
+    python tools/telemetry_sink.py --host 0.0.0.0 --port 8090 --csv telemetry.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from telemetry import FIELDS  # noqa: E402
+
+GROUP_DATA_PATH = re.compile(r"^/api/v2/([^/]+)/groups/([^/]+)/data/?$")
+
+
+class TelemetrySink(ThreadingHTTPServer):
+    def __init__(self, address, key=None, csv_path=None, quiet=True):
+        super().__init__(address, TelemetryHandler)
+        self.key = key
+        self.quiet = quiet
+        self.summaries = 0
+        self._lock = threading.Lock()
+        self._csv = None
+        if csv_path:
+            new_file = not os.path.exists(csv_path)
+            self._csv_file = open(csv_path, "a", newline="")
+            self._csv = csv.writer(self._csv_file)
+            if new_file:
+                self._csv.writerow(("username", "group", "created_at") + FIELDS)
+
+    def record(self, username, group, payload):
+        values = {feed["key"]: feed["value"] for feed in payload.get("feeds", [])}
+        created_at = payload.get("created_at", "")
+        with self._lock:
+            self.summaries += 1
+            print(f"{created_at} {username}/{group} " + " ".join(f"{k}={v}" for k, v in values.items()))
+            if self._csv:
+                self._csv.writerow((username, group, created_at) + tuple(values.get(field, "") for field in FIELDS))
+                self._csv_file.flush()
+
+
+class TelemetryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        match = GROUP_DATA_PATH.match(self.path)
+        if not match:
+            self._reply(404, {"error": "not found"})
+            return
+        if not self.headers.get("X-AIO-Key") or (self.server.key and self.headers["X-AIO-Key"] != self.server.key):
+            self._reply(401, {"error": "invalid API key"})
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._reply(400, {"error": "invalid JSON"})
+            return
+
+        username, group = match.groups()
+        self.server.record(username, group, payload)
+        # Adafruit IO answers with the data points it created
+        self._reply(200, [{"feed_key": feed["key"], "value": str(feed["value"])} for feed in payload.get("feeds", [])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--key", help="only accept this ADAFRUIT_AIO_KEY")
+    parser.add_argument("--csv", help="also append each summary to this CSV file")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = TelemetrySink((args.host, args.port), args.key, args.csv, quiet=not args.verbose)
+    print(f"Receiving telemetry on http://{args.host}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"summaries={server.summaries}")
+
+
+if __name__ == "__main__":
+    main()
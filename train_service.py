@@ -1,65 +1,270 @@
 import time
 from config import (
-    debug_print,
     COLOR_WHITE,
     COLOR_RED,
     COLOR_YELLOW,
     COLOR_BLUE,
-    DEBUG_MODE,
+    FEED_MODE,
+    REALTIME_STALE_SECONDS,
 )
+from logger import log
+from profiler import profiler
+from memory_governor import governor
+from loop_watchdog import monitor
 
 EST_OFFSET = -5 * 3600  # 5 hours in seconds (UTC to EST)
 
-def get_feed_data(connection_manager, feed_url):
+# Aggregator API path, relative to MTA_FEED_URL in aggregator mode
+AGGREGATOR_PATH = "/v1/arrivals"
+
+# Last parsed aggregator payload per URL, reused when the server answers 304
+_aggregated_feeds = {}
+
+def get_feed_data(connection_manager, feed_url, stop_ids=None):
     """Fetch and parse the MTA feed data."""
+    if FEED_MODE == "aggregator":
+        return get_aggregated_feed_data(connection_manager, feed_url, stop_ids)
+
     feed_data = connection_manager.fetch_with_retry(feed_url)
     if not feed_data:
         raise Exception("Failed to fetch feed")
 
-    debug_print("\nParsing feed data...")
+    log.debug("Parsing feed data")
     from partial_protobuf_feed import parse_feed_message
-    return parse_feed_message(feed_data)
+    governor.check("parse")
+    monitor.stage("parse")
+    with profiler.span("parse"):
+        feed_dict = parse_feed_message(feed_data, _parse_filter(stop_ids))
+    observe_feed_clock(connection_manager, feed_dict)
+    return feed_dict
 
-def get_train_times(feed_dict, stop_id):
-    """Get upcoming train arrivals for a specific stop."""
-    now = time.time()
-    arrivals = []
-    
-    debug_print(f"\nProcessing stop_id: {stop_id}")
-    
+def _parse_filter(stop_ids):
+    """The stops to keep when parsing, or None for the whole feed."""
+    if stop_ids and governor.filter_stops:
+        return set(stop_ids)
+    return None
+
+def get_feeds_data(connection_manager, feeds, stop_ids=None):
+    """Fetch several feeds concurrently and parse each one once.
+
+    feeds is a list of (name, url). Returns {name: feed dict}, leaving out
+    feeds that could not be fetched. When memory is short only stop_ids
+    are kept.
+    """
+    from partial_protobuf_feed import parse_feed_message
+
+    results = connection_manager.fetch_many_with_retry([url for _, url in feeds])
+    parsed = {}
+    for (name, _), feed_data in zip(feeds, results):
+        if feed_data:
+            log.debug("Parsing feed %s", name)
+            governor.check("parse")
+            monitor.stage("parse")
+            with profiler.span("parse"):
+                parsed[name] = parse_feed_message(feed_data, _parse_filter(stop_ids))
+            observe_feed_clock(connection_manager, parsed[name])
+    return parsed
+
+def get_aggregated_feed_data(connection_manager, base_url, stop_ids):
+    """Fetch pre-filtered arrivals for our stops from the edge aggregator."""
+    from http_client import NOT_MODIFIED
+
+    url = f"{base_url.rstrip('/')}{AGGREGATOR_PATH}?stops={','.join(stop_ids)}"
+    data = connection_manager.fetch_with_retry(url, conditional=True)
+    if data is NOT_MODIFIED and url in _aggregated_feeds:
+        return _aggregated_feeds[url]
+    if not data or data is NOT_MODIFIED:
+        raise Exception("Failed to fetch arrivals from aggregator")
+
+    monitor.stage("parse")
+    with profiler.span("parse"):
+        feed_dict = parse_aggregator_payload(data)
+    _aggregated_feeds[url] = feed_dict
+    observe_feed_clock(connection_manager, feed_dict)
+    return feed_dict
+
+def observe_feed_clock(connection_manager, feed_dict):
+    """Let the feed's own timestamp pull a lagging clock forward."""
+    timestamp = feed_dict.get("header", {}).get("timestamp")
+    connection_manager.clock.observe_feed_timestamp(timestamp)
+
+def parse_aggregator_payload(data):
+    """Turn an aggregator payload into the dict shape parse_feed_message returns.
+
+    The payload is JSON of the form
+      {"ts": <feed timestamp>, "stops": {"L16N": [[trip_id, time, route_id], ...]}}
+    where time is already the best (departure, else arrival) epoch time.
+    """
+    import json
+
+    payload = json.loads(str(data, "utf-8"))
+    return arrivals_to_feed_dict(payload["ts"], payload["stops"])
+
+def arrivals_to_feed_dict(timestamp, stops):
+    """Build a feed dict from {stop_id: [[trip_id, time, route_id], ...]}."""
+    entities = []
+    for stop_id, arrivals in stops.items():
+        for trip_id, stop_time, route_id in arrivals:
+            entities.append({
+                "id": None,
+                "trip_update": {
+                    "trip": {"trip_id": trip_id, "route_id": route_id},
+                    "stop_time_update": [{
+                        "stop_id": stop_id,
+                        "stop_sequence": None,
+                        "arrival_time": None,
+                        "departure_time": stop_time,
+                    }],
+                },
+                "vehicle": None,
+            })
+
+    return {
+        "header": {"gtfs_realtime_version": None, "timestamp": timestamp},
+        "entity": entities,
+    }
+
+def best_stop_time(stu):
+    """Departure time if the update has one, otherwise the arrival time."""
+    dep_time = stu.get("departure_time")
+    return dep_time if dep_time else stu.get("arrival_time")
+
+def index_stop_times(feed_dict, stop_ids=None):
+    """Map stop_id -> [(time, trip_id, route_id), ...] sorted by time.
+
+    One pass over the feed serves every stop; stop_ids limits the index to
+    those stops.
+    """
+    index = {}
     for entity in feed_dict.get("entity", []):
         trip_update = entity.get("trip_update")
         if not trip_update:
             continue
 
-        trip_id = trip_update.get("trip", {}).get("trip_id", "Unknown")
-        process_stop_updates(trip_update, stop_id, trip_id, now, arrivals)
-    
-    # Return only the next 3 arrivals, sorted by time
-    return sorted(arrivals, key=lambda x: x[1])[:3]
+        trip = trip_update.get("trip") or {}
+        trip_id = trip.get("trip_id", "Unknown")
+        route_id = trip.get("route_id")
+        for stu in trip_update.get("stop_time_update", []):
+            stop_id = stu.get("stop_id")
+            if stop_ids is not None and stop_id not in stop_ids:
+                continue
+            best_time = best_stop_time(stu)
+            if best_time:
+                index.setdefault(stop_id, []).append((best_time, trip_id, route_id))
 
-def process_stop_updates(trip_update, stop_id, trip_id, now, arrivals):
-    """Process stop time updates for a trip."""
-    for stu in trip_update.get("stop_time_update", []):
-        if stu.get("stop_id") != stop_id:
-            continue
-            
-        # Use departure time if available, otherwise use arrival time
-        arr_time = stu.get("arrival_time")
-        dep_time = stu.get("departure_time")
-        best_time = dep_time if dep_time else arr_time
-        
-        if not best_time or best_time < now:
-            continue
-            
-        # Convert UTC to EST
-        local_time = best_time + EST_OFFSET
-        mins = int((local_time - now) // 60)
+    for arrivals in index.values():
+        arrivals.sort()
+    return index
 
-        if mins < 0:
-            mins = 0
-        
-        arrivals.append((trip_id, mins))
+class PredictionStore:
+    """Our stops' predictions, diffed against each new feed.
+
+    update() indexes a feed for some stops in one pass and compares each
+    stop's {trip_id: time} with the last refresh's. A stop with an added,
+    changed or removed prediction gets new sorted arrivals and loses its
+    computed minutes; is_current() tells the caller which stops can keep
+    what they showed, which is until a prediction changes or one of the
+    minutes shown ticks over. The changed fraction of each refresh is kept
+    for report().
+    """
+
+    def __init__(self):
+        self.trips = {}  # stop_id -> {trip_id: best time}
+        self.arrival_times = {}  # stop_id -> [(time, trip_id, route_id), ...] sorted
+        self.computed = {}  # stop_id -> (limit, time the minutes shown next change or None)
+        self.predictions = 0  # This refresh, including removed ones
+        self.changed = 0
+        self.refreshes = 0
+        self.last_fraction = None  # (changed, predictions) of the last refresh
+        self.total_predictions = 0
+        self.total_changed = 0
+
+    def update(self, feed_dict, stop_ids):
+        """Diff the feed's predictions for stop_ids."""
+        index = index_stop_times(feed_dict, stop_ids)
+        for stop_id in stop_ids:
+            arrivals = index.get(stop_id, [])
+            old = self.trips.get(stop_id, {})
+            current = {}
+            changes = 0
+            for best_time, trip_id, _ in arrivals:
+                current[trip_id] = best_time
+                if old.get(trip_id) != best_time:
+                    changes += 1  # Added or changed
+            removed = 0
+            for trip_id in old:
+                if trip_id not in current:
+                    removed += 1
+            self.predictions += len(current) + removed
+            self.changed += changes + removed
+            self.trips[stop_id] = current
+            if changes or removed or stop_id not in self.arrival_times:
+                self.arrival_times[stop_id] = arrivals
+                self.computed.pop(stop_id, None)
+
+    def is_current(self, stop_id, limit):
+        """True if arrivals(stop_id, limit) would return what it did last time."""
+        computed = self.computed.get(stop_id)
+        if computed is None or computed[0] != limit:
+            return False
+        expires = computed[1]
+        return expires is None or time.time() < expires
+
+    def arrivals(self, stop_id, limit=3):
+        """Up to limit upcoming (trip_id, mins) for a stop, soonest first."""
+        now = time.time()
+        result = []
+        expires = None
+        for best_time, trip_id, _ in self.arrival_times.get(stop_id, ()):
+            if best_time < now:
+                continue
+            # Convert UTC to EST
+            remaining = best_time + EST_OFFSET - now
+            mins = int(remaining // 60)
+            result.append((trip_id, mins if mins > 0 else 0))
+            # When this arrival's minutes next drop, or it leaves the list
+            change = now + remaining % 60 if remaining >= 60 else best_time
+            if expires is None or change < expires:
+                expires = change
+            if len(result) >= limit:
+                break
+        self.computed[stop_id] = (limit, expires)
+        return result
+
+    def end_refresh(self):
+        """Close the refresh's counts."""
+        if self.predictions:
+            self.refreshes += 1
+            self.last_fraction = (self.changed, self.predictions)
+            self.total_changed += self.changed
+            self.total_predictions += self.predictions
+            log.debug("Predictions: %d of %d changed", self.changed, self.predictions)
+        self.predictions = self.changed = 0
+
+    def report(self):
+        if not self.last_fraction:
+            return
+        changed, predictions = self.last_fraction
+        print(
+            f"Predictions: last refresh {changed}/{predictions} changed ({changed * 100 // predictions}%), "
+            f"{self.total_changed * 100 // self.total_predictions}% over {self.refreshes} refreshes"
+        )
+
+predictions = PredictionStore()
+
+def feed_is_stale(feed_dict):
+    """True if the feed's own timestamp is older than REALTIME_STALE_SECONDS."""
+    timestamp = feed_dict.get("header", {}).get("timestamp")
+    if not timestamp:
+        return False
+    return (time.time() - EST_OFFSET) - timestamp > REALTIME_STALE_SECONDS
+
+def get_scheduled_times(schedule, stop_id, limit=3):
+    """Next few scheduled departures from the fallback table, as (route_id, mins)."""
+    now = time.localtime()
+    seconds = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+    departures = schedule.next_departures(stop_id, seconds, now.tm_wday, limit)
+    return [(route_id, until // 60) for until, route_id in departures]
 
 def get_time_color(mins):
     """Return the appropriate color based on arrival time."""
@@ -70,8 +275,11 @@ def get_time_color(mins):
     else:
         return COLOR_WHITE
     
-def format_train_display(arrivals, direction):
-    """Format train arrivals for display with appropriate colors."""
+def format_train_display(arrivals, direction, scheduled=False):
+    """Format train arrivals for display with appropriate colors.
+
+    Scheduled (not realtime) times are marked with a ~.
+    """
     if not arrivals:
         text = f"{direction} No trains"
         colors = [COLOR_BLUE] * len(direction) + [COLOR_WHITE] * len(" No trains")
@@ -83,7 +291,7 @@ def format_train_display(arrivals, direction):
 
     # Add each arrival time
     for i, (_, mins) in enumerate(arrivals):
-        time_text = f" {mins}m"
+        time_text = f" ~{mins}m" if scheduled else f" {mins}m"
         text += time_text
         
         # Determine color for this arrival
@@ -91,6 +299,8 @@ def format_train_display(arrivals, direction):
         
         # Add colors for each character
         colors.append(COLOR_WHITE)  # space
+        if scheduled:
+            colors.append(COLOR_WHITE)  # ~
         for _ in str(mins):
             colors.append(mins_color)  # digits
         colors.append(mins_color)  # 'm'